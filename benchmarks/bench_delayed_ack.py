@@ -0,0 +1,88 @@
+'''
+Benchmark for delayed ACKs (Host.ACK_EVERY, Host.ACK_DELAY).
+
+Runs test cases acknowledging every packet and every N in-order packets,
+and reports the ACKs sent, events processed, wall time, events per second,
+completion time and goodput of each. Each run happens in a child process.
+
+usage: python benchmarks/bench_delayed_ack.py [--link=event|analytic]
+           [--alg=reno|fast] [--every=N1,N2,...] [--delay=SECONDS]
+           [TEST_CASE_NO ...]
+'''
+import os
+import sys
+import time
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+def child(every, delay, engine, test_case, tcp_alg):
+    import main
+    import link
+    import host
+    import packet
+    import metrics
+
+    metrics.HEADLESS = True
+    link.Link.ENGINE = engine
+    host.Host.ACK_EVERY = int(every)
+    host.Host.ACK_DELAY = float(delay)
+
+    # Count the ACKs sent
+    acks = [0]
+    make_ack = packet.makeAck
+    def counting_make_ack(*args):
+        acks[0] += 1
+        return make_ack(*args)
+    packet.makeAck = counting_make_ack
+
+    os.chdir(ROOT)
+    sim = main.setup('./input/test_case_' + test_case, tcp_alg)
+    start = time.time()
+    events = sim.run()
+    wall = time.time() - start
+    print "%d %d %f %f %f" % (acks[0], events, wall, sim.time,
+                              sim.summary()['goodput_mbps'])
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(*sys.argv[2:])
+        sys.exit(0)
+
+    engine = 'event'
+    tcp_alg = 'reno'
+    every_list = [1, 2, 4]
+    delay = 0.04
+    cases = []
+    for i in sys.argv[1:]:
+        if i.startswith("--link="):
+            engine = i[len("--link="):]
+        elif i.startswith("--alg="):
+            tcp_alg = i[len("--alg="):]
+        elif i.startswith("--every="):
+            every_list = [int(n) for n in i[len("--every="):].split(",")]
+        elif i.startswith("--delay="):
+            delay = float(i[len("--delay="):])
+        elif i.startswith("--"):
+            print __doc__
+            sys.exit(-1)
+        else:
+            cases.append(i)
+    cases = cases or ['1', '2']
+
+    for test_case in cases:
+        print "\ntest case %s (%s, %s, delay %g s)" % (test_case, engine,
+                                                      tcp_alg, delay)
+        print "%6s %9s %10s %9s %10s %10s %13s" % ("every", "acks",
+            "events", "wall (s)", "events/s", "sim time", "goodput (Mbps)")
+        for every in every_list:
+            out = subprocess.check_output([sys.executable, __file__,
+                '--child', str(every), str(delay), engine, test_case,
+                tcp_alg])
+            acks, events, wall, sim_time, goodput = \
+                out.strip().splitlines()[-1].split()
+            events, wall = int(events), float(wall)
+            print "%6d %9d %10d %9.2f %10.0f %10.3f %13.3f" % (every,
+                int(acks), events, wall, events / wall if wall > 0 else 0.0,
+                float(sim_time), float(goodput))
@@ -0,0 +1,133 @@
+'''
+Benchmark for batched TCP FAST window updates (Flow.WINDOW_UPDATES).
+
+Runs dumbbells with a growing number of FAST flows (see topogen.py), all
+starting at once, with an UpdateWindow event chain per flow and with one
+batched FastUpdate tick (see fast.py), and reports the window update
+events, heap pushes and pops, wall time and completion time of each. Each
+run happens in a child process.
+
+With --ticks it also times a single FastUpdate tick at each size, updating
+the windows in a Python loop and with NumPy arrays, which is where
+FastController.NUMPY_MIN_FLOWS comes from.
+
+usage: python benchmarks/bench_fast_updates.py [--link=event|analytic]
+           [--flows=N1,N2,...] [--ticks]
+'''
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import topogen
+
+def child(infile, mode, engine):
+    import link
+    import flow
+    import event
+    import metrics
+    from parser import parse
+    from simulation import Simulation
+
+    metrics.HEADLESS = True
+    link.Link.ENGINE = engine
+    flow.Flow.WINDOW_UPDATES = mode
+
+    # Count the per-flow window update events
+    updates = [0]
+    process = event.UpdateWindow.process
+    def counting_process(self):
+        updates[0] += 1
+        process(self)
+    event.UpdateWindow.process = counting_process
+
+    sim = parse(infile, Simulation('fast'))
+    start = time.time()
+    sim.run()
+    wall = time.time() - start
+    if sim.fast is not None:
+        updates[0] = sim.fast.ticks
+
+    print "%d %d %d %f %f" % (updates[0], sim.scheduler.seq,
+                              sim.scheduler.pops, wall, sim.time)
+
+def tick_cost(infile, numpy_min_flows, reps=200):
+    ''' Mean wall time of one FastController tick over the flows in infile '''
+    import fast
+    from parser import parse
+    from simulation import Simulation
+
+    sim = parse(infile, Simulation('fast'))
+    controller = fast.FastController(0.02)
+    for i, f in enumerate(sim.flows):
+        controller.add(f, 0.0)
+        f.min_RTT = 0.05
+        f.curr_RTT = 0.06 + i * 1e-6
+
+    fast.FastController.NUMPY_MIN_FLOWS = numpy_min_flows
+    controller.update(0.0)
+    start = time.time()
+    for i in xrange(reps):
+        for f in sim.flows:
+            f.window_size = 20.0
+        controller.update(0.0)
+    return (time.time() - start) / reps
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(*sys.argv[2:])
+        sys.exit(0)
+
+    engine = 'analytic'
+    counts = [10, 100, 1000]
+    ticks = False
+    for i in sys.argv[1:]:
+        if i == "--ticks":
+            ticks = True
+        elif i.startswith("--link="):
+            engine = i[len("--link="):]
+        elif i.startswith("--flows="):
+            counts = [int(n) for n in i[len("--flows="):].split(",")]
+        else:
+            print __doc__
+            sys.exit(-1)
+
+    print "%6s %8s %10s %10s %10s %9s %9s" % ("flows", "mode", "updates",
+        "pushes", "pops", "wall (s)", "sim time")
+    costs = []
+    for n in counts:
+        # The same total amount of data at every size, over a bottleneck
+        # with room for every flow's first packets (a FAST flow doubles its
+        # window every update until its first ACK)
+        topo = topogen.generate('dumbbell', hosts=2 * n, flows=n,
+                                data=5.0 / n, stagger=0.0, rate=100.0,
+                                buffer_size=1024.0)
+        fd, infile = tempfile.mkstemp(prefix='topo_')
+        with os.fdopen(fd, 'w') as f:
+            topo.write(f)
+        try:
+            base = None
+            for mode in ('flow', 'batched'):
+                out = subprocess.check_output([sys.executable, __file__,
+                    '--child', infile, mode, engine])
+                updates, pushes, pops, wall, sim_time = \
+                    out.strip().splitlines()[-1].split()
+                print "%6d %8s %10d %10d %10d %9.2f %9.3f" % (n, mode,
+                    int(updates), int(pushes), int(pops), float(wall),
+                    float(sim_time))
+                if base is None:
+                    base = int(updates)
+            print "%6s %8s %10d saved" % ("", "", base - int(updates))
+            if ticks:
+                costs.append((n, tick_cost(infile, float('inf')),
+                              tick_cost(infile, 0)))
+        finally:
+            os.remove(infile)
+
+    if ticks:
+        print "\n%6s %14s %14s" % ("flows", "loop (us/tick)", "numpy (us/tick)")
+        for n, loop, vec in costs:
+            print "%6d %14.1f %14.1f" % (n, loop * 1e6, vec * 1e6)
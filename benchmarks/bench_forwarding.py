@@ -0,0 +1,82 @@
+'''
+Per-hop forwarding microbenchmark.
+
+Builds a chain of routers (a generated parking lot), then forwards data
+packets from one end to the other by calling Router.receive on every
+router of the path, with the old routing (isinstance checks, then the
+routing table and the link map by string id) and with the compiled
+forwarding table. The SendPacket events produced are released straight
+away instead of being scheduled, so only forwarding is measured.
+
+usage: python benchmarks/bench_forwarding.py [CHAIN_LENGTH ...]
+'''
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import event
+import packet
+import router
+import topogen
+from parser import parse
+
+PACKETS = 20000
+
+def old_receive(self, pkt, time):
+    '''
+    Router.receive before forwarding tables, for data and ACKs, with the
+    routing table keyed by string ids (old_table)
+    '''
+    if (isinstance(pkt, packet.RtAck)):
+        pass
+    elif (isinstance(pkt, packet.RoutingPkt)):
+        pass
+    else:
+        next_link = self.sim.l_map[self.old_table[pkt.recipient.id]]
+        router.enqueue(event.SendPacket(time, pkt, next_link, self))
+
+def path(sim, src, dst):
+    ''' Returns the routers on the route from host src to host dst '''
+    hops = []
+    node = src.link.get_receiver(src)
+    while node is not dst:
+        hops.append(node)
+        node = node.forwarding[dst.index].get_receiver(node)
+    return hops
+
+def run(hops, pkt, receive):
+    start = time.time()
+    for i in xrange(PACKETS):
+        for rtr in hops:
+            receive(rtr, pkt, 0.0)
+    return (time.time() - start) / (PACKETS * len(hops))
+
+if __name__ == "__main__":
+    lengths = [int(n) for n in sys.argv[1:]] or [4, 16, 64]
+
+    # Release forwarded packets' events instead of scheduling them
+    router.enqueue = lambda evt: evt.release()
+    router.ROUTE_CACHE_DIR = None
+
+    print "%8s %14s %14s %8s" % ("routers", "old (ns/hop)", "new (ns/hop)",
+                                 "speedup")
+    for n in lengths:
+        fd, infile = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as f:
+            topogen.generate('parkinglot', hosts=n, routers=n, flows=1).write(f)
+        sim = parse(infile)
+        os.remove(infile)
+        sim.start()
+
+        flw = sim.flows[0]
+        hops = path(sim, flw.source, flw.destination)
+        for rtr in hops:
+            rtr.old_table = rtr.named_routes()
+        pkt = packet.DataPkt(flw.source, flw.destination, 0, flw)
+
+        old = run(hops, pkt, old_receive)
+        new = run(hops, pkt, router.Router.receive.im_func)
+        print "%8d %14.0f %14.0f %7.2fx" % (len(hops), old * 1e9, new * 1e9,
+                                           old / new)
@@ -0,0 +1,74 @@
+'''
+Benchmark for computing the initial routes.
+
+Compares the old initial_bf, which ran len(routers) rounds of update_bf
+over every router and neighbour, with router.initial_bf (one Dijkstra per
+router) with and without its on-disk cache, on generated random
+topologies. Also checks that both give the same distances.
+
+usage: python benchmarks/bench_initial_routes.py [ROUTERS ...]
+'''
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import metrics
+import router
+import topogen
+from parser import parse
+
+def sweep_bf(routers):
+    ''' The old initial_bf '''
+    for rtr in routers:
+        rtr.reset_distvec()
+        rtr.bf_updated = {}
+        rtr.bf_changed = False
+
+    for bf_round in range (len(routers)):
+        for rtr in routers:
+            for n_rtr in rtr.rneighbours:
+                n_rtr_link = rtr.rneighbours[n_rtr]
+                n_dvec = n_rtr_link.get_receiver(rtr).bf_distvec
+                rtr.update_bf(n_rtr, n_dvec, n_rtr_link, 0, False)
+
+def load(path):
+    sim = parse(path)
+    router.set_rneighbours(sim.routers)
+    return sim
+
+def timed(f, *args):
+    start = time.time()
+    f(*args)
+    return time.time() - start
+
+def distances(sim):
+    return dict((r.id, dict((d, v[0]) for d, v in enumerate(r.bf_distvec)
+                            if v is not None)) for r in sim.routers)
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [25, 50, 100, 200]
+    tmp = tempfile.mkdtemp()
+    router.ROUTE_CACHE_DIR = os.path.join(tmp, 'cache')
+    try:
+        print "%8s %8s %12s %12s %12s" % ("routers", "links", "sweeps (s)",
+                                          "dijkstra (s)", "cached (s)")
+        for n in sizes:
+            path = os.path.join(tmp, 'random_%d' % n)
+            with open(path, 'w') as f:
+                topogen.generate('random', hosts=n, routers=n, flows=1).write(f)
+
+            old = load(path)
+            t_old = timed(sweep_bf, old.routers)
+            new = load(path)
+            t_new = timed(router.initial_bf, new.routers, new.links)
+            cached = load(path)
+            t_cached = timed(router.initial_bf, cached.routers, cached.links)
+
+            assert distances(old) == distances(new) == distances(cached)
+            print "%8d %8d %12.3f %12.3f %12.3f" % (n, len(new.links), t_old,
+                                                    t_new, t_cached)
+    finally:
+        shutil.rmtree(tmp)
@@ -0,0 +1,49 @@
+'''
+Benchmark for the Link buffer with deep queues.
+
+Keeps a link buffer at a fixed occupancy (one buffer_add per buffer_get)
+and reports buffer operations/sec with the deque buffer, next to a plain
+list popped from the front as the buffer used to be.
+
+usage: python benchmarks/bench_link_buffer.py [DEPTH ...]
+'''
+import os
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import link
+import packet
+from simulation import Simulation
+
+OPS = 200000
+
+class ListFIFO(list):
+    ''' The old list-based buffer '''
+    def popleft(self):
+        return self.pop(0)
+
+def run(depth, buffer_cls):
+    lnk = link.Link('L0', 1.25e6, 0.01, 1e12, Simulation())
+    lnk.buffer = buffer_cls()
+    pkt = packet.DataPkt(None, None, 0, None)
+    for i in xrange(depth):
+        lnk.buffer_add((pkt, None))
+
+    start = time.time()
+    for i in xrange(OPS):
+        lnk.buffer_add((pkt, None))
+        lnk.buffer_get()
+    return OPS / (time.time() - start)
+
+if __name__ == "__main__":
+    depths = [int(n) for n in sys.argv[1:]] or [10, 1000, 10000, 100000]
+
+    print "%10s %16s %16s %8s" % ("depth", "list ops/s", "deque ops/s",
+                                  "speedup")
+    for depth in depths:
+        before = run(depth, ListFIFO)
+        after = run(depth, deque)
+        print "%10d %16.0f %16.0f %7.1fx" % (depth, before, after,
+                                            after / before)
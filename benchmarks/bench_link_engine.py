@@ -0,0 +1,52 @@
+'''
+Benchmark for the link engines.
+
+Runs a test case with the event-chain link model and with the analytic
+FIFO model and reports events processed per delivered data packet, and
+events/sec. Each run happens in a child process since the simulator keeps
+its state in module globals.
+
+usage: python benchmarks/bench_link_engine.py [TEST_CASE_NO] [TCP_ALG]
+'''
+import os
+import sys
+import time
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+def child(engine, test_case, tcp_alg):
+    import main
+    import link
+    import metrics
+
+    metrics.HEADLESS = True
+    link.Link.ENGINE = engine
+
+    os.chdir(ROOT)
+    sim = main.setup('./input/test_case_' + test_case, tcp_alg)
+    start = time.time()
+    events = sim.run()
+    wall = time.time() - start
+
+    delivered = sum(f.received_packets for f in sim.flows)
+    print "%s %d %d %f" % (engine, events, delivered, wall)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(*sys.argv[2:])
+        sys.exit(0)
+
+    test_case = sys.argv[1] if len(sys.argv) > 1 else '1'
+    tcp_alg = sys.argv[2] if len(sys.argv) > 2 else 'reno'
+
+    print "%10s %12s %12s %14s %12s" % ("engine", "events", "delivered",
+                                        "events/packet", "events/s")
+    for engine in ('event', 'analytic'):
+        out = subprocess.check_output([sys.executable, __file__, '--child',
+                                       engine, test_case, tcp_alg])
+        engine, events, delivered, wall = out.split()
+        events, delivered, wall = int(events), int(delivered), float(wall)
+        print "%10s %12d %12d %14.2f %12.0f" % (engine, events, delivered,
+            float(events) / delivered, events / wall)
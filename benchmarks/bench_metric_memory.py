@@ -0,0 +1,67 @@
+'''
+Memory benchmark for metric storage.
+
+Appends the same samples to the old dict-of-lists layout (one boxed float
+per sample, as metrics.dict_insert used to do) and to metrics.MetricStore,
+and reports the bytes held per sample by each.
+
+usage: python benchmarks/bench_metric_memory.py [SAMPLES_PER_ENTITY]
+'''
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import metrics
+
+NUM_LINKS = 8
+NUM_FLOWS = 3
+
+def list_bytes(lst):
+    # List slots plus the float objects they point to
+    return sys.getsizeof(lst) + sum(sys.getsizeof(x) for x in lst)
+
+def dict_of_lists(samples):
+    rnd = random.Random(143)
+    series = {}
+    for kind, n, names in (('L', NUM_LINKS, ['buffer_load', 'packet_loss',
+                                            'l_times']),
+                           ('F', NUM_FLOWS, ['send_rate', 'round_trip_time',
+                                            'window_sizes', 'f_times'])):
+        for name in names:
+            d = series.setdefault(name, {})
+            for i in xrange(n):
+                d[kind + str(i)] = [rnd.random() for j in xrange(samples)]
+
+    nbytes = 0
+    for d in series.values():
+        nbytes += sum(list_bytes(lst) for lst in d.values())
+    return nbytes
+
+def metric_store(samples):
+    rnd = random.Random(143)
+    store = metrics.MetricStore()
+    for i in xrange(NUM_LINKS):
+        store.entity('link', 'L%d' % i)
+    for i in xrange(NUM_FLOWS):
+        store.entity('flow', 'F%d' % i)
+    for j in xrange(samples):
+        for i in xrange(NUM_LINKS):
+            store.update_link(i, rnd.random(), rnd.random(), 0,
+                              rnd.random(), False)
+        for i in xrange(NUM_FLOWS):
+            store.update_flow(i, rnd.random(), 0, rnd.random(),
+                              rnd.random(), rnd.random(), False)
+    return store.nbytes()
+
+if __name__ == "__main__":
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    total = samples * (3 * NUM_LINKS + 4 * NUM_FLOWS)
+
+    before = dict_of_lists(samples)
+    after = metric_store(samples)
+    print "%d samples" % total
+    print "dict of lists: %12d bytes (%.1f bytes/sample)" % \
+        (before, float(before) / total)
+    print "MetricStore:   %12d bytes (%.1f bytes/sample)" % \
+        (after, float(after) / total)
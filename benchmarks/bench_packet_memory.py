@@ -0,0 +1,116 @@
+'''
+Memory benchmark for packets and events.
+
+Python 2 has no tracemalloc, so this reports two things instead:
+
+  - the size of each packet and event object (sys.getsizeof of the
+    instance, plus its __dict__ and payload string for the old layout
+    where packets and events were plain classes)
+  - for a simulation run, how many packet and link events are constructed
+    per delivered data packet and how many of those were fresh allocations
+    rather than pooled instances, with pooling on and off
+
+Each run happens in a child process since the simulator keeps its state
+in module globals.
+
+usage: python benchmarks/bench_packet_memory.py [TEST_CASE_NO] [TCP_ALG]
+'''
+import os
+import sys
+import time
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import event
+import packet
+
+class OldPacket:
+    ''' Packet layout before __slots__: a plain class with a __dict__ '''
+    def __init__(self, number):
+        self.size = 1024
+        self.sender = None
+        self.recipient = None
+        self.payload = "PACKET %d" % number
+        self.number = number
+        self.flow = None
+
+class OldEvent:
+    ''' Event layout before __slots__ (e.g. ReceivePacket) '''
+    def __init__(self):
+        self.start_time = 0.0
+        self.priority = 3
+        self.packet = None
+        self.link = None
+        self.receiver = None
+
+def object_sizes():
+    old_pkt = OldPacket(12345)
+    old_evt = OldEvent()
+    return [
+        ('data packet', sys.getsizeof(old_pkt) + sys.getsizeof(old_pkt.__dict__)
+            + sys.getsizeof(old_pkt.payload),
+         sys.getsizeof(packet.DataPkt(None, None, 12345, None))),
+        ('link event', sys.getsizeof(old_evt) + sys.getsizeof(old_evt.__dict__),
+         sys.getsizeof(event.ReceivePacket(0.0, None, None, None))),
+    ]
+
+def child(pooling, test_case, tcp_alg):
+    import main
+    import metrics
+
+    metrics.HEADLESS = True
+    if pooling == 'off':
+        event.PooledEvent.POOL_MAX = 0
+        packet.ACK_POOL_MAX = 0
+
+    # Count constructions and fresh allocations of pooled events and ACKs
+    counts = {'made': 0, 'fresh': 0}
+    pooled_new = event.PooledEvent.__new__
+
+    def counting_new(cls, *args):
+        counts['made'] += 1
+        if not cls.pool:
+            counts['fresh'] += 1
+        return pooled_new(cls, *args)
+    event.PooledEvent.__new__ = staticmethod(counting_new)
+
+    make_ack = packet.makeAck
+    def counting_make_ack(f, number):
+        counts['made'] += 1
+        if not packet.ack_pool:
+            counts['fresh'] += 1
+        return make_ack(f, number)
+    packet.makeAck = counting_make_ack
+
+    os.chdir(ROOT)
+    sim = main.setup('./input/test_case_' + test_case, tcp_alg)
+    start = time.time()
+    sim.run()
+    wall = time.time() - start
+
+    delivered = sum(f.received_packets for f in sim.flows)
+    print "%d %d %d %f" % (counts['made'], counts['fresh'], delivered, wall)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(*sys.argv[2:])
+        sys.exit(0)
+
+    test_case = sys.argv[1] if len(sys.argv) > 1 else '1'
+    tcp_alg = sys.argv[2] if len(sys.argv) > 2 else 'reno'
+
+    print "%12s %14s %14s" % ("object", "old bytes", "slots bytes")
+    for name, old, new in object_sizes():
+        print "%12s %14d %14d" % (name, old, new)
+    print
+
+    print "%8s %16s %16s %10s" % ("pooling", "made/packet", "allocs/packet",
+                                  "wall (s)")
+    for pooling in ('off', 'on'):
+        out = subprocess.check_output([sys.executable, __file__, '--child',
+                                       pooling, test_case, tcp_alg])
+        made, fresh, delivered, wall = out.split()
+        made, fresh, delivered = int(made), int(fresh), int(delivered)
+        print "%8s %16.2f %16.4f %10.2f" % (pooling, float(made) / delivered,
+            float(fresh) / delivered, float(wall))
@@ -0,0 +1,124 @@
+'''
+Benchmark for the parallel engine (see parallel.py).
+
+Runs generated networks with many routers (a parking lot and a random
+graph, see topogen.py) sequentially and split across 2, 4, ... worker
+processes, and reports wall time, speedup over the sequential run, the
+links cut and the lookahead, the completion time and goodput, and whether
+the saved metrics are identical to the sequential run's. The sequential run
+uses the same link model and routes as the parallel one (analytic full
+duplex links, static routes). Each run happens in a child process.
+
+Every generated link has the same rate and delay, so packets often arrive
+at a router at exactly the same time over different links. When those
+links are in different partitions the parallel run may forward them in the
+other order, and from there it is a different (equally valid) run of the
+same network: compare completion time and goodput rather than metrics.
+
+Speedup needs as many free cores as workers: with fewer, the workers take
+turns and the run is slower than the sequential one.
+
+usage: python benchmarks/bench_parallel.py [--parts=2,4,...]
+           [--routers=N] [--alg=reno|fast]
+'''
+import os
+import sys
+import time
+import tempfile
+import subprocess
+import multiprocessing
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import topogen
+
+def child(infile, parts, tcp_alg, out):
+    import link
+    import metrics
+    import parallel
+    from parser import parse
+    from simulation import Simulation
+
+    metrics.HEADLESS = True
+    link.Link.ENGINE = 'analytic'
+    link.Link.DUPLEX = 'full'
+
+    parts = int(parts)
+    start = time.time()
+    if parts == 1:
+        sim = parse(infile, Simulation(tcp_alg, routing='static'))
+        sim.run()
+        cut, lookahead = 0, 0.0
+    else:
+        sim = parallel.run(infile, tcp_alg, parts)
+        owner = parallel.partition(sim, parts)
+        cut = parallel.cut_links(sim, owner)
+        lookahead = min(l.prop_delay for l in cut) if cut else 0.0
+        cut = len(cut)
+    wall = time.time() - start
+    sim.store.save(out)
+    print "%f %f %f %d %f" % (wall, sim.time, sim.summary()['goodput_mbps'],
+                               cut, lookahead)
+
+def networks(routers):
+    ''' Returns (name, topogen kwargs) of the networks to run '''
+    return [
+        ('parkinglot', dict(kind='parkinglot', hosts=routers, routers=routers,
+                            flows=routers, data=0.5)),
+        ('random', dict(kind='random', hosts=routers, routers=routers,
+                        flows=routers / 2, data=0.5, degree=3.0)),
+    ]
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(*sys.argv[2:])
+        sys.exit(0)
+
+    parts_list = [2, 4]
+    routers = 32
+    tcp_alg = 'reno'
+    for i in sys.argv[1:]:
+        if i.startswith("--parts="):
+            parts_list = [int(p) for p in i[len("--parts="):].split(",")]
+        elif i.startswith("--routers="):
+            routers = int(i[len("--routers="):])
+        elif i.startswith("--alg="):
+            tcp_alg = i[len("--alg="):]
+        else:
+            print __doc__
+            sys.exit(-1)
+
+    print "%d cores" % multiprocessing.cpu_count()
+    for name, kwargs in networks(routers):
+        kwargs = dict(kwargs)
+        topo = topogen.generate(kwargs.pop('kind'), **kwargs)
+        fd, infile = tempfile.mkstemp(prefix='topo_')
+        with os.fdopen(fd, 'w') as f:
+            topo.write(f)
+
+        print "\n%s: %d routers, %d links, %d flows (%s)" % (name,
+            len(topo.routers), len(topo.links), len(topo.flows), tcp_alg)
+        print "%6s %9s %8s %5s %14s %10s %10s %10s" % ("parts", "wall (s)",
+            "speedup", "cut", "lookahead (s)", "sim time", "goodput",
+            "identical")
+        base = None
+        saved = None
+        try:
+            for parts in [1] + parts_list:
+                fd, out = tempfile.mkstemp(prefix='parallel_', suffix='.csv')
+                os.close(fd)
+                res = subprocess.check_output([sys.executable, __file__,
+                    '--child', infile, str(parts), tcp_alg, out])
+                wall, sim_time, goodput, cut, lookahead = \
+                    res.strip().splitlines()[-1].split()
+                wall = float(wall)
+                with open(out) as f:
+                    metric_data = f.read()
+                os.remove(out)
+                if base is None:
+                    base, saved = wall, metric_data
+                print "%6d %9.2f %7.2fx %5d %14g %10.4f %10.3f %10s" % (parts,
+                    wall, base / wall, int(cut), float(lookahead),
+                    float(sim_time), float(goodput), metric_data == saved)
+        finally:
+            os.remove(infile)
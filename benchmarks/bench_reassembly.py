@@ -0,0 +1,80 @@
+'''
+Stress benchmark for receiver reassembly with large windows and heavy loss.
+
+Packets are delivered a window at a time; each packet is lost with a given
+probability and retransmitted at the end of the next window, so the
+receiver holds a reorder window of roughly the window size. Reports
+packets/sec for the old list-based reassembly in Host.receive and for
+reassembly.ReorderBuffer, and checks that both produce the same ACKs.
+
+usage: python benchmarks/bench_reassembly.py [WINDOW ...]
+'''
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+from reassembly import ReorderBuffer
+
+NUM_PACKETS = 100000
+LOSS = 0.2
+
+def arrivals(window):
+    rnd = random.Random(143)
+    order = []
+    lost = []
+    for start in xrange(0, NUM_PACKETS, window):
+        retransmits = lost
+        lost = []
+        for n in xrange(start, min(start + window, NUM_PACKETS)):
+            if rnd.random() < LOSS:
+                lost.append(n)
+            else:
+                order.append(n)
+        order.extend(retransmits)
+    order.extend(lost)
+    return order
+
+def list_reassembly(order):
+    # The algorithm Host.receive used to run
+    acks = []
+    expected = 0
+    received = []
+    for n in order:
+        if expected <= n:
+            if expected == n:
+                expected += 1
+                while expected in received:
+                    received.remove(expected)
+                    expected += 1
+            else:
+                received.append(n)
+            acks.append(expected)
+    return acks
+
+def buffer_reassembly(order):
+    acks = []
+    rbuf = ReorderBuffer()
+    for n in order:
+        if rbuf.add(n):
+            acks.append(rbuf.expected)
+    return acks
+
+def timed(fn, order):
+    start = time.time()
+    acks = fn(order)
+    return acks, len(order) / (time.time() - start)
+
+if __name__ == "__main__":
+    windows = [int(n) for n in sys.argv[1:]] or [16, 128, 1024]
+
+    print "%8s %16s %16s %8s" % ("window", "list pkts/s", "buffer pkts/s",
+                                 "speedup")
+    for window in windows:
+        order = arrivals(window)
+        acks_before, before = timed(list_reassembly, order)
+        acks_after, after = timed(buffer_reassembly, order)
+        assert(acks_before == acks_after)
+        print "%8d %16.0f %16.0f %7.1fx" % (window, before, after,
+                                           after / before)
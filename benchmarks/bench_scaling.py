@@ -0,0 +1,154 @@
+'''
+Scaling benchmark on generated topologies (see topogen.py).
+
+Runs series of synthetic networks that grow in one dimension at a time:
+    flows     dumbbell with 1..16 flows sharing the bottleneck
+    links     parking lot with 2..16 routers (one flow per hop plus one end
+              to end)
+    buffer    dumbbell with 4 flows and 16KB..1MB link buffers
+    topology  each generator at 16 hosts, 8 routers and 8 flows
+
+The total amount of data sent is the same within a series, so the curves
+show per-event cost rather than the amount of traffic. Each run happens in
+a child process so peak RSS is per run. Results (wall time, events/sec,
+peak RSS, events processed per event type, ...) are written as JSON and
+summarized as one table per series.
+
+Event types are counted by wrapping Scheduler.next_event, which costs the
+same small amount per event in every run.
+
+usage: python benchmarks/bench_scaling.py [--series=flows,links,...]
+           [--link=event|analytic] [--alg=reno|fast] [--quick]
+           [--limit=SECONDS] [--out=FILE.json]
+'''
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import topogen
+
+def series(quick):
+    ''' Returns a list of (series name, label, topogen kwargs) points '''
+    total = 1.0 if quick else 4.0
+    counts = [1, 2, 4] if quick else [1, 2, 4, 8, 16]
+    buffers = [16, 128] if quick else [16, 64, 256, 1024]
+
+    points = []
+    for k in counts:
+        points.append(('flows', 'K=%d' % k, dict(kind='dumbbell',
+            hosts=2 * k, flows=k, data=total / k)))
+    for m in ([2, 4] if quick else [2, 4, 8, 16]):
+        points.append(('links', 'M=%d' % m, dict(kind='parkinglot',
+            hosts=2 * m, routers=m, flows=m, data=total / m)))
+    for b in buffers:
+        points.append(('buffer', '%dKB' % b, dict(kind='dumbbell', hosts=8,
+            flows=4, buffer_size=b, data=total / 4)))
+    for kind in sorted(topogen.TOPOLOGIES):
+        points.append(('topology', kind, dict(kind=kind, hosts=16,
+            routers=8, flows=8, data=total / 8)))
+    return points
+
+def child(infile, engine, tcp_alg, limit):
+    import resource
+    import main
+    import link
+    import metrics
+
+    metrics.HEADLESS = True
+    link.Link.ENGINE = engine
+
+    sim = main.setup(infile, tcp_alg)
+
+    counts = {}
+    next_event = sim.scheduler.next_event
+    def counting_next_event():
+        evt = next_event()
+        name = evt.__class__.__name__
+        counts[name] = counts.get(name, 0) + 1
+        return evt
+    sim.scheduler.next_event = counting_next_event
+
+    start = time.time()
+    events = sim.run(until=float(limit))
+    wall = time.time() - start
+
+    print json.dumps({
+        'links': len(sim.links), 'routers': len(sim.routers),
+        'hosts': len(sim.hosts), 'flows': len(sim.flows),
+        'completed': sim.flows_done(), 'sim_time': sim.time,
+        'wall_time': wall, 'events': events,
+        'events_per_sec': events / wall if wall > 0 else 0.0,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'event_counts': counts,
+    })
+
+def run_point(kwargs, engine, tcp_alg, limit):
+    kwargs = dict(kwargs)
+    topo = topogen.generate(kwargs.pop('kind'), **kwargs)
+    fd, infile = tempfile.mkstemp(prefix='topo_')
+    with os.fdopen(fd, 'w') as f:
+        topo.write(f)
+    try:
+        out = subprocess.check_output([sys.executable, __file__, '--child',
+                                       infile, engine, tcp_alg, str(limit)])
+    finally:
+        os.remove(infile)
+    return json.loads(out.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(*sys.argv[2:])
+        sys.exit(0)
+
+    names = None
+    engine = 'event'
+    tcp_alg = 'reno'
+    quick = False
+    limit = 100.0
+    out = 'scaling.json'
+    for i in sys.argv[1:]:
+        if i.startswith("--series="):
+            names = i[len("--series="):].split(",")
+        elif i.startswith("--link="):
+            engine = i[len("--link="):]
+        elif i.startswith("--alg="):
+            tcp_alg = i[len("--alg="):]
+        elif i == "--quick":
+            quick = True
+        elif i.startswith("--limit="):
+            limit = float(i[len("--limit="):])
+        elif i.startswith("--out="):
+            out = i[len("--out="):]
+        else:
+            print __doc__
+            sys.exit(-1)
+
+    results = []
+    current = None
+    for name, label, kwargs in series(quick):
+        if names is not None and name not in names:
+            continue
+        if name != current:
+            current = name
+            print "\n%s (%s, %s)" % (name, engine, tcp_alg)
+            print "%10s %6s %6s %10s %9s %11s %9s %8s" % ("point", "links",
+                "flows", "events", "wall (s)", "events/s", "rss (MB)",
+                "done")
+
+        res = run_point(kwargs, engine, tcp_alg, limit)
+        res.update({'series': name, 'point': label, 'params': kwargs,
+                    'engine': engine, 'tcp_alg': tcp_alg})
+        results.append(res)
+        print "%10s %6d %6d %10d %9.2f %11.0f %9.1f %8s" % (label,
+            res['links'], res['flows'], res['events'], res['wall_time'],
+            res['events_per_sec'], res['peak_rss_kb'] / 1024.0,
+            res['completed'])
+
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print "\nResults written to %s" % out
@@ -0,0 +1,67 @@
+'''
+Microbenchmark for the event scheduler backends.
+
+Runs the classic "hold" model: the queue is filled with N events, then each
+step dequeues the earliest event and schedules a new one a random interval
+later. Reports events/sec for each backend, next to the old
+Queue.PriorityQueue wrapper for reference.
+
+usage: python benchmarks/bench_scheduler.py [N ...]
+'''
+import os
+import sys
+import time
+import random
+import Queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import pqueue
+
+HOLD_STEPS = 200000
+
+class BenchEvent(object):
+    cancelled = False
+
+    def __init__(self, start_time, priority):
+        self.start_time = start_time
+        self.priority = priority
+
+def hold_scheduler(backend, size, steps):
+    rnd = random.Random(143)
+    sched = pqueue.Scheduler(backend)
+    sched.schedule_many([BenchEvent(rnd.expovariate(1.0), rnd.randint(1, 5))
+                         for i in xrange(size)])
+
+    start = time.time()
+    for i in xrange(steps):
+        evt = sched.next_event()
+        sched.time = evt.start_time
+        sched.schedule(BenchEvent(sched.time + rnd.expovariate(1.0),
+                                  rnd.randint(1, 5)))
+    return steps / (time.time() - start)
+
+def hold_priority_queue(size, steps):
+    rnd = random.Random(143)
+    q = Queue.PriorityQueue()
+    for i in xrange(size):
+        evt = BenchEvent(rnd.expovariate(1.0), rnd.randint(1, 5))
+        q.put((evt.start_time, evt.priority, evt))
+
+    start = time.time()
+    for i in xrange(steps):
+        evt = q.get()[2]
+        evt = BenchEvent(evt.start_time + rnd.expovariate(1.0),
+                         rnd.randint(1, 5))
+        q.put((evt.start_time, evt.priority, evt))
+    return steps / (time.time() - start)
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [100, 10000, 100000]
+
+    print "%10s %16s %16s %16s" % ("queue size", "PriorityQueue", "heap",
+                                   "calendar")
+    for size in sizes:
+        print "%10d %16.0f %16.0f %16.0f" % (size,
+            hold_priority_queue(size, HOLD_STEPS),
+            hold_scheduler('heap', size, HOLD_STEPS),
+            hold_scheduler('calendar', size, HOLD_STEPS))
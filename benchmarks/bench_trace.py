@@ -0,0 +1,71 @@
+'''
+Benchmark for the packet trace.
+
+Runs a test case untraced, traced to a plain file and traced to a gzip
+file, and reports wall time, slowdown over the untraced run, trace records
+and bytes written, and peak RSS. Each run happens in a child process so
+peak RSS is per run.
+
+usage: python benchmarks/bench_trace.py [TEST_CASE_NO] [TCP_ALG]
+'''
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+def child(mode, test_case, tcp_alg):
+    import resource
+    import main
+    import metrics
+    import tracing
+
+    metrics.HEADLESS = True
+
+    os.chdir(ROOT)
+    sim = main.setup('./input/test_case_' + test_case, tcp_alg)
+    path = None
+    if mode != 'off':
+        fd, path = tempfile.mkstemp(prefix='trace_',
+                                    suffix='.gz' if mode == 'gzip' else '')
+        os.close(fd)
+        sim.tracer = tracing.TraceWriter(path, sim)
+
+    start = time.time()
+    events = sim.run()
+    records = size = 0
+    if path is not None:
+        sim.tracer.close()
+        records = sim.tracer.records
+        size = os.path.getsize(path)
+        os.remove(path)
+    wall = time.time() - start
+
+    print "%s %d %d %d %f %d" % (mode, events, records, size, wall,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(*sys.argv[2:])
+        sys.exit(0)
+
+    test_case = sys.argv[1] if len(sys.argv) > 1 else '1'
+    tcp_alg = sys.argv[2] if len(sys.argv) > 2 else 'reno'
+
+    print "%6s %10s %10s %10s %9s %9s %9s" % ("trace", "events", "records",
+        "size (MB)", "wall (s)", "slowdown", "rss (MB)")
+    base = None
+    for mode in ('off', 'plain', 'gzip'):
+        out = subprocess.check_output([sys.executable, __file__, '--child',
+                                       mode, test_case, tcp_alg])
+        mode, events, records, size, wall, rss = \
+            out.strip().splitlines()[-1].split()
+        wall = float(wall)
+        if base is None:
+            base = wall
+        print "%6s %10d %10d %10.1f %9.2f %8.2fx %9.1f" % (mode, int(events),
+            int(records), int(size) / 1e6, wall, wall / base,
+            int(rss) / 1024.0)
@@ -0,0 +1,83 @@
+'''
+Benchmark for packet trains (Flow.SEND_TRAINS).
+
+Runs a test case with each flow burst sent as one SendTrain event and with
+a SendPacket per packet, and reports heap pushes and pops, wall time, the
+number and mean size of the trains sent, and whether the saved metrics are
+identical (they should be). Each run happens in a child process.
+
+usage: python benchmarks/bench_trains.py [--link=event|analytic]
+           [--timer=packet|flow] [TEST_CASE_NO] [TCP_ALG]
+'''
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+def child(trains, engine, timer_mode, test_case, tcp_alg, out):
+    import main
+    import link
+    import flow
+    import event
+    import metrics
+
+    metrics.HEADLESS = True
+    link.Link.ENGINE = engine
+    flow.Flow.TIMER_MODE = timer_mode
+    flow.Flow.SEND_TRAINS = trains == 'on'
+
+    # Count trains and the packets in them
+    sizes = []
+    init = event.SendTrain.__init__
+    def counting_init(self, start_time, packets, link, sender):
+        sizes.append(len(packets))
+        init(self, start_time, packets, link, sender)
+    event.SendTrain.__init__ = counting_init
+
+    os.chdir(ROOT)
+    sim = main.setup('./input/test_case_' + test_case, tcp_alg)
+    start = time.time()
+    sim.run()
+    wall = time.time() - start
+    sim.store.save(out)
+
+    print "%d %d %f %d %d" % (sim.scheduler.seq, sim.scheduler.pops, wall,
+                              len(sizes), sum(sizes))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(*sys.argv[2:])
+        sys.exit(0)
+
+    engine = 'event'
+    timer_mode = 'packet'
+    for i in list(sys.argv[1:]):
+        if i.startswith("--link="):
+            sys.argv.remove(i)
+            engine = i[len("--link="):]
+        elif i.startswith("--timer="):
+            sys.argv.remove(i)
+            timer_mode = i[len("--timer="):]
+    test_case = sys.argv[1] if len(sys.argv) > 1 else '1'
+    tcp_alg = sys.argv[2] if len(sys.argv) > 2 else 'reno'
+
+    print "%7s %10s %10s %9s %8s %11s" % ("trains", "pushes", "pops",
+                                          "wall (s)", "trains", "mean size")
+    saved = []
+    for trains in ('off', 'on'):
+        fd, out = tempfile.mkstemp(prefix='trains_', suffix='.csv')
+        os.close(fd)
+        res = subprocess.check_output([sys.executable, __file__, '--child',
+            trains, engine, timer_mode, test_case, tcp_alg, out])
+        pushes, pops, wall, n, pkts = res.strip().splitlines()[-1].split()
+        n, pkts = int(n), int(pkts)
+        print "%7s %10d %10d %9.2f %8d %11.1f" % (trains, int(pushes),
+            int(pops), float(wall), n, float(pkts) / n if n else 0.0)
+        with open(out) as f:
+            saved.append(f.read())
+        os.remove(out)
+    print "metrics identical: %s" % (saved[0] == saved[1])
@@ -0,0 +1,109 @@
+import zlib
+import cPickle
+import link
+import flow
+import host
+import metrics
+
+'''
+Checkpoint and restore of a simulation.
+
+A checkpoint is the whole Simulation object graph, meaning the scheduler
+with its pending events, sequence counter and clock, links with their
+buffers, flows with their windows, scoreboards and timers, host
+reassembly state, router tables and distance vectors, and the metric
+store. It also holds the class-wide settings the run depends on (link
+engine and duplex mode, timer mode, delayed ACKs, metric sampling
+interval). The graph is pickled (protocol 2) and zlib-compressed behind a
+short header.
+
+Checkpoints are taken between events: run() stops the event loop after
+the last event at or before the checkpoint time, saves, and carries on.
+No events are added to the queue, so a run that checkpoints processes
+exactly the same events as one that doesn't. A restored simulation
+continues as if it had never stopped.
+
+load() returns an independent Simulation each time it is called, so many
+what-if runs can be forked from one warmed-up checkpoint by loading it
+once per run and changing parameters before continuing.
+'''
+
+MAGIC = "CS143SIM"
+VERSION = 4
+
+def save(sim, path):
+    ''' Writes a checkpoint of sim to path '''
+    state = {
+        'sim': sim,
+        'config': {
+            'link_engine': link.Link.ENGINE,
+            'link_duplex': link.Link.DUPLEX,
+            'timer_mode': flow.Flow.TIMER_MODE,
+            'ack_every': host.Host.ACK_EVERY,
+            'ack_delay': host.Host.ACK_DELAY,
+            'sample_interval': metrics.SAMPLE_INTERVAL,
+        },
+    }
+    # An open trace file can't be saved; restored runs start untraced
+    tracer, sim.tracer = sim.tracer, None
+    try:
+        data = zlib.compress(cPickle.dumps(state, cPickle.HIGHEST_PROTOCOL), 6)
+    finally:
+        sim.tracer = tracer
+    with open(path, 'wb') as f:
+        f.write("%s %d\n" % (MAGIC, VERSION))
+        f.write(data)
+
+def load(path):
+    '''
+    Reads a checkpoint written by save(). Restores the class-wide settings
+    it was taken with and returns the (activated) Simulation.
+    '''
+    with open(path, 'rb') as f:
+        header = f.readline().split()
+        if len(header) != 2 or header[0] != MAGIC:
+            raise ValueError("%s is not a simulation checkpoint" % path)
+        if int(header[1]) != VERSION:
+            raise ValueError("%s is a version %s checkpoint, expected %d" % \
+                (path, header[1], VERSION))
+        state = cPickle.loads(zlib.decompress(f.read()))
+
+    config = state['config']
+    link.Link.ENGINE = config['link_engine']
+    link.Link.DUPLEX = config['link_duplex']
+    flow.Flow.TIMER_MODE = config['timer_mode']
+    host.Host.ACK_EVERY = config['ack_every']
+    host.Host.ACK_DELAY = config['ack_delay']
+    metrics.SAMPLE_INTERVAL = config['sample_interval']
+
+    sim = state['sim']
+    sim.activate()
+    return sim
+
+def run(sim, path_format, at=(), every=None, profiler=None):
+    '''
+    Runs sim to the end, saving a checkpoint at each simulated time in at
+    and every `every` simulated seconds. path_format is formatted with the
+    checkpoint time, e.g. "run_%g.ckpt". Returns the number of events
+    processed.
+    '''
+    pending = sorted(t for t in at if t > sim.time)
+
+    # Periodic checkpoints fall on multiples of every, so restored runs keep
+    # the same schedule
+    k = int(sim.time / every) + 1 if every else None
+
+    processed = 0
+    while pending or k is not None:
+        t = min(pending[:1] + ([k * every] if k is not None else []))
+        processed += sim.run(until=t, profiler=profiler)
+        if sim.flows_done() or sim.scheduler.empty():
+            return processed
+
+        save(sim, path_format % t)
+        metrics.cprint("Checkpoint at %g saved to %s" % (t, path_format % t))
+        if pending and pending[0] == t:
+            pending.pop(0)
+        if k is not None and k * every == t:
+            k += 1
+    return processed + sim.run(profiler=profiler)
@@ -1,19 +1,51 @@
-from pqueue import event_queue, enqueue
+from pqueue import enqueue
 import router
 import link
+import metrics
+import tracing
 from metrics import cprint
 
 HALF_DUPLEX = False
 
-class Event:
+class Event(object):
     ''' Generic Event class, default priority 3'''
+    # Events use slots rather than a per-instance __dict__. 'cancelled' is
+    # set by the scheduler when the event is scheduled or cancelled.
+    __slots__ = ('start_time', 'priority', 'cancelled')
+
     def __init__(self, start_time, priority = 3):
         self.start_time = start_time
         self.priority = priority
+
+    def release(self):
+        ''' Called by the main loop once the event has been processed '''
+        pass
         
 #def process(self): pass
 
-class SendPacket(Event):
+class PooledEvent(Event):
+    '''
+    Event recycled through a per-class free list (the 'pool' class
+    attribute) once it has been processed. __new__ hands out a released
+    instance when there is one, and __init__ then overwrites its fields.
+    Only events that nothing else keeps a reference to may be pooled.
+    '''
+    __slots__ = ()
+    POOL_MAX = 4096
+
+    def __new__(cls, *args):
+        if cls.pool:
+            return cls.pool.pop()
+        return object.__new__(cls)
+
+    def release(self):
+        if len(self.pool) < PooledEvent.POOL_MAX:
+            self.pool.append(self)
+
+class SendPacket(PooledEvent):
+    __slots__ = ('link', 'packet', 'sender')
+    pool = []
+
     def __init__(self, start_time, packet, link, sender):
         self.start_time = start_time
         # Set priority to favour SendPacket events in order of packet number
@@ -23,10 +55,68 @@ class SendPacket(Event):
         self.sender = sender
 
     def process(self):
+        # With the analytic link engine the arrival time is known as soon
+        # as the packet is sent, so only the arrival is scheduled
+        if self.link.ENGINE == 'analytic':
+            arrival = self.link.transmit(self.packet, self.sender, self.start_time)
+            if arrival is not None:
+                receiver = self.link.get_receiver(self.sender)
+                if self.link.remote is not None:
+                    self.link.remote.send(arrival, self.packet, self.link,
+                                          receiver)
+                else:
+                    enqueue(ReceivePacket(arrival, self.packet, self.link,
+                                          receiver))
+            return
+
         self.link.buffer_add((self.packet, self.sender))
         enqueue(CheckBuffer(self.start_time, self.link))
 
-class CheckBuffer(Event):
+class SendTrain(PooledEvent):
+    '''
+    Sends a run of packets from one sender onto a link at the same time.
+    Equivalent to a SendPacket per packet: each packet goes onto the link
+    in turn, and with the event engine is followed right away by the
+    CheckBuffer its SendPacket would have scheduled for the same time, so
+    drops and departure times are unchanged.
+    '''
+    __slots__ = ('link', 'packets', 'sender')
+    pool = []
+
+    def __init__(self, start_time, packets, link, sender):
+        self.start_time = start_time
+        # The priority of the first packet's SendPacket
+        self.priority = 5 + (1 - 1.0/(packets[0].number + 1))
+        self.link = link
+        self.packets = packets
+        self.sender = sender
+
+    def process(self):
+        link = self.link
+        sender = self.sender
+        time = self.start_time
+        if link.ENGINE == 'analytic':
+            receiver = link.get_receiver(sender)
+            for packet in self.packets:
+                arrival = link.transmit(packet, sender, time)
+                if arrival is None:
+                    continue
+                if link.remote is not None:
+                    link.remote.send(arrival, packet, link, receiver)
+                else:
+                    enqueue(ReceivePacket(arrival, packet, link, receiver))
+        else:
+            for packet in self.packets:
+                link.buffer_add((packet, sender))
+                check = CheckBuffer(time, link)
+                check.process()
+                check.release()
+        self.packets = None
+
+class CheckBuffer(PooledEvent):
+    __slots__ = ('link',)
+    pool = []
+
     def __init__(self, start_time, link):
         self.start_time = start_time
         self.priority = 2
@@ -39,6 +129,10 @@ class CheckBuffer(Event):
             self.link.buf_processing = True
             assert(self.link.buffer_empty() == False)
             packet, src = self.link.buffer_get()
+            tr = self.link.sim.tracer
+            if tr is not None:
+                tr.record(tracing.TRANSMIT, self.start_time, packet,
+                          self.link.index, src.index)
 
             send_time = packet.size / self.link.rate + self.link.prop_delay
             receiver = self.link.get_receiver(src)
@@ -60,7 +154,10 @@ class CheckBuffer(Event):
 
             enqueue(BufferDoneProcessing(self.start_time + done_time, self.link))
 
-class BufferDoneProcessing(Event):
+class BufferDoneProcessing(PooledEvent):
+    __slots__ = ('link',)
+    pool = []
+
     def __init__(self, start_time, link):
         self.start_time = start_time
         self.priority = 1
@@ -71,7 +168,10 @@ class BufferDoneProcessing(Event):
         self.link.size_in_transit = 0
         enqueue(CheckBuffer(self.start_time, self.link))
 
-class ReceivePacket(Event):
+class ReceivePacket(PooledEvent):
+    __slots__ = ('packet', 'link', 'receiver')
+    pool = []
+
     def __init__(self, start_time, packet, link, receiver):
         self.start_time = start_time
         self.priority = 3
@@ -80,10 +180,17 @@ class ReceivePacket(Event):
         self.receiver = receiver
 
     def process(self):
-        enqueue(CheckBuffer(self.start_time, self.link,))
+        if self.link.ENGINE == 'event':
+            enqueue(CheckBuffer(self.start_time, self.link,))
+        tr = self.link.sim.tracer
+        if tr is not None:
+            tr.record(tracing.ARRIVE, self.start_time, self.packet,
+                      self.link.index, self.receiver.index)
         self.receiver.receive(self.packet, self.start_time)
 
 class RtPktTimeout(Event):
+    __slots__ = ('router', 'rtpkt')
+
     def __init__(self, start_time, router, rtpkt):
         self.start_time = start_time
         self.router = router
@@ -95,10 +202,12 @@ class RtPktTimeout(Event):
 
 
 class Reroute(Event):
+    __slots__ = ('round_no', 'sim')
     WAIT_INTERVAL = 5
-    def __init__(self, start_time, round_no):
+    def __init__(self, start_time, round_no, sim):
         self.start_time = start_time
         self.round_no = round_no
+        self.sim = sim
         self.priority = 5  #rerouting should happen after any simultaneous events
 
     def process(self):
@@ -108,22 +217,28 @@ class Reroute(Event):
         
         # Update link costs, trigger rerouting, and enqueue the event
         # for the next rerouting
-        link.set_linkcosts()
-        router.reset_bf(self.start_time, self.round_no)
-        enqueue(Reroute(self.start_time + Reroute.WAIT_INTERVAL, self.round_no + 1))
+        link.set_linkcosts(self.sim.links)
+        if self.sim.oracle is not None:
+            self.sim.oracle.update()
+        else:
+            router.reset_bf(self.sim.routers, self.start_time, self.round_no)
+        enqueue(Reroute(self.start_time + Reroute.WAIT_INTERVAL, \
+            self.round_no + 1, self.sim))
 
         # Debugging output
         cprint ("Link costs:")
         coststr = ""
-        for l_id in link.Link.ids:
-            coststr += "%s: %d " % (l_id, link.Link.l_map[l_id].bf_lcost)
+        for l_id in self.sim.link_ids():
+            coststr += "%s: %d " % (l_id, self.sim.l_map[l_id].bf_lcost)
         cprint (coststr)
         cprint ("\nRouting tables:")
-        for r_id in router.Router.ids:
-            cprint (r_id + str(router.Router.r_map[r_id].routing_table))
+        for r_id in self.sim.router_ids():
+            cprint (r_id + str(self.sim.r_map[r_id].named_routes()))
         cprint ("==================================")
 
 class PacketTimeout(Event):
+    __slots__ = ('packet',)
+
     def __init__(self, start_time, packet):
         self.start_time = start_time
         self.packet = packet
@@ -132,9 +247,69 @@ class PacketTimeout(Event):
     def process(self):
         self.packet.flow.handleTimeout(self.packet, self.start_time)
 
+class DelayedAck(Event):
+    ''' Delayed ACK timer of a host for one flow (see Host.ACK_EVERY) '''
+    __slots__ = ('host', 'flow')
+
+    def __init__(self, start_time, host, flow):
+        self.start_time = start_time
+        self.host = host
+        self.flow = flow
+        self.priority = 3
+
+    def process(self):
+        self.host.ack_timeout(self.flow, self.start_time)
+
+class FlowTimeout(Event):
+    ''' Single retransmission timer of a flow (Flow.TIMER_MODE 'flow') '''
+    __slots__ = ('flow',)
+
+    def __init__(self, start_time, flow):
+        self.start_time = start_time
+        self.flow = flow
+        self.priority = 3
+
+    def process(self):
+        self.flow.handleFlowTimeout(self.start_time)
+
+
+class SampleMetrics(Event):
+    ''' Periodically samples metrics of links and flows that changed '''
+    __slots__ = ('sim', 'sample_no')
+
+    def __init__(self, start_time, sim, sample_no=0):
+        self.start_time = start_time
+        self.sim = sim
+        self.sample_no = sample_no
+        self.priority = 6  # sample after any simultaneous events
+
+    def process(self):
+        self.sim.sample_metrics(self.start_time)
+
+        # Multiply rather than accumulate so sample times don't drift
+        enqueue(SampleMetrics((self.sample_no + 1) * metrics.SAMPLE_INTERVAL, \
+            self.sim, self.sample_no + 1))
+
+class FluidStep(Event):
+    ''' Periodically advances the fluid model (see fluid.py) '''
+    __slots__ = ('model', 'step_no')
+
+    def __init__(self, start_time, model, step_no=0):
+        self.start_time = start_time
+        self.model = model
+        self.step_no = step_no
+        self.priority = 4
+
+    def process(self):
+        if self.model.advance(self.start_time):
+            # Multiply rather than accumulate so step times don't drift
+            enqueue(FluidStep((self.step_no + 1) * self.model.step, \
+                self.model, self.step_no + 1))
 
 # Used specifically for TCP FAST.
 class UpdateWindow(Event):
+    __slots__ = ('flow',)
+
     def __init__(self, start_time, flow):
         self.start_time = start_time
         self.priority = 3
@@ -142,6 +317,23 @@ class UpdateWindow(Event):
 
     def process(self):
         self.flow.window_size = self.flow.fast_window()
+        self.flow.sim.dirty_flows.add(self.flow)
         enqueue(UpdateWindow(self.start_time + self.flow.update_period, \
             self.flow))
-        cprint ('%s updated window to %d' % (self.flow.id, self.flow.window_size))
\ No newline at end of file
+        cprint ('%s updated window to %d' % (self.flow.id, self.flow.window_size))
+
+class FastUpdate(Event):
+    ''' Periodically updates the windows of TCP FAST flows (see fast.py) '''
+    __slots__ = ('controller', 'tick_no')
+
+    def __init__(self, start_time, controller, tick_no):
+        self.start_time = start_time
+        self.controller = controller
+        self.tick_no = tick_no
+        self.priority = 3
+
+    def process(self):
+        self.controller.update(self.start_time)
+        # Multiply rather than accumulate so tick times don't drift
+        enqueue(FastUpdate((self.tick_no + 1) * self.controller.period, \
+            self.controller, self.tick_no + 1))
\ No newline at end of file
@@ -0,0 +1,111 @@
+import event
+import metrics
+from pqueue import enqueue
+
+'''
+Batched window updates for TCP FAST.
+
+Normally every FAST flow has its own UpdateWindow event chain, one event
+per flow every update_period. With FastController there is a single chain
+of FastUpdate ticks at multiples of the update period instead, and each
+tick updates the window of every FAST flow at once. A flow is first
+updated at the first tick at least one update period after it starts, so
+its updates can come up to one period earlier than its own chain's would;
+the update itself is the same.
+
+The saving is in events, not arithmetic. A tick calls Flow.fast_window for
+each flow, or with enough flows (NUMPY_MIN_FLOWS) computes it with NumPy
+arrays, which only pays for gathering the flows' state into arrays beyond
+about fifty flows (see benchmarks/bench_fast_updates.py --ticks).
+
+Selected with Flow.WINDOW_UPDATES = 'batched'.
+'''
+
+class FastController(object):
+    # Ticks with at least this many flows update them with NumPy
+    NUMPY_MIN_FLOWS = 50
+
+    def __init__(self, period):
+        self.period = period
+
+        # Flows updated at every tick, and arrays of their GAMMA and ALPHA
+        # (built as flows join, once there are NUMPY_MIN_FLOWS of them)
+        self.flows = []
+        self.gamma = None
+        self.alpha = None
+
+        # (time of first update, flow) of flows that haven't joined yet
+        self.waiting = []
+        self.running = False
+
+        # Counters for reporting
+        self.ticks = 0
+        self.updates = 0
+
+    def add(self, flw, time):
+        ''' Updates flw's window every period from time on '''
+        self.waiting.append((time, flw))
+        if not self.running:
+            self.running = True
+            tick_no = int(time / self.period)
+            if tick_no * self.period < time:
+                tick_no += 1
+            enqueue(event.FastUpdate(tick_no * self.period, self, tick_no))
+
+    def join(self, time):
+        ''' Adds the waiting flows due their first update at time '''
+        joining = [w for w in self.waiting if w[0] <= time]
+        if not joining:
+            return
+        self.waiting = [w for w in self.waiting if w[0] > time]
+        self.flows.extend(flw for t, flw in joining)
+        if len(self.flows) >= FastController.NUMPY_MIN_FLOWS:
+            import numpy as np
+            self.gamma = np.array([f.GAMMA for f in self.flows], dtype=float)
+            self.alpha = np.array([f.ALPHA for f in self.flows], dtype=float)
+
+    def update(self, time):
+        ''' Updates the window of every flow due an update at time '''
+        if self.waiting:
+            self.join(time)
+        flows = self.flows
+        self.ticks += 1
+        if not flows:
+            return
+        self.updates += len(flows)
+
+        if len(flows) < FastController.NUMPY_MIN_FLOWS:
+            for f in flows:
+                f.window_size = f.fast_window()
+        else:
+            self.update_arrays(flows)
+        flows[0].sim.dirty_flows.update(flows)
+        if metrics.VERBOSE:
+            for f in flows:
+                metrics.cprint('%s updated window to %d' % (f.id,
+                                                            f.window_size))
+
+    def update_arrays(self, flows):
+        ''' Flow.fast_window for every flow at once, with NumPy '''
+        import numpy as np
+
+        n = len(flows)
+        nan = float('nan')
+        w = np.fromiter((f.window_size for f in flows), float, n)
+        min_rtt = np.fromiter((f.min_RTT for f in flows), float, n)
+        rtt = np.fromiter((nan if f.curr_RTT is None else f.curr_RTT
+                           for f in flows), float, n)
+        gamma = self.gamma
+
+        # Flow.fast_window, term for term; flows without an RTT estimate yet
+        # double their window
+        new = np.minimum(2 * w, (1 - gamma) * w + gamma * \
+            ((min_rtt / rtt) * w + self.alpha))
+        new = np.where(np.isnan(rtt), 2 * w, new)
+
+        for f, size in zip(flows, new.tolist()):
+            f.window_size = size
+
+    def saved(self):
+        ''' Events saved over a chain of UpdateWindow events per flow '''
+        return self.updates - self.ticks
@@ -1,17 +1,33 @@
 from math import ceil, floor
-from pqueue import event_queue, enqueue, get_global_time, qempty
+from pqueue import enqueue, cancel, get_global_time, qempty
 import packet
+from scoreboard import Scoreboard, TimedScoreboard
 import event
 import metrics
+import tracing
 from metrics import cprint
 
 class Flow:
-    f_map = {}
-    # Set by command-line arguments.
-    TCP_ALG = ''
+    # Send the packets a flow sends at the same time (a window opening) as
+    # one SendTrain event instead of a SendPacket each
+    SEND_TRAINS = True
 
-    def __init__(self, flow_id, source, destination, data_amt, start_time):
+    # Retransmission timers: 'packet' arms one timer per packet sent and
+    # cancels it when the packet is ACKed, 'flow' keeps a single timer per
+    # flow that fires when the oldest unacked packet expires.
+    TIMER_MODE = 'packet'
+
+    # TCP FAST window updates: 'flow' runs an UpdateWindow event chain per
+    # flow, 'batched' updates every flow's window at once from one periodic
+    # tick (see fast.py)
+    WINDOW_UPDATES = 'flow'
+
+    def __init__(self, flow_id, source, destination, data_amt, start_time, sim):
         self.id = flow_id
+        self.sim = sim
+
+        # TCP algorithm ('reno' or 'fast') of the simulation
+        self.TCP_ALG = sim.tcp_alg
         self.source = source
         self.destination = destination
         self.data_amt = data_amt         # data_amt is in megabytes.
@@ -23,10 +39,24 @@ class Flow:
 
         self.done_sending = False
 
-        self.unacknowledged = {}
+        # Send times of sent but unacknowledged packets ('flow' mode also
+        # keeps them in send order for its single timer)
+        if self.TIMER_MODE == 'flow':
+            self.unacknowledged = TimedScoreboard()
+        else:
+            self.unacknowledged = Scoreboard()
         self.timeout = 1.0
+
+        # Pending retransmission timers, by packet number ('packet' mode)
+        # or the single flow timer ('flow' mode)
+        self.timers = {}
+        self.rtx_timer = None
         self.dup_pkt = None
 
+        # Outstanding packets that were sent more than once (or put back in
+        # unacknowledged by halve_window); their ACKs give no RTT sample
+        self.retransmitted = set()
+
         # For TCP Reno
         self.ssthreshold = 500.0        # Set threshold initially high
         self.dup_count = 0
@@ -59,27 +89,89 @@ class Flow:
 
     def startFlow(self):
         # While our window isn't filled yet, we create packets.
+        train = self.new_train()
         while (self.curr_pkt < min(self.num_packets, self.window_size)):
-            self.makePacket("PACKET %d" % self.curr_pkt, self.curr_pkt, self.start_time)
-
-            if self.TCP_ALG == 'fast':
-                enqueue(event.UpdateWindow(self.start_time + self.update_period, self))
+            self.makePacket(self.curr_pkt, self.start_time, train)
 
             # We keep track of which packets we haven't received ACKS
             # for yet.
             self.unacknowledged[self.curr_pkt] = self.start_time
             self.curr_pkt += 1
             self.sent_packets += 1
+        self.send_train(train, self.start_time)
 
-    def makePacket(self, payload, number, start_time):
+        if self.TCP_ALG == 'fast':
+            self.start_window_updates(self.start_time)
+
+    def start_window_updates(self, time):
+        ''' Updates the window every update_period, starting from time '''
+        if self.sim.fast is not None:
+            self.sim.fast.add(self, time + self.update_period)
+        else:
+            enqueue(event.UpdateWindow(time + self.update_period, self))
+
+    def makePacket(self, number, start_time, train=None):
         # Makes a new packet and then enqueues SendPacket and PacketTimeout
-        # events.
-        pkt = packet.DataPkt(self.source, self.destination, payload, number, self)
+        # events. With a train (see new_train) the packet is added to the
+        # train instead of getting its own SendPacket.
+        pkt = packet.DataPkt(self.source, self.destination, number, self)
 
         # We send the packet (put the event in the pqueue at the flow's start
         # time.
-        enqueue(event.SendPacket(start_time, pkt, self.source.link, self.source))
-        enqueue(event.PacketTimeout(start_time + self.timeout, pkt))
+        if train is None:
+            enqueue(event.SendPacket(start_time, pkt, self.source.link, self.source))
+        else:
+            train.append(pkt)
+        self.arm_timer(pkt, start_time)
+        return pkt
+
+    def new_train(self):
+        ''' Returns a list to collect packets sent at the same time in '''
+        return [] if self.SEND_TRAINS else None
+
+    def send_train(self, train, start_time):
+        ''' Sends the packets collected in train '''
+        if not train:
+            return
+        if len(train) == 1:
+            enqueue(event.SendPacket(start_time, train[0], self.source.link, \
+                self.source))
+        else:
+            enqueue(event.SendTrain(start_time, train, self.source.link, \
+                self.source))
+
+    def arm_timer(self, pkt, start_time):
+        # In 'flow' mode the single timer is only armed if it isn't already
+        # running; it re-arms itself for the oldest packet when it fires.
+        if self.TIMER_MODE == 'flow':
+            if self.rtx_timer is None:
+                self.rtx_timer = event.FlowTimeout(start_time + self.timeout, self)
+                enqueue(self.rtx_timer)
+            return
+
+        # A retransmitted packet replaces the timer of the previous copy
+        old_timer = self.timers.get(pkt.number, None)
+        if old_timer is not None:
+            cancel(old_timer)
+        self.timers[pkt.number] = event.PacketTimeout(start_time + self.timeout, pkt)
+        enqueue(self.timers[pkt.number])
+
+    def disarm_timer(self, pktnum):
+        timer = self.timers.pop(pktnum, None)
+        if timer is not None:
+            cancel(timer)
+
+    def ack_packet(self, pktnum):
+        # Remove an acknowledged packet from the unacknowledged map and
+        # cancel its timer. Returns the time the packet was sent, or None
+        # if it was sent more than once (Karn's rule: the ACK could be for
+        # any of the copies, so it gives no RTT sample).
+        self.disarm_timer(pktnum)
+        send_time = self.unacknowledged.pop(pktnum)
+        if pktnum in self.retransmitted:
+            self.retransmitted.discard(pktnum)
+            return None
+        return send_time
 
     def receiveAck(self, ack, curr_time):
         # We recieve ACKs with number = the next packet it expects.
@@ -88,6 +180,7 @@ class Flow:
 
         # If that packet has already been acknowledged (i.e. not in the hash)
         # then we have a duplicate ACK for packet ack.numberself.
+        self.sim.dirty_flows.add(self)
         if self.unacknowledged.get(ack.number - 1, None) == None:          
             # (1): This is a new duplicate packet we're dealing with.
             if self.dup_pkt != ack.number:
@@ -113,11 +206,11 @@ class Flow:
                     self.window_size = self.ssthreshold
                 self.fr_flag = False
 
-            # We can remove the correctly acknowledged packet from our
+            # We can remove the correctly acknowledged packets from our
             # unacknowledged packets map
-            for pktnum in self.unacknowledged.keys():
-                if pktnum < ack.number - 1:
-                    self.unacknowledged.pop(pktnum)
+            for pktnum in self.unacknowledged.advance_to(ack.number - 1):
+                self.disarm_timer(pktnum)
+                self.retransmitted.discard(pktnum)
 
             self.adjust_window(ack, curr_time, self.TCP_ALG)
 
@@ -127,13 +220,20 @@ class Flow:
         # Send as many more packets as the window allows.
         window_space = max(int(self.window_size - len(self.unacknowledged)), 0)
 
+        train = self.new_train()
         for i in xrange(window_space):
             if (self.curr_pkt < self.num_packets):
-                self.makePacket("PACKET %d" % self.curr_pkt, self.curr_pkt, curr_time)
+                self.makePacket(self.curr_pkt, curr_time, train)
 
                 self.unacknowledged[self.curr_pkt] = curr_time
                 self.curr_pkt += 1
                 self.sent_packets += 1
+        self.send_train(train, curr_time)
+
+        tr = self.sim.tracer
+        if tr is not None:
+            tr.record(tracing.ACK, curr_time, ack, -1, self.source.index,
+                      self.window_size)
 
 
     def update_metrics(self, time):
@@ -154,7 +254,7 @@ class Flow:
 
 
         if self.done_sending is False:
-            metrics.update_flow(self.id, send_rate, recv_rate, self.curr_RTT, 
+            self.sim.store.update_flow(self.index, send_rate, recv_rate, self.curr_RTT,
                 self.window_size, time, update_flow_rate)
 
     def fast_window(self):
@@ -178,13 +278,15 @@ class Flow:
 
         # Remake the missing packet.
         cprint ('\t %s resending dropped packet %d' % (self.id, ack.number))
-        self.makePacket("PACKET %d" % ack.number, ack.number, curr_time)
+        self.makePacket(ack.number, curr_time)
 
         # Set the curr_pkt to the next packet that was dropped.
         # self.curr_pkt = ack.number + 1
 
         # Edit the start time logged in the unack map.
         self.unacknowledged[ack.number - 1] = curr_time
+        self.retransmitted.add(ack.number - 1)
+        self.retransmitted.add(ack.number)
         cprint ("\t %s new window size is %d" % (self.id, self.window_size))
 
         self.fr_flag = True
@@ -197,50 +299,96 @@ class Flow:
         # Send as many more packets as the window allows.
         window_space = max(int(self.window_size - len(self.unacknowledged)), 0)
 
+        train = self.new_train()
         for i in xrange(window_space):
             if (self.curr_pkt < self.num_packets):
-                self.makePacket("PACKET %d" % self.curr_pkt, self.curr_pkt, curr_time)
+                self.makePacket(self.curr_pkt, curr_time, train)
                 self.unacknowledged[self.curr_pkt] = curr_time
                 self.curr_pkt += 1
+        self.send_train(train, curr_time)
 
     def adjust_window(self, ack, curr_time, tcp_algo='fast'):
         # If this is not the first duplicate ACK for a given
         # dup ACK number, then we do fast recovery, i.e.
         # add 1 to the window size.
 
-        self.prev_RTT = self.curr_RTT
-        self.curr_RTT = curr_time - self.unacknowledged.pop(ack.number - 1)
+        send_time = self.ack_packet(ack.number - 1)
+        if send_time is not None:
+            self.prev_RTT = self.curr_RTT
+            self.curr_RTT = curr_time - send_time
 
         if tcp_algo == 'fast':
-            # Update our min_RTT
-            if self.curr_RTT < self.min_RTT:
-                self.min_RTT = self.curr_RTT
-            if self.min_RTT < 0.0005:
-                self.min_RTT = self.curr_RTT
+            # Update our min_RTT, if the ACK gave an RTT sample
+            if send_time is not None:
+                if self.curr_RTT < self.min_RTT:
+                    self.min_RTT = self.curr_RTT
+                if self.min_RTT < 0.0005:
+                    self.min_RTT = self.curr_RTT
 
-            if self.prev_RTT != None:
-                self.curr_RTT = self.RTTALPHA * self.curr_RTT + \
-                (1 - self.RTTALPHA) * self.prev_RTT
+                if self.prev_RTT != None:
+                    self.curr_RTT = self.RTTALPHA * self.curr_RTT + \
+                    (1 - self.RTTALPHA) * self.prev_RTT
 
         else:
             # If received an ACK and in slow start phase
             # (i.e. window size < threshold), then increase
-            # window size by 1 per ACK received.
+            # window size by 1 per packet ACKed (an ACK can stand for
+            # several, see Host.ACK_EVERY).
             if self.window_size < self.ssthreshold:
-                self.window_size = self.window_size + 1
+                self.window_size = self.window_size + ack.segments
 
             # If we are in congestion avoidance mode,
-            # increase the window size by 1 / W per ACK.
+            # increase the window size by 1 / W per packet ACKed.
             else:
-                self.window_size = self.window_size + (1.0 / int(self.window_size))
+                self.window_size = self.window_size + \
+                    (ack.segments * 1.0 / int(self.window_size))
 
     
     def handleTimeout(self, pkt, curr_time):
+        self.timers.pop(pkt.number, None)
+
         # If unacknowledged, resend the packet + its timeout event
         if pkt.number in self.unacknowledged:
             self.window_size = 1
+            self.sim.dirty_flows.add(self)
             enqueue(event.SendPacket(curr_time, pkt, self.source.link, \
              self.source))
-            enqueue(event.PacketTimeout(curr_time + self.timeout, pkt))
+            self.arm_timer(pkt, curr_time)
             self.unacknowledged[pkt.number] = curr_time
-    
+            self.retransmitted.add(pkt.number)
+
+            tr = self.sim.tracer
+            if tr is not None:
+                tr.record(tracing.TIMEOUT, curr_time, pkt, -1,
+                          self.source.index, self.window_size)
+
+    def handleFlowTimeout(self, curr_time):
+        self.rtx_timer = None
+        if len(self.unacknowledged) == 0:
+            return
+
+        # Find the packets whose timeout has expired (the same packets
+        # whose per-packet timers would have fired by now)
+        expired = self.unacknowledged.expired(curr_time, self.timeout)
+        for pktnum in expired:
+            self.unacknowledged[pktnum] = curr_time
+            self.retransmitted.add(pktnum)
+
+        # Re-arm for whichever outstanding packet expires next
+        next_expiry = self.unacknowledged.oldest_send_time()
+        self.rtx_timer = event.FlowTimeout(next_expiry + self.timeout, self)
+        enqueue(self.rtx_timer)
+
+        # Resend the expired packets
+        if len(expired) > 0:
+            self.window_size = 1
+            self.sim.dirty_flows.add(self)
+            tr = self.sim.tracer
+            train = self.new_train()
+            for pktnum in expired:
+                pkt = self.makePacket(pktnum, curr_time, train)
+                if tr is not None:
+                    tr.record(tracing.TIMEOUT, curr_time, pkt, -1,
+                              self.source.index, self.window_size)
+            self.send_train(train, curr_time)
+
@@ -0,0 +1,311 @@
+import packet
+import event
+from pqueue import enqueue
+from host import Host
+from reassembly import ReorderBuffer
+
+'''
+Fluid-flow model for fast-forwarding long-lived flows.
+
+A fluid flow is a sending rate of window_size / RTT packets per second
+instead of individual packets, and each link carries a fluid queue
+(Link.fluid_queue, in bytes) that fills at the rate its flows offer beyond
+the link rate and loses whatever doesn't fit in the buffer. FluidModel
+integrates these with a fixed time step from a FluidStep event chain in the
+simulation's own scheduler:
+
+    RTT     propagation and transmission delay of the path there and back
+            plus the queueing delay (fluid and packet queues) on every link
+    Reno    dW/dt = 1/RTT per ACK in slow start (W/RTT), 1/W per ACK in
+            congestion avoidance (1/RTT), less W/2 per lost packet
+    FAST    dW/dt = GAMMA / update_period * (baseRTT / RTT * W + ALPHA - W),
+            less W/2 per lost packet
+
+Paths follow the routers' forwarding tables at every step, so routing
+(Bellman-Ford or oracle, which keeps running as usual) moves fluid flows
+too, and link costs include the fluid queue.
+
+Fluid flows and links update the same attributes the packet model does
+(window_size, curr_RTT, sent_packets, received_packets, lost_packets,
+aggr_flow_rate, and buffer occupancy through fluid_queue), so they are
+sampled into the same metric series. Packet counters stay whole numbers:
+the fractions of a packet sent, delivered or lost in a step are carried
+over to later steps.
+
+Flows can be kept at packet level (packet_flows). They share links with
+the fluid: a congested link serves the two in proportion to the rates they
+arrive at (packets' averaged over PACKET_RATE_WINDOW), and packets see the
+link rate less what the fluid was served and the buffer less the fluid
+queue. Links get their own rate back once the fluid is gone.
+
+With until, every fluid flow is handed over to the packet model at that
+time: it resumes from its last acknowledged packet with the window it
+reached, pacing the first window over one round trip. Flows starting
+after until are simulated at packet level only.
+'''
+
+def whole_packets(parts, i, amount):
+    '''
+    Adds amount (packets, possibly fractional) to parts[i] and returns the
+    whole packets in it, leaving the fraction in parts[i]. Sums within
+    rounding error of a whole packet count as the whole packet.
+    '''
+    total = parts[i] + amount
+    whole = int(total + 1e-9)
+    parts[i] = max(total - whole, 0.0)
+    return whole
+
+class FluidModel(object):
+    # Integration time step in simulated seconds
+    STEP = 0.001
+
+    # Share of a link's rate always left to the other kind of traffic
+    MIN_SHARE = 0.05
+
+    # Time constant (seconds) of the moving average of the rate packets
+    # arrive at each link, which is bursty at the scale of one step
+    PACKET_RATE_WINDOW = 0.05
+
+    def __init__(self, sim, packet_flows=(), until=None, step=None):
+        self.sim = sim
+        self.flows = [f for f in sim.flows if f.id not in packet_flows and
+                      (until is None or f.start_time < until)]
+        self.until = until
+        self.step = FluidModel.STEP if step is None else step
+
+        # Packet-level flows share the links
+        self.hybrid = len(self.flows) < len(sim.flows)
+
+        # The links' own rate and buffer size, by link index. In hybrid runs
+        # Link.rate and Link.buffer_size are what is left for packets.
+        self.rate = [l.rate for l in sim.links]
+        self.buffer_size = [l.buffer_size for l in sim.links]
+
+        # Link.aggr_flow_rate after the last step, to tell how much packet
+        # traffic a link accepted since
+        self.seen_bits = [0.0] * len(sim.links)
+        self.pkt_rate = [0.0] * len(sim.links)
+
+        # Fraction of the fluid offered to each link that it lost in the
+        # last step
+        self.loss = [0.0] * len(sim.links)
+
+        # Fractions of a packet lost by each link, and sent and delivered by
+        # each flow, by index, not yet added to their packet counters
+        self.lost_part = [0.0] * len(sim.links)
+        self.sent_part = [0.0] * len(sim.flows)
+        self.received_part = [0.0] * len(sim.flows)
+
+        # Forward and reverse path (as link indices) and base RTT of each
+        # flow, by flow, for the forwarding tables they were found with
+        self.routes = {}
+        self.tables = None
+
+    def start(self):
+        ''' Schedules the first step '''
+        enqueue(event.FluidStep(0.0, self))
+
+    def path(self, src, dst):
+        '''
+        Returns the links from node src to node dst along the current
+        forwarding tables, or None if there is no route
+        '''
+        links = []
+        node, lnk = src, src.link
+        for hop in xrange(len(self.sim.nodes)):
+            links.append(lnk)
+            node = lnk.get_receiver(node)
+            if node is dst:
+                return links
+            if isinstance(node, Host):
+                return None
+            lnk = node.forwarding[dst.index]
+            if lnk is None:
+                return None
+        return None
+
+    def update_routes(self):
+        '''
+        Finds the flows' paths again if any router's forwarding table
+        changed (compile_forwarding builds a new one each time)
+        '''
+        tables = [r.forwarding for r in self.sim.routers]
+        if self.tables is not None and \
+           all(a is b for a, b in zip(tables, self.tables)):
+            return
+        self.tables = tables
+
+        size = packet.DataPkt.PACKET_SIZE
+        ack_size = packet.Ack.ACK_SIZE
+        rate = self.rate
+        self.routes = {}
+        for f in self.flows:
+            fwd = self.path(f.source, f.destination)
+            rev = self.path(f.destination, f.source)
+            if fwd is None or rev is None:
+                continue
+            base = sum(l.prop_delay + size / rate[l.index] for l in fwd) + \
+                   sum(l.prop_delay + ack_size / rate[l.index] for l in rev)
+            self.routes[f] = ([l.index for l in fwd], [l.index for l in rev],
+                              base)
+
+    def advance(self, time):
+        '''
+        Integrates the model over one step from time. Returns False once
+        there is nothing left to integrate.
+        '''
+        if self.until is not None and time >= self.until:
+            self.handover(time)
+            return False
+
+        sim = self.sim
+        dt = self.step
+        size = packet.DataPkt.PACKET_SIZE
+        ack_size = packet.Ack.ACK_SIZE
+        rate = self.rate
+        loss = self.loss
+        avg = min(dt / FluidModel.PACKET_RATE_WINDOW, 1.0)
+        self.update_routes()
+
+        # Rates the fluid flows offer to each link, in bytes per second
+        data_in = [0.0] * len(sim.links)
+        ack_in = [0.0] * len(sim.links)
+        delay = [(l.fluid_queue + l.buffer_load) / rate[l.index]
+                 for l in sim.links]
+
+        active = []
+        for f in self.flows:
+            if f.done_sending or time < f.start_time or f not in self.routes:
+                continue
+            fwd, rev, base = self.routes[f]
+            rtt = base
+            for i in fwd:
+                rtt += delay[i]
+            for i in rev:
+                rtt += delay[i]
+            x = min(f.window_size / rtt, (f.num_packets - f.sent_packets -
+                                          self.sent_part[f.index]) / dt)
+
+            kept = 1.0
+            for i in fwd:
+                kept *= 1.0 - loss[i]
+                data_in[i] += x * size
+            for i in rev:
+                ack_in[i] += x * kept * ack_size
+            active.append((f, base, rtt, x, 1.0 - kept))
+
+        if not active and all(f.done_sending for f in self.flows):
+            self.restore_links()
+            return False
+
+        for l in sim.links:
+            i = l.index
+            c = rate[i]
+            pkt_rate = self.pkt_rate[i] = self.pkt_rate[i] + avg * \
+                ((l.aggr_flow_rate - self.seen_bits[i]) / 8.0 / dt -
+                 self.pkt_rate[i])
+            self.seen_bits[i] = l.aggr_flow_rate
+
+            inflow = data_in[i] + ack_in[i]
+            if inflow == 0 and l.fluid_queue == 0:
+                loss[i] = 0.0
+                if self.hybrid:
+                    l.rate = c
+                    l.buffer_size = self.buffer_size[i]
+                continue
+
+            # A congested link serves fluid and packets in proportion to
+            # the rates they arrive at, as a FIFO would
+            if inflow + pkt_rate > c:
+                avail = c * inflow / (inflow + pkt_rate)
+            else:
+                avail = c - pkt_rate
+            avail = max(avail, FluidModel.MIN_SHARE * c)
+
+            q_old = l.fluid_queue
+            q = max(q_old + (inflow - avail) * dt, 0.0)
+            lost = max(q - max(self.buffer_size[i] - l.buffer_load, 0.0), 0.0)
+            q -= lost
+            loss[i] = lost / (inflow * dt) if inflow > 0 else 0.0
+
+            l.fluid_queue = q
+            lost_data = loss[i] * data_in[i] * dt
+            l.lost_packets += whole_packets(self.lost_part, i, lost_data / size)
+            l.aggr_flow_rate += (data_in[i] * dt - lost_data) * 8
+            self.seen_bits[i] = l.aggr_flow_rate
+            sim.dirty_links.add(l)
+
+            if self.hybrid:
+                served = inflow + (q_old - q - lost) / dt
+                l.rate = max(c - served, FluidModel.MIN_SHARE * c)
+                l.buffer_size = max(self.buffer_size[i] - q, size)
+
+        for f, base, rtt, x, p in active:
+            w = f.window_size
+            acks = x * (1.0 - p)
+            if f.TCP_ALG == 'fast':
+                dw = f.GAMMA / f.update_period * \
+                     (base / rtt * w + f.ALPHA - w) * dt
+                dw = min(dw, w * dt / f.update_period)
+                f.min_RTT = base
+            elif w < f.ssthreshold:
+                dw = acks * dt
+            else:
+                dw = acks / w * dt
+
+            if p > 0:
+                dw -= x * p * dt * w / 2
+                if f.TCP_ALG == 'reno' and w < f.ssthreshold:
+                    f.ssthreshold = max(w / 2, 2)
+
+            f.window_size = max(w + dw, 1.0)
+            f.curr_RTT = rtt
+            f.sent_packets += whole_packets(self.sent_part, f.index, x * dt)
+            f.received_packets += whole_packets(self.received_part, f.index,
+                                                acks * dt)
+            f.curr_pkt = min(f.sent_packets, f.num_packets)
+            if f.curr_pkt == f.num_packets:
+                f.done_sending = True
+            sim.dirty_flows.add(f)
+        return True
+
+    def restore_links(self):
+        ''' Empties the fluid queues and gives packets the whole links '''
+        for l in self.sim.links:
+            l.rate = self.rate[l.index]
+            l.buffer_size = self.buffer_size[l.index]
+            l.fluid_queue = 0.0
+
+    def handover(self, time):
+        ''' Hands every unfinished fluid flow over to the packet model '''
+        self.restore_links()
+
+        for f in self.flows:
+            if f.done_sending:
+                continue
+
+            # Resume from the last packet the fluid delivered
+            acked = f.received_packets
+            f.curr_pkt = acked
+            f.sent_packets = acked
+            f.received_packets = acked
+            rbuf = ReorderBuffer()
+            rbuf.expected = acked
+            f.destination.reassembly[f.index] = rbuf
+
+            # Pace the window over one round trip, at the fluid's rate; a
+            # burst of a whole window overflows the emptied buffers
+            window = max(int(f.window_size), 1)
+            gap = f.curr_RTT / window if f.curr_RTT else 0.0
+            end = min(f.num_packets, acked + window)
+            while f.curr_pkt < end:
+                send_time = time + (f.curr_pkt - acked) * gap
+                f.makePacket(f.curr_pkt, send_time)
+                f.unacknowledged[f.curr_pkt] = send_time
+                f.curr_pkt += 1
+                f.sent_packets += 1
+            if f.curr_pkt == f.num_packets:
+                f.done_sending = True
+
+            if f.TCP_ALG == 'fast':
+                f.start_window_updates(time)
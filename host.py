@@ -1,10 +1,16 @@
-from pqueue import event_queue, enqueue
+from pqueue import enqueue, cancel
 import event
 import packet
+from reassembly import ReorderBuffer
 
 class Host:
-    # Map of host ids to Host objects, this will be populated by the parser
-    h_map = {}
+    # Delayed ACKs: in-order packets are acknowledged every ACK_EVERY
+    # packets, or ACK_DELAY seconds after the first one not acknowledged
+    # yet, whichever comes first. Out-of-order packets and packets that
+    # arrive while there is a gap are acknowledged right away, so
+    # duplicate ACKs still signal losses. 1 acknowledges every packet.
+    ACK_EVERY = 1
+    ACK_DELAY = 0.04
 
     def __init__(self, host_id, link):
         self.id = host_id
@@ -12,35 +18,34 @@ class Host:
         # Each host is connected to a single link.
         self.link = link
 
-        # Hash table recording what packet we're expecting
-        # from which flows.
-        self.expected_pkt = {}
-        self.received_pkts = {}
+        # Reassembly state (packets received so far) of each flow
+        # we receive from, by flow index. Sized by the parser.
+        self.reassembly = []
+
+        # In-order packets not acknowledged yet and the delayed ACK timer,
+        # by flow index
+        self.unacked = {}
+        self.ack_timers = {}
 
     def receive(self, pkt, time):
         # Pass ACKs to flows to handle congestion control and dropped packets
-        if (isinstance(pkt, packet.Ack)):
+        if pkt.kind == packet.ACK:
             pkt.flow.receiveAck(pkt, time)
+            packet.releaseAck(pkt)
         
         else:
-            # Only send ACKs for packets we have not yet recieved 
-            # (next_pkt = pkt.number) or packets out of order
-            # (next_pkt < pkt.number).
-            # If first packet from flow, then set expected_pkt to 0.
-            if self.expected_pkt.setdefault(pkt.flow.id, 0) <= pkt.number:
-
-                # If the packet is the one we're expecting,
-                # increment its value in next_packet.
-                if self.expected_pkt[pkt.flow.id] == pkt.number:
-                    self.expected_pkt[pkt.flow.id] += 1
-                    while self.expected_pkt[pkt.flow.id] in \
-                    self.received_pkts.setdefault(pkt.flow.id, []):
-                        self.received_pkts[pkt.flow.id].remove(self.expected_pkt[pkt.flow.id])
-                        self.expected_pkt[pkt.flow.id] += 1
-                else:
-                    self.received_pkts.setdefault(pkt.flow.id, []).append(pkt.number)
-
-                ack = packet.makeAck(pkt.flow, self.expected_pkt[pkt.flow.id])
+            # Only send ACKs for packets we have not yet recieved
+            # (packets at or after the next one expected, in or out
+            # of order).
+            rbuf = self.reassembly[pkt.flow.index]
+            if rbuf is None:
+                rbuf = self.reassembly[pkt.flow.index] = ReorderBuffer()
+
+            if self.ACK_EVERY > 1:
+                self.receive_delayed(pkt, rbuf, time)
+            elif rbuf.add(pkt.number):
+                # ACK with the next packet we expect in order
+                ack = packet.makeAck(pkt.flow, rbuf.expected)
                 enqueue(event.SendPacket(time, ack, self.link, self))
 
                 pkt.flow.received_packets += 1
@@ -48,7 +53,44 @@ class Host:
             # If the incoming packet has a number LESS THAN the one
             # we're expecting, it's a duplicate and we don't care
             # about it. Don't send an ACK.
-            
+
+    def receive_delayed(self, pkt, rbuf, time):
+        ''' Accepts a data packet, delaying its ACK if it is in order '''
+        flw = pkt.flow
+        expected = rbuf.expected
+        gap = len(rbuf.pending) > 0
+        if not rbuf.add(pkt.number):
+            return
+        flw.received_packets += 1
+
+        count = self.unacked.pop(flw.index, 0)
+        if pkt.number == expected:
+            count += 1
+        if not gap and pkt.number == expected and count < self.ACK_EVERY:
+            self.unacked[flw.index] = count
+            if flw.index not in self.ack_timers:
+                timer = event.DelayedAck(time + self.ACK_DELAY, self, flw)
+                self.ack_timers[flw.index] = timer
+                enqueue(timer)
+        else:
+            self.send_ack(flw, max(count, 1), time)
+
+    def send_ack(self, flw, segments, time):
+        ''' Acknowledges the next packet expected from flw '''
+        timer = self.ack_timers.pop(flw.index, None)
+        if timer is not None:
+            cancel(timer)
+        ack = packet.makeAck(flw, self.reassembly[flw.index].expected,
+                             segments)
+        enqueue(event.SendPacket(time, ack, self.link, self))
+
+    def ack_timeout(self, flw, time):
+        ''' Sends the ACK delayed for flw '''
+        self.ack_timers.pop(flw.index, None)
+        count = self.unacked.pop(flw.index, 0)
+        if count > 0:
+            self.send_ack(flw, count, time)
+
 
     def __str__(self):
         return "<Host ID: " + str(self.id) + ", Address: " + str(self.address) +  \
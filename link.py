@@ -1,18 +1,25 @@
+from collections import deque
 import packet
-import metrics
-from pqueue import get_global_time, global_time
+import tracing
+from pqueue import get_global_time
 from metrics import cprint
 PACKET_SIZE = 1024.0
 
 class Link:
-    ids = []
-
-    # Map of link ids to Link objects, this will be populated by the parser
-    l_map = {}
-
-    def __init__(self, link_id, rate, prop_delay, buffer_size):
+    # Link model: 'event' moves each packet through the buffer with a
+    # chain of CheckBuffer/BufferDoneProcessing events, 'analytic'
+    # computes each packet's departure time when it is sent (see transmit)
+    ENGINE = 'event'
+
+    # With the analytic engine, 'half' duplex links carry both directions
+    # through one buffer and transmitter, 'full' duplex links give each
+    # direction (by sending end) its own. Buffer occupancy metrics are the
+    # total of both directions either way.
+    DUPLEX = 'half'
+
+    def __init__(self, link_id, rate, prop_delay, buffer_size, sim):
         self.id = link_id
-        Link.ids.append(self.id)
+        self.sim = sim
 
         self.rate = rate       # in bytes per second
         self.prop_delay = prop_delay
@@ -20,15 +27,32 @@ class Link:
         # buffer size is passed in in bytes
         self.buffer_size = buffer_size
 
-        self.buffer = []
+        # FIFO of (packet, sender) tuples; a deque so taking the head of a
+        # deep buffer is O(1)
+        self.buffer = deque()
         self.buf_processing = False
         self.size_in_transit = 0
         self.curr_recipient = None
 
+        # For the analytic engine: the time the link finishes transmitting
+        # everything accepted so far, and the transmission start times and
+        # sizes of packets still waiting in the buffer, by direction (only
+        # the first is used by half duplex links), and the bytes waiting
+        self.next_free = [0.0, 0.0]
+        self.waiting = [deque(), deque()]
+        self.dir_load = [0, 0]
+
         # In bytes
         self.buffer_load = 0
         self.buffer_pkts = 0
 
+        # Bytes queued by fluid flows (see fluid.py)
+        self.fluid_queue = 0.0
+
+        # In parallel runs, the channel packets for the far end go to when
+        # it is simulated by another process (see parallel.py)
+        self.remote = None
+
         # Bellman-Ford link cost
         self.bf_lcost = 1
 
@@ -58,27 +82,105 @@ class Link:
     def buffer_add(self, buf_obj):
         # Buffer objects are (packet, sender) tuples
         pkt, sender = buf_obj
+        self.sim.dirty_links.add(self)
 
         # Drop packet if the buffer is full
         if self.buffer_load >= self.buffer_size:
             self.lost_packets += 1
             cprint ("%s dropped a packet. Total: %d" % (self.id, self.lost_packets))
+            tr = self.sim.tracer
+            if tr is not None:
+                tr.record(tracing.DROP, get_global_time(), pkt, self.index,
+                          sender.index, self.buffer_load)
+            if pkt.kind == packet.ACK:
+                packet.releaseAck(pkt)
             return
 
         self.buffer.append(buf_obj)
-        if isinstance(pkt, packet.DataPkt):
+        if pkt.kind == packet.DATA:
             self.aggr_flow_rate += pkt.size * 8
         self.buffer_load += pkt.size
         self.buffer_pkts += 1
 
+        tr = self.sim.tracer
+        if tr is not None:
+            tr.record(tracing.ENQUEUE, get_global_time(), pkt, self.index,
+                      sender.index, self.buffer_load)
 
     def buffer_get(self):
-        pkt, sender = self.buffer.pop(0)
+        pkt, sender = self.buffer.popleft()
+        self.sim.dirty_links.add(self)
         self.buffer_load -= pkt.size
         self.buffer_pkts -= 1
         self.size_in_transit = pkt.size
         return (pkt, sender)
 
+    def transmit(self, pkt, sender, time):
+        '''
+        Analytic FIFO engine. Accepts a packet onto the link at the given
+        time (dropping it if the buffer is full) and returns the time its
+        last bit arrives at the other end, or None if it was dropped.
+
+        Departures follow the Lindley recursion: a packet starts
+        transmitting when it arrives or when the link finishes the packet
+        ahead of it, whichever is later.
+        '''
+        self.sync(time)
+        self.sim.dirty_links.add(self)
+        d = 0 if self.DUPLEX == 'half' or sender is self.ends[0] else 1
+
+        # Drop packet if the buffer is full
+        if self.dir_load[d] >= self.buffer_size:
+            self.lost_packets += 1
+            cprint ("%s dropped a packet. Total: %d" % (self.id, self.lost_packets))
+            tr = self.sim.tracer
+            if tr is not None:
+                tr.record(tracing.DROP, time, pkt, self.index, sender.index,
+                          self.buffer_load)
+            if pkt.kind == packet.ACK:
+                packet.releaseAck(pkt)
+            return None
+
+        if pkt.kind == packet.DATA:
+            self.aggr_flow_rate += pkt.size * 8
+
+        start = max(time, self.next_free[d])
+        next_free = self.next_free[d] = start + pkt.size / self.rate
+
+        # The packet occupies the buffer until it starts transmitting
+        if start > time:
+            self.waiting[d].append((start, pkt.size))
+            self.dir_load[d] += pkt.size
+            self.buffer_load += pkt.size
+            self.buffer_pkts += 1
+        else:
+            self.size_in_transit = pkt.size
+        self.buf_processing = True
+
+        tr = self.sim.tracer
+        if tr is not None:
+            tr.record(tracing.ENQUEUE, time, pkt, self.index, sender.index,
+                      self.buffer_load)
+            tr.record(tracing.TRANSMIT, start, pkt, self.index, sender.index)
+
+        return next_free + self.prop_delay
+
+    def sync(self, time):
+        '''
+        Analytic FIFO engine. Brings buffer occupancy up to date by
+        releasing the packets that started transmitting by the given time.
+        '''
+        for d in (0, 1):
+            waiting = self.waiting[d]
+            while waiting and waiting[0][0] <= time:
+                start, size = waiting.popleft()
+                self.dir_load[d] -= size
+                self.buffer_load -= size
+                self.buffer_pkts -= 1
+                self.size_in_transit = size
+        self.buf_processing = self.next_free[0] > time or \
+                              self.next_free[1] > time
+
     def buffer_peek(self):
         if len(self.buffer) > 0:
             return self.buffer[0]
@@ -89,7 +191,10 @@ class Link:
         return len(self.buffer) == 0
 
     def update_metrics(self, time):
-        bufload = self.buffer_pkts
+        if self.ENGINE == 'analytic':
+            self.sync(time)
+
+        bufload = self.buffer_pkts + self.fluid_queue / PACKET_SIZE
         pktloss = self.lost_packets - self.prev_lost_packets
         self.prev_lost_packets = self.lost_packets
 
@@ -105,15 +210,21 @@ class Link:
             link_rate = 0
             update_link_rate = False
                   
-        metrics.update_link(self.id, bufload, pktloss, link_rate, time, update_link_rate)
+        self.sim.store.update_link(self.index, bufload, pktloss, link_rate, time,
+            update_link_rate)
 
     def set_linkcost(self):
         '''
         Set link cost for Bellman-Ford based on link occupancy
         '''
+        if self.ENGINE == 'analytic':
+            self.sync(get_global_time())
+
         self.bf_lcost = self.buffer_load + 1  # Add 1 to account for the link itself
         if self.buf_processing:
             self.bf_lcost += self.size_in_transit
+        if self.fluid_queue:
+            self.bf_lcost += self.fluid_queue
 
     def __str__(self):
         return "<Link ID: " + str(self.id) + ", Link Rate: " + str(self.rate) + \
@@ -124,6 +235,6 @@ class Link:
     __repr__ = __str__
 
 
-def set_linkcosts():
-    for link_id in Link.ids:
-        Link.l_map[link_id].set_linkcost()
+def set_linkcosts(links):
+    for lnk in links:
+        lnk.set_linkcost()
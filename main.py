@@ -1,33 +1,32 @@
+import os
 import sys
-from pqueue import *
-import event
 import link
-import host
-import packet
 import flow
 import metrics
 import router
+import host
 
 from parser import parse
+from simulation import Simulation
+from profiler import LoopProfiler
+from fluid import FluidModel
+import checkpoint
+import tracing
+import parallel
+
+def setup(infile, tcp_alg='reno', backend='heap', routing='bf', fluid=None):
+    '''
+    Parses a network description into a new Simulation and schedules its
+    initial events. Returns the simulation.
 
-def flows_done(flows):
-    for f in flows:
-        if f.done_sending is False:
-            return False
-    return True
-
-def initial_bf(routers):
-    for rtr in routers:
-        rtr.reset_distvec()
-        rtr.bf_updated = {}
-        rtr.bf_changed = False
-
-    for bf_round in range (len(routers)):
-        for rtr in routers:
-            for n_rtr in rtr.rneighbours:
-                n_dvec = router.Router.r_map[n_rtr].bf_distvec
-                n_rtr_link = rtr.rneighbours[n_rtr]
-                rtr.update_bf(n_rtr, n_dvec, n_rtr_link, 0, False)
+    fluid, if given, is a dict of FluidModel keyword arguments; the flows
+    it selects are then simulated as fluid (see fluid.py).
+    '''
+    sim = parse(infile, Simulation(tcp_alg, backend, routing))
+    if fluid is not None:
+        sim.fluid = FluidModel(sim, **fluid)
+    sim.start()
+    return sim
 
 if __name__ == "__main__":
     
@@ -37,54 +36,236 @@ if __name__ == "__main__":
             sys.argv.remove(i)
             metrics.VERBOSE = True
 
-    # Verify that a test case number was given
-    if len(sys.argv) != 3:
-        print "usage: python main.py [-v] [TEST_CASE_NO] [TCP_ALG]"
-        sys.exit(-1)
-    
-    # Read arguments to figure out what test case and TCP algorithm to use
-    TEST_CASE = sys.argv[1]
-    flow.Flow.TCP_ALG = sys.argv[2]
+    # Check for scheduler backend option
+    BACKEND = 'heap'
+    for i in list(sys.argv):
+        if i.startswith("--queue="):
+            sys.argv.remove(i)
+            BACKEND = i[len("--queue="):]
 
-    # Parser configuration
-    INFILE = './input/test_case_' + TEST_CASE
+    # Check for routing mode option
+    ROUTING = 'bf'
+    for i in list(sys.argv):
+        if i.startswith("--routing="):
+            sys.argv.remove(i)
+            ROUTING = i[len("--routing="):]
 
+    # Check for initial route cache option
+    for i in list(sys.argv):
+        if i == "--route-cache":
+            sys.argv.remove(i)
+            router.ROUTE_CACHE_DIR = router.DEFAULT_ROUTE_CACHE_DIR
+        elif i.startswith("--route-cache="):
+            sys.argv.remove(i)
+            router.ROUTE_CACHE_DIR = i[len("--route-cache="):]
 
-    # Lists of each object returned from the parser
-    hosts, links, routers, flows = parse(INFILE)
+    # Check for retransmission timer option
+    for i in list(sys.argv):
+        if i.startswith("--timer="):
+            sys.argv.remove(i)
+            flow.Flow.TIMER_MODE = i[len("--timer="):]
 
-    # Order link IDs for consistent metric reporting
-    metrics.link_ids = link.Link.l_map.keys()
-    metrics.link_ids.sort()
-    link.Link.ids.sort()
+    # Check for delayed ACK options
+    for i in list(sys.argv):
+        if i.startswith("--ack-every="):
+            sys.argv.remove(i)
+            host.Host.ACK_EVERY = int(i[len("--ack-every="):])
+        elif i.startswith("--ack-delay="):
+            sys.argv.remove(i)
+            host.Host.ACK_DELAY = float(i[len("--ack-delay="):])
 
-    metrics.flow_ids = flow.Flow.f_map.keys()
+    # Check for TCP FAST window update option
+    for i in list(sys.argv):
+        if i.startswith("--fast-updates="):
+            sys.argv.remove(i)
+            flow.Flow.WINDOW_UPDATES = i[len("--fast-updates="):]
+
+    # Check for link engine option
+    for i in list(sys.argv):
+        if i.startswith("--link="):
+            sys.argv.remove(i)
+            link.Link.ENGINE = i[len("--link="):]
+        elif i.startswith("--duplex="):
+            sys.argv.remove(i)
+            link.Link.DUPLEX = i[len("--duplex="):]
+
+    # Check for metric sampling interval option
+    for i in list(sys.argv):
+        if i.startswith("--sample="):
+            sys.argv.remove(i)
+            metrics.SAMPLE_INTERVAL = float(i[len("--sample="):])
 
+    # Check for metric export option
+    METRICS_FILE = None
+    for i in list(sys.argv):
+        if i.startswith("--save="):
+            sys.argv.remove(i)
+            METRICS_FILE = i[len("--save="):]
+
+    # Check for headless option and the links/flows to plot
+    for i in list(sys.argv):
+        if i == "--headless":
+            sys.argv.remove(i)
+            metrics.HEADLESS = True
+        elif i.startswith("--links="):
+            sys.argv.remove(i)
+            links = i[len("--links="):]
+            metrics.plot_links = None if links == "all" else links.split(",")
+        elif i.startswith("--flows="):
+            sys.argv.remove(i)
+            flows = i[len("--flows="):]
+            metrics.plot_flows = None if flows == "all" else flows.split(",")
 
-    # Initial BF routing
-    router.set_rneighbours()
-    initial_bf(routers)
+    # Check for event loop profiler option
+    PROFILE = False
+    PROFILE_FILE = None
+    for i in list(sys.argv):
+        if i == "--profile":
+            sys.argv.remove(i)
+            PROFILE = True
+        elif i.startswith("--profile="):
+            sys.argv.remove(i)
+            PROFILE = True
+            PROFILE_FILE = i[len("--profile="):]
 
-    # Set rerouting to happen periodically
-    enqueue(event.Reroute(event.Reroute.WAIT_INTERVAL, 1))
+    # Check for fluid model options
+    FLUID = None
+    for i in list(sys.argv):
+        if i == "--fluid":
+            sys.argv.remove(i)
+            FLUID = FLUID or {}
+        elif i.startswith("--fluid-until="):
+            sys.argv.remove(i)
+            FLUID = FLUID or {}
+            FLUID['until'] = float(i[len("--fluid-until="):])
+        elif i.startswith("--packet-flows="):
+            sys.argv.remove(i)
+            FLUID = FLUID or {}
+            FLUID['packet_flows'] = i[len("--packet-flows="):].split(",")
+        elif i.startswith("--fluid-step="):
+            sys.argv.remove(i)
+            FLUID = FLUID or {}
+            FLUID['step'] = float(i[len("--fluid-step="):])
 
-    for flow in flows:
-        flow.startFlow()
+    # Check for packet trace option
+    TRACE_FILE = None
+    for i in list(sys.argv):
+        if i.startswith("--trace="):
+            sys.argv.remove(i)
+            TRACE_FILE = i[len("--trace="):]
 
-    while (qempty() == False and flows_done(flows) is False):
-        event = dequeue()
-        set_global_time(event.start_time)
-        event.process()
+    # Check for checkpoint options
+    CHECKPOINT_AT = []
+    CHECKPOINT_EVERY = None
+    CHECKPOINT_FILE = None
+    RESTORE_FILE = None
+    for i in list(sys.argv):
+        if i.startswith("--checkpoint-at="):
+            sys.argv.remove(i)
+            CHECKPOINT_AT = [float(t) for t in
+                             i[len("--checkpoint-at="):].split(",")]
+        elif i.startswith("--checkpoint-every="):
+            sys.argv.remove(i)
+            CHECKPOINT_EVERY = float(i[len("--checkpoint-every="):])
+        elif i.startswith("--checkpoint-file="):
+            sys.argv.remove(i)
+            CHECKPOINT_FILE = i[len("--checkpoint-file="):]
+        elif i.startswith("--restore="):
+            sys.argv.remove(i)
+            RESTORE_FILE = i[len("--restore="):]
 
-        # Update link and flow metrics
-        for lnk in links:
-            lnk.update_metrics(get_global_time())
-        for flow in flows:
-            flow.update_metrics(get_global_time())
+    # Check for parallel option
+    PARALLEL = None
+    for i in list(sys.argv):
+        if i.startswith("--parallel="):
+            sys.argv.remove(i)
+            PARALLEL = int(i[len("--parallel="):])
+    if PARALLEL is not None and (FLUID is not None or TRACE_FILE is not None
+            or PROFILE or CHECKPOINT_AT or CHECKPOINT_EVERY or RESTORE_FILE):
+        print "--parallel can't be combined with the fluid model, tracing, " \
+              "profiling or checkpoints"
+        sys.exit(-1)
 
-        metrics.report_metrics(get_global_time())
+    # Verify that a test case number was given, unless restoring
+    if len(sys.argv) != 3 and (RESTORE_FILE is None or len(sys.argv) != 1):
+        print "usage: python main.py [-v] [--queue=heap|calendar] " \
+              "[--routing=bf|oracle|static] [--route-cache[=DIR]] " \
+              "[--timer=packet|flow] [--fast-updates=flow|batched] " \
+              "[--ack-every=N] [--ack-delay=SECONDS] " \
+              "[--link=event|analytic] " \
+              "[--duplex=half|full] [--parallel=N] " \
+              "[--sample=SECONDS] " \
+              "[--save=FILE.npz|FILE.csv] [--headless] " \
+              "[--links=L1,L2,...|all] [--flows=F1,F2,...|all] " \
+              "[--profile[=FILE.json]] [--trace=FILE[.gz]] " \
+              "[--fluid] [--fluid-until=SECONDS] [--packet-flows=F1,F2,...] " \
+              "[--fluid-step=SECONDS] " \
+              "[--checkpoint-at=T1,T2,...] [--checkpoint-every=SECONDS] " \
+              "[--checkpoint-file=PATTERN] " \
+              "([TEST_CASE_NO] [TCP_ALG] | --restore=FILE.ckpt)"
+        sys.exit(-1)
     
-    metrics.plot_metrics(True, get_global_time())
+    if RESTORE_FILE is None:
+        # Read arguments to figure out what test case and TCP algorithm to use
+        TEST_CASE = sys.argv[1]
+        TCP_ALG = sys.argv[2]
+        RUN_NAME = '%s_%s' % (TEST_CASE, TCP_ALG)
+
+        # Parser configuration
+        INFILE = './input/test_case_' + TEST_CASE
+    else:
+        # A restored run is named after its checkpoint
+        RUN_NAME = os.path.splitext(os.path.basename(RESTORE_FILE))[0]
+
+    # Headless runs always save their metrics for plot.py
+    if metrics.HEADLESS and METRICS_FILE is None:
+        METRICS_FILE = 'metrics_%s.csv' % RUN_NAME
+
+    if CHECKPOINT_FILE is None:
+        CHECKPOINT_FILE = 'checkpoint_%s_%%g.ckpt' % RUN_NAME
+
+
+    prof = LoopProfiler() if PROFILE else None
+    if PARALLEL is not None:
+        # Parallel runs always use analytic full duplex links and static
+        # routes (see parallel.py)
+        sim = parallel.run(INFILE, TCP_ALG, PARALLEL, BACKEND)
+    else:
+        if RESTORE_FILE is None:
+            sim = setup(INFILE, TCP_ALG, BACKEND, ROUTING, FLUID)
+        else:
+            sim = checkpoint.load(RESTORE_FILE)
+            print ("Restored %s at time %g" % (RESTORE_FILE, sim.time))
+        if TRACE_FILE is not None:
+            sim.tracer = tracing.TraceWriter(TRACE_FILE, sim)
+        if CHECKPOINT_AT or CHECKPOINT_EVERY:
+            checkpoint.run(sim, CHECKPOINT_FILE, CHECKPOINT_AT,
+                           CHECKPOINT_EVERY, prof)
+        else:
+            sim.run(profiler=prof)
+
+    if prof is not None:
+        print (prof.report())
+        if PROFILE_FILE is not None:
+            prof.dump(PROFILE_FILE)
+            print ("Profile saved to %s" % PROFILE_FILE)
+
+    if sim.tracer is not None:
+        sim.tracer.close()
+        print ("%d trace records saved to %s" % (sim.tracer.records,
+                                                 TRACE_FILE))
+
+    if sim.fast is not None:
+        print ("%d FAST window updates in %d ticks (%d events saved)" % \
+            (sim.fast.updates, sim.fast.ticks, sim.fast.saved()))
+
+    metrics.cprint("%d events dequeued, %d cancelled" % \
+        (sim.scheduler.pops, sim.scheduler.cancels))
+    if METRICS_FILE is not None:
+        sim.store.save(METRICS_FILE)
+        print ("Metrics saved to %s" % METRICS_FILE)
+    if not metrics.HEADLESS:
+        metrics.plot_metrics(sim.store, True)
 
     print ("SIMULATION END")
 
@@ -1,138 +1,296 @@
-import matplotlib.pyplot as plt
+from array import array
 
-# Get rid of matplotlib warnings
-import warnings
-import matplotlib.cbook
-warnings.filterwarnings("ignore",category=matplotlib.cbook.mplDeprecation)
+# matplotlib is imported on first use (see get_plt) so that headless runs
+# don't need it.
+plt = None
+fig = None
 
-last_report_time = -1
+NAN = float('nan')
 
-# Link metrics
-buffer_load = {}
-packet_loss = {}
-flow_rate = {}
+VERBOSE = False
 
-# Flow metrics
-send_rate = {}
-receive_rate = {}
-round_trip_time = {}
-window_sizes = {}
+# Never draw during the run (metrics are saved for plot.py instead)
+HEADLESS = False
 
-link_ids = []
-flow_ids = []
+# Links and flows to plot; None plots all of them. Only links L1, L2 and L3
+# are plotted by default.
+plot_links = ['L1', 'L2', 'L3']
+plot_flows = None
 
-l_times = {}
-lr_times = {}
-fr_times = {}
-f_times = {}
+# Series longer than this are min/max decimated before plotting
+MAX_PLOT_POINTS = 4000
 
-VERBOSE = False
+# Interval (in simulated seconds) between metric samples
+SAMPLE_INTERVAL = 0.01
+
+# Interval (in simulated seconds) between live plots
+REPORT_INTERVAL = 10
 
 colors = ['yellowgreen', 'cornflowerblue', 'salmon', 'mediumpurple', \
           'goldenrod', 'mediumaquamarine', 'darkblue', 'orchid', \
           'mediumvioletred', 'cadetblue']
 avg_color = 'plum'
 
-fig = plt.figure(figsize=(10, 10))
-
-def get_num(_id):
-    return int(_id[1:])
-
-# appends an item to the end of a list mapped from a key in a dictionary
-def dict_insert(key, d, item):
-    if key not in d:
-        d[key] = [item]
-    else:
-        d[key].append(item)
-
-# Update link metrics
-def update_link(link_id, bufload, pktloss, flowrate, time, update_link_rate):
-    global buffer_load, packet_loss, flow_rate, l_times
-
-    dict_insert(link_id, buffer_load, bufload)
-    dict_insert(link_id, packet_loss, pktloss)
-    dict_insert(link_id, l_times, time)
-    
-    # Only update link rate in discrete time intervals
-    if update_link_rate:
-        dict_insert(link_id, flow_rate, flowrate)
-        dict_insert(link_id, lr_times, time)
-
-# Update flow metrics
-def update_flow(flow_id, send_r, rec_r, rtts, w_size, time, update_flow_rate):
-    global send_rate, receive_rate, round_trip_time
-
-    dict_insert(flow_id, send_rate, send_r)
-    
-    # Only update flow rate in discrete time intervals
-    if update_flow_rate:
-        dict_insert(flow_id, receive_rate, rec_r)
-        dict_insert(flow_id, fr_times, time)
-
-    dict_insert(flow_id, round_trip_time, rtts)
-    dict_insert(flow_id, window_sizes, w_size)
-    dict_insert(flow_id, f_times, time)
-
-def report_metrics(time):
-    global last_report_time
-    if time > last_report_time + 10:
-        plot_metrics(False, time)
-        last_report_time = time
-
-
-def plot_metrics(final, time):
-    global buffer_load, packet_loss, flow_rate, fig, l_times, f_times, \
-        send_rate, receive_rate, round_trip_time, window_sizes
-
-    for i in link_ids:
-        if get_num(i) not in [1, 2, 3]:
+def get_plt():
+    global plt, fig
+    if plt is None:
+        import matplotlib.pyplot
+        plt = matplotlib.pyplot
+
+        # Get rid of matplotlib warnings
+        import warnings
+        import matplotlib.cbook
+        warnings.filterwarnings("ignore",category=matplotlib.cbook.mplDeprecation)
+
+        fig = plt.figure(figsize=(10, 10))
+    return plt
+
+def get_color(idx):
+    return colors[idx % len(colors)]
+
+class MetricStore(object):
+    '''
+    Columnar store for link and flow metrics. Links and flows are given
+    dense integer indices in the order they are registered with entity()
+    (the parser registers them in the same order as their own indices), and
+    every metric of every entity is a growable array('d') column, so a
+    sample costs 8 bytes instead of a boxed float plus a list slot.
+
+    Each metric series is paired with the column holding its sample times:
+    link rates and flow rates are sampled less often than the rest.
+    '''
+    LINK_METRICS = {'buffer_load': 'l_times', 'packet_loss': 'l_times',
+                    'flow_rate': 'lr_times'}
+    FLOW_METRICS = {'send_rate': 'f_times', 'round_trip_time': 'f_times',
+                    'window_sizes': 'f_times', 'receive_rate': 'fr_times'}
+
+    def __init__(self):
+        self.ids = {'link': [], 'flow': []}
+        self.index = {'link': {}, 'flow': {}}
+        self.columns = {}
+        for name in MetricStore.column_names('link'):
+            self.columns[name] = []
+        for name in MetricStore.column_names('flow'):
+            self.columns[name] = []
+
+    @staticmethod
+    def column_names(kind):
+        metrics = MetricStore.LINK_METRICS if kind == 'link' \
+            else MetricStore.FLOW_METRICS
+        return sorted(set(metrics.keys()) | set(metrics.values()))
+
+    def entity(self, kind, _id):
+        ''' Returns the dense index of a link or flow, adding it if new '''
+        idx = self.index[kind].get(_id, None)
+        if idx is None:
+            idx = len(self.ids[kind])
+            self.ids[kind].append(_id)
+            self.index[kind][_id] = idx
+            for name in MetricStore.column_names(kind):
+                self.columns[name].append(array('d'))
+        return idx
+
+    def has(self, kind, _id):
+        ''' Whether the given link or flow has any samples '''
+        if _id not in self.index[kind]:
+            return False
+        t_name = 'l_times' if kind == 'link' else 'f_times'
+        return len(self.columns[t_name][self.index[kind][_id]]) > 0
+
+    def column(self, name, _id):
+        ''' Returns the column of metric name for the given link or flow '''
+        kind = 'link' if name in MetricStore.column_names('link') else 'flow'
+        return self.columns[name][self.index[kind][_id]]
+
+    def nbytes(self):
+        return sum(len(col) * col.itemsize for cols in self.columns.values()
+                   for col in cols)
+
+    @staticmethod
+    def load(path):
+        ''' Reads a MetricStore back from a file written by save() '''
+        store = MetricStore()
+        if path.endswith('.npz'):
+            import numpy as np
+            data = np.load(path)
+            for key in sorted(data.files):
+                kind, _id, name = key.split('/')
+                idx = store.entity(kind, _id)
+                store.columns[name][idx].fromstring(data[key].tostring())
+            return store
+
+        with open(path, 'r') as f:
+            f.readline()
+            for line in f:
+                kind, _id, name, t, v = line.rstrip('\n').split(',')
+                metrics = MetricStore.LINK_METRICS if kind == 'link' \
+                    else MetricStore.FLOW_METRICS
+                idx = store.entity(kind, _id)
+                store.columns[name][idx].append(float(v))
+
+                # Time columns are shared between metrics; only fill them
+                # from the first metric that uses them
+                t_name = metrics[name]
+                if name == min(m for m in metrics if metrics[m] == t_name):
+                    store.columns[t_name][idx].append(float(t))
+        return store
+
+    # Update link metrics
+    def update_link(self, idx, bufload, pktloss, flowrate, time,
+                    update_link_rate):
+        ''' Appends a sample for the link with index idx '''
+        cols = self.columns
+
+        cols['buffer_load'][idx].append(bufload)
+        cols['packet_loss'][idx].append(pktloss)
+        cols['l_times'][idx].append(time)
+
+        # Only update link rate in discrete time intervals
+        if update_link_rate:
+            cols['flow_rate'][idx].append(flowrate)
+            cols['lr_times'][idx].append(time)
+
+    # Update flow metrics
+    def update_flow(self, idx, send_r, rec_r, rtts, w_size, time,
+                    update_flow_rate):
+        ''' Appends a sample for the flow with index idx '''
+        cols = self.columns
+
+        cols['send_rate'][idx].append(send_r)
+
+        # Only update flow rate in discrete time intervals
+        if update_flow_rate:
+            cols['receive_rate'][idx].append(rec_r)
+            cols['fr_times'][idx].append(time)
+
+        # RTT is None until the first ACK arrives
+        cols['round_trip_time'][idx].append(NAN if rtts is None else rtts)
+        cols['window_sizes'][idx].append(w_size)
+        cols['f_times'][idx].append(time)
+
+    def save(self, path):
+        '''
+        Exports every column. Files ending in .npz are written with NumPy
+        (one array per "<kind>/<id>/<metric>" key); anything else is written
+        as CSV with one (kind, id, metric, time, value) row per sample.
+        '''
+        if path.endswith('.npz'):
+            import numpy as np
+            arrays = {}
+            for kind in ('link', 'flow'):
+                for _id in self.ids[kind]:
+                    if not self.has(kind, _id):
+                        continue
+                    for name in MetricStore.column_names(kind):
+                        arrays['%s/%s/%s' % (kind, _id, name)] = \
+                            np.frombuffer(self.column(name, _id), dtype='d')
+            np.savez(path, **arrays)
+            return
+
+        with open(path, 'w') as f:
+            f.write('kind,id,metric,time,value\n')
+            for kind, metrics in (('link', MetricStore.LINK_METRICS),
+                                  ('flow', MetricStore.FLOW_METRICS)):
+                for _id in self.ids[kind]:
+                    for name in sorted(metrics):
+                        times = self.column(metrics[name], _id)
+                        values = self.column(name, _id)
+                        for t, v in zip(times, values):
+                            f.write('%s,%s,%s,%r,%r\n' % (kind, _id, name, t, v))
+
+def decimate(t, v, max_points):
+    '''
+    Min/max decimation: splits a series into max_points / 2 bins and keeps
+    the smallest and largest value of each, so peaks survive while the
+    number of points drawn stays bounded.
+    '''
+    import numpy as np
+    t = np.frombuffer(t, dtype='d') if isinstance(t, array) else np.asarray(t)
+    v = np.frombuffer(v, dtype='d') if isinstance(v, array) else np.asarray(v)
+    if len(v) <= max_points:
+        return t, v
+
+    starts = np.linspace(0, len(v), max_points / 2, endpoint=False).astype(int)
+    dec_t = np.repeat(t[starts], 2)
+    dec_v = np.empty(2 * len(starts))
+    dec_v[0::2] = np.fmin.reduceat(v, starts)
+    dec_v[1::2] = np.fmax.reduceat(v, starts)
+    return dec_t, dec_v
+
+def draw_metrics(store, links, flows, max_points=MAX_PLOT_POINTS):
+    '''
+    Draws the given links and flows of a MetricStore on the global figure
+    '''
+    get_plt()
+
+    for i in links:
+        if not store.has('link', i):
             continue
 
-        t = l_times[i]
-        clr_str = colors[get_num(i)]
+        clr_str = get_color(store.index['link'][i])
 
         ax_fr = fig.add_subplot(611)
         ax_fr.set_ylim((-1, 10))
         ax_fr.set_xlabel('time (s)')
         ax_fr.set_ylabel('link rate\n(Mbps)')
-        ax_fr.plot(lr_times[i], flow_rate[i], color=clr_str, label=i)
+        ax_fr.plot(*decimate(store.column('lr_times', i),
+            store.column('flow_rate', i), max_points), color=clr_str, label=i)
 
         ax_bl = fig.add_subplot(612)
         ax_bl.set_ylim((-1, 140))
         ax_bl.set_xlabel('time (s)')
         ax_bl.set_ylabel('buffer load\n(pkts)')
-        ax_bl.plot(t, buffer_load[i], color=clr_str, label=i, lw=0.3)
+        ax_bl.plot(*decimate(store.column('l_times', i),
+            store.column('buffer_load', i), max_points), color=clr_str,
+            label=i, lw=0.3)
 
         ax_pl = fig.add_subplot(613)
         ax_pl.set_ylim((-1, 10))
         ax_pl.set_xlabel('time (s)')
         ax_pl.set_ylabel('packet loss\n(pkts)')
-        ax_pl.plot(t, packet_loss[i], color=clr_str, label=i)
+        ax_pl.plot(*decimate(store.column('l_times', i),
+            store.column('packet_loss', i), max_points), color=clr_str, label=i)
 
         plt.legend(loc='upper right', prop={'size': 9})
 
-    for i in flow_ids:
-        t = f_times[i]
-        clr_str = colors[get_num(i)]
+    for i in flows:
+        if not store.has('flow', i):
+            continue
+
+        t = store.column('f_times', i)
+        clr_str = get_color(store.index['flow'][i])
 
         ax_sr = fig.add_subplot(614)
 
         ax_sr.set_xlabel('time (s)')
         ax_sr.set_ylabel('flow rate\n(Mbps)')
-        ax_sr.plot(fr_times[i], receive_rate[i], color=clr_str, label=i)
+        ax_sr.plot(*decimate(store.column('fr_times', i),
+            store.column('receive_rate', i), max_points), color=clr_str,
+            label=i)
 
         ax_ws = fig.add_subplot(615)
-        ax_ws.plot(t, window_sizes[i], color=clr_str, label=i, lw=1.0)
+        ax_ws.plot(*decimate(t, store.column('window_sizes', i), max_points),
+            color=clr_str, label=i, lw=1.0)
         ax_ws.set_xlabel('time (s)')
         ax_ws.set_ylabel('window size\n(pkts)')
 
         ax_rtt = fig.add_subplot(616)
-        ax_rtt.plot(t, round_trip_time[i], color=clr_str, label=i, lw=1.0)
+        ax_rtt.plot(*decimate(t, store.column('round_trip_time', i),
+            max_points), color=clr_str, label=i, lw=1.0)
         ax_rtt.set_xlabel('time (s)')
         ax_rtt.set_ylabel('round trip time')
 
         plt.legend(loc='lower right', prop={'size': 9})
 
+def plot_ids(store, kind, ids):
+    ''' Returns the ids of kind in store to plot: those in ids, or all '''
+    if ids is None:
+        return sorted(store.ids[kind])
+    return [i for i in ids if i in store.ids[kind]]
+
+def plot_metrics(store, final):
+    draw_metrics(store, plot_ids(store, 'link', plot_links),
+                 plot_ids(store, 'flow', plot_flows))
 
     if final is False:
         plt.draw()
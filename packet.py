@@ -1,12 +1,28 @@
+
+# Packet type tags. Hot paths dispatch on pkt.kind, a class attribute,
+# instead of chains of isinstance checks.
+DATA = 0
+ACK = 1
+RT_ACK = 2
+ROUTING = 3
+
 class Packet(object):
+    # Packets are created and dropped at a high rate, so they use slots
+    # rather than a per-instance __dict__
+    __slots__ = ('size', 'sender', 'recipient', '_payload', 'number', 'flow')
+
     def __init__(self, sender, recipient, payload, number, size, flow):
         self.size = size
         self.sender = sender
         self.recipient = recipient
-        self.payload = payload
+        self._payload = payload
         self.number = number
         self.flow = flow
 
+    @property
+    def payload(self):
+        return self._payload
+
     def __str__(self):
         return "<Packet Payload: " + str(self.payload) + ", Size: " + str(self.size) +  \
             ", Sender: " + str(self.sender) + ", Recipient: " +  \
@@ -15,20 +31,52 @@ class Packet(object):
     __repr__ = __str__
 
 class Ack(Packet):
+    # segments is the number of in-order data packets the ACK stands for:
+    # more than one when the receiver delays ACKs (see Host.ACK_EVERY)
+    __slots__ = ('segments',)
+    kind = ACK
     ACK_SIZE = 64
 
     # Inheritance syntax from
     # Source: http://stackoverflow.com/questions/9698614/
     #         super-raises-typeerror-must-be-type-not-classobj-for-new-style-class
-    def __init__(self, sender, recipient, number, flow):
+    def __init__(self, sender, recipient, number, flow, segments=1):
         super(self.__class__, self).__init__(sender, recipient, \
-            "ACK %d" % number, number, Ack.ACK_SIZE, flow)
+            None, number, Ack.ACK_SIZE, flow)
+        self.segments = segments
+
+    # The payload is only formatted when someone looks at it
+    @property
+    def payload(self):
+        return "ACK %d" % self.number
 
-def makeAck(flow, pkt_number):
-    return Ack(flow.destination, flow.source, pkt_number, flow)
+# Free list of ACKs that have been delivered or dropped
+ack_pool = []
+ACK_POOL_MAX = 4096
+
+def makeAck(flow, pkt_number, segments=1):
+    # Reuse a released ACK if there is one
+    if ack_pool:
+        ack = ack_pool.pop()
+        ack.sender = flow.destination
+        ack.recipient = flow.source
+        ack.number = pkt_number
+        ack.flow = flow
+        ack.segments = segments
+        return ack
+    return Ack(flow.destination, flow.source, pkt_number, flow, segments)
+
+def releaseAck(ack):
+    # Called once nothing refers to ack any more
+    if len(ack_pool) < ACK_POOL_MAX:
+        ack.flow = None
+        ack_pool.append(ack)
 
 
 class RtAck(Packet):
+    __slots__ = ('rtpkt',)
+    kind = RT_ACK
+
     def __init__(self, rtpkt):
         super(self.__class__, self).__init__(rtpkt.recipient, rtpkt.sender, \
             "RT ACK", 0, Ack.ACK_SIZE, None)
@@ -36,13 +84,22 @@ class RtAck(Packet):
 
 
 class DataPkt(Packet):
+    __slots__ = ()
+    kind = DATA
     PACKET_SIZE = 1024
 
-    def __init__(self, sender, recipient, payload, number, flow):
-        super(self.__class__, self).__init__(sender, recipient, payload, \
+    def __init__(self, sender, recipient, number, flow):
+        super(self.__class__, self).__init__(sender, recipient, None, \
             number, DataPkt.PACKET_SIZE, flow)
 
+    # The payload is only formatted when someone looks at it
+    @property
+    def payload(self):
+        return "PACKET %d" % self.number
+
 class RoutingPkt(Packet):
+    __slots__ = ('distvec', 'bf_round')
+    kind = ROUTING
     PACKET_SIZE = 64
 
     def __init__(self, sender, recipient, distvec, bf_round):
@@ -50,4 +107,3 @@ class RoutingPkt(Packet):
             0, RoutingPkt.PACKET_SIZE, None)
         self.distvec = distvec
         self.bf_round = bf_round
-
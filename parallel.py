@@ -0,0 +1,545 @@
+import struct
+import traceback
+from bisect import bisect_left
+from multiprocessing import Process, Pipe, RawArray
+
+import link
+import event
+import packet
+import tracing
+import metrics
+from pqueue import enqueue
+from parser import parse
+from simulation import Simulation
+
+'''
+Conservative parallel simulation of one network across processes.
+
+The routers are split into partitions of neighbouring routers (hosts go
+with the router they are attached to) and each partition is simulated by
+its own worker process. Every worker parses the whole network but only
+starts the flows whose source it owns, and a packet sent over a link to a
+node in another partition is handed to that partition's worker instead of
+being scheduled locally.
+
+Workers advance in lock step through windows of simulated time. A packet
+sent over a cut link arrives at least that link's propagation delay after
+it is sent, so with the smallest propagation delay of any cut link as the
+lookahead L, nothing a worker does in the window [w, w + L] can affect
+another worker before w + L. Each window starts at the earliest pending
+event or packet anywhere, which skips idle stretches. The coordinator (the
+calling process) tells the workers how far to go, and the packets sent
+over cut links during a window are delivered at the start of the next one
+through shared memory: one pair of buffers per ordered pair of partitions,
+alternating between windows, with the number of packets in each passed
+along with the coordinator's messages.
+
+The engine needs the state of a cut link to be split between its two
+ends, so it runs with the analytic link engine, full duplex links
+(Link.DUPLEX) and static routes. Its results are those of a sequential
+run with the same settings (--link=analytic --duplex=full
+--routing=static), except where events at exactly the same simulated time
+in different partitions are handled in another order.
+
+Metrics of links and flows within one partition are sampled by their
+worker as usual. Cut links and flows between partitions have half their
+state in each worker, so at every sample time the workers record their
+half and the coordinator combines the two and samples them as a
+sequential run would. The run ends when the last flow is done sending;
+whatever the workers did after that in the last window is taken back out
+of the results.
+'''
+
+# A packet crossing partitions: arrival time, link, receiving node, flow,
+# packet kind and number, and the packets an ACK stands for
+MESSAGE = struct.Struct('<diiibii')
+
+def partition(sim, parts):
+    '''
+    Splits the nodes of sim into at most parts partitions of about the same
+    size. Returns the partition of each node, by node index.
+
+    Routers are taken in breadth-first order from a router at the edge of
+    the network, so each partition is a band of neighbouring routers and
+    few links are cut. Hosts go with the router they are attached to.
+    '''
+    routers = sim.routers
+    owner = [0] * len(sim.nodes)
+    if parts < 2 or len(routers) < 2:
+        return owner
+
+    adj = dict((r, []) for r in routers)
+    weight = dict((r, 1) for r in routers)
+    for lnk in sim.links:
+        if len(lnk.ends) == 2 and lnk.ends[0] in adj and lnk.ends[1] in adj:
+            a, b = lnk.ends
+            adj[a].append(b)
+            adj[b].append(a)
+    for h in sim.hosts:
+        r = h.link.get_receiver(h)
+        if r in weight:
+            weight[r] += 1
+
+    def bfs(start):
+        order = [start]
+        seen = set(order)
+        i = 0
+        while i < len(order):
+            for nbr in adj[order[i]]:
+                if nbr not in seen:
+                    seen.add(nbr)
+                    order.append(nbr)
+            i += 1
+        return order
+
+    # The last router reached from anywhere is at the edge of the network
+    order = bfs(bfs(routers[0])[-1])
+    seen = set(order)
+    for r in routers:
+        if r not in seen:
+            component = bfs(r)
+            order.extend(component)
+            seen.update(component)
+
+    parts = min(parts, len(routers))
+    total = sum(weight.values())
+    acc = 0
+    ids = {}
+    for r in order:
+        p = min(acc * parts // total, parts - 1)
+        owner[r.index] = ids.setdefault(p, len(ids))
+        acc += weight[r]
+
+    for h in sim.hosts:
+        r = h.link.get_receiver(h)
+        owner[h.index] = owner[r.index] if r in weight else 0
+    return owner
+
+def cut_links(sim, owner):
+    ''' The links whose ends are in different partitions '''
+    return [l for l in sim.links if len(l.ends) == 2 and
+            owner[l.ends[0].index] != owner[l.ends[1].index]]
+
+
+class Channel(object):
+    '''
+    Packets sent from one partition to another, written by the sending
+    worker during a window and read by the receiving worker at the start of
+    the next one. The two shared buffers alternate between windows, so the
+    sender can write the next window's packets while the last window's are
+    being read.
+    '''
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffers = (RawArray('c', capacity * MESSAGE.size),
+                        RawArray('c', capacity * MESSAGE.size))
+        self.buffer = self.buffers[0]
+        self.count = 0
+        self.first = float('inf')
+
+    def start(self, window):
+        ''' Starts writing the packets of a window '''
+        self.buffer = self.buffers[window & 1]
+        self.count = 0
+        self.first = float('inf')
+
+    def send(self, arrival, pkt, lnk, receiver):
+        ''' Hands a packet arriving at receiver at time arrival over '''
+        if self.count == self.capacity:
+            raise RuntimeError("More than %d packets sent between two "
+                               "partitions in one window" % self.capacity)
+        MESSAGE.pack_into(self.buffer, self.count * MESSAGE.size, arrival,
+                          lnk.index, receiver.index, pkt.flow.index, pkt.kind,
+                          pkt.number,
+                          pkt.segments if pkt.kind == packet.ACK else 0)
+        self.count += 1
+        if arrival < self.first:
+            self.first = arrival
+        if pkt.kind == packet.ACK:
+            packet.releaseAck(pkt)
+
+    def receive(self, window, count):
+        ''' Yields the count packets sent in the given window '''
+        buf = self.buffers[window & 1]
+        for i in xrange(count):
+            yield MESSAGE.unpack_from(buf, i * MESSAGE.size)
+
+
+class WindowLog(object):
+    '''
+    Keeps the packet drops and new deliveries of the current window (as a
+    tracer), so the ones after the end of the run can be taken back
+    '''
+    def __init__(self, sim):
+        self.sim = sim
+        self.drops = []
+        self.deliveries = []
+        self.mark = None
+
+    def clear(self):
+        del self.drops[:]
+        del self.deliveries[:]
+        self.mark = None
+
+    def set_mark(self):
+        ''' Notes where the worker's flows finished '''
+        self.mark = (len(self.drops), len(self.deliveries))
+
+    def record(self, evt, time, pkt, link, node, value=0.0):
+        if evt == tracing.DROP:
+            self.drops.append((time, link))
+        elif evt == tracing.ARRIVE and pkt.kind == packet.DATA and \
+             pkt.flow.destination.index == node:
+            # Host.receive counts packets at or after the one it expects
+            rbuf = pkt.flow.destination.reassembly[pkt.flow.index]
+            if rbuf is None or pkt.number >= rbuf.expected:
+                self.deliveries.append((time, pkt.flow.index))
+
+    def close(self):
+        pass
+
+
+class PartitionSimulation(Simulation):
+    '''
+    The part of a parallel run one worker simulates: the whole network is
+    parsed, but only the flows from hosts in partition part are started.
+    '''
+    def __init__(self, tcp_alg, backend, part, owner):
+        Simulation.__init__(self, tcp_alg, backend, 'static')
+        self.part = part
+        self.owner = owner
+        self.tracer = WindowLog(self)
+
+        # Time the last of this partition's flows was done sending
+        self.done_time = None
+
+    def setup(self, channels):
+        '''
+        Routes packets for other partitions to channels (by partition) and
+        sets up the records kept for cut links and flows between partitions
+        '''
+        owner = self.owner
+        self.split_links = [l for l in cut_links(self, owner)
+                            if self.part in (owner[l.ends[0].index],
+                                             owner[l.ends[1].index])]
+        for lnk in self.split_links:
+            for end in lnk.ends:
+                if owner[end.index] != self.part:
+                    lnk.remote = channels[owner[end.index]]
+        self.local_flows = [f for f in self.flows
+                            if owner[f.source.index] == self.part]
+
+        self.sent_flows = []
+        self.received_flows = []
+        for f in self.flows:
+            src, dst = owner[f.source.index], owner[f.destination.index]
+            if src != dst:
+                if src == self.part:
+                    self.sent_flows.append(f)
+                elif dst == self.part:
+                    self.received_flows.append(f)
+
+        # Samples of this partition's half of each, by index
+        self.link_log = dict((l.index, []) for l in self.split_links)
+        self.sent_log = dict((f.index, []) for f in self.sent_flows)
+        self.received_log = dict((f.index, []) for f in self.received_flows)
+
+    def own_flows(self):
+        return self.local_flows
+
+    def flows_done(self):
+        for f in self.local_flows:
+            if f.done_sending is False:
+                return False
+        return True
+
+    def deliver(self, message):
+        ''' Schedules the arrival of a packet from another partition '''
+        arrival, l, r, f, kind, number, segments = message
+        flw = self.flows[f]
+        if kind == packet.DATA:
+            pkt = packet.DataPkt(flw.source, flw.destination, number, flw)
+        else:
+            pkt = packet.makeAck(flw, number, segments)
+        enqueue(event.ReceivePacket(arrival, pkt, self.links[l],
+                                    self.nodes[r]))
+
+    def run_window(self, until):
+        '''
+        Processes the events up to time until. Returns the number of
+        events processed.
+        '''
+        sched = self.scheduler
+        processed = 0
+        while sched.empty() == False and sched.peek_time() <= until:
+            evt = sched.next_event()
+            sched.time = evt.start_time
+            evt.process()
+            evt.release()
+            processed += 1
+            if self.done_time is None and self.local_flows and \
+               self.flows_done():
+                self.done_time = sched.time
+                self.tracer.set_mark()
+        return processed
+
+    def sample_metrics(self, time):
+        # Record this partition's half of cut links and split flows; the
+        # coordinator samples them
+        dirty_links = self.dirty_links
+        for lnk in self.split_links:
+            lnk.sync(time)
+            self.link_log[lnk.index].append((time, lnk in dirty_links,
+                lnk.buffer_pkts, lnk.lost_packets, lnk.aggr_flow_rate))
+            dirty_links.discard(lnk)
+        for f in self.sent_flows:
+            if f in self.dirty_flows:
+                self.sent_log[f.index].append((time, f.sent_packets,
+                    f.curr_RTT, f.window_size, f.done_sending))
+                self.dirty_flows.discard(f)
+        for f in self.received_flows:
+            self.received_log[f.index].append((time, f.received_packets))
+        Simulation.sample_metrics(self, time)
+
+    def finish(self, end):
+        '''
+        Takes back what happened at or after time end (or after the last
+        flow finished, if that was in this partition) and returns the
+        results the coordinator needs
+        '''
+        log = self.tracer
+        if self.done_time == end and log.mark is not None:
+            drops = log.drops[log.mark[0]:]
+            deliveries = log.deliveries[log.mark[1]:]
+        else:
+            drops = [d for d in log.drops if d[0] >= end]
+            deliveries = [d for d in log.deliveries if d[0] >= end]
+        for time, l in drops:
+            self.links[l].lost_packets -= 1
+        for time, f in deliveries:
+            self.flows[f].received_packets -= 1
+
+        store = self.store
+        for metric_map, kind in ((metrics.MetricStore.LINK_METRICS, 'link'),
+                                 (metrics.MetricStore.FLOW_METRICS, 'flow')):
+            for t_name in set(metric_map.values()):
+                names = [m for m in metric_map if metric_map[m] == t_name]
+                for idx, times in enumerate(store.columns[t_name]):
+                    n = bisect_left(times, end)
+                    for name in names:
+                        del store.columns[name][idx][n:]
+                    del times[n:]
+        for records in (self.link_log, self.sent_log, self.received_log):
+            for idx in records:
+                records[idx] = [r for r in records[idx] if r[0] < end]
+
+        owner = self.owner
+        part = self.part
+        return {
+            'store': store,
+            'link_log': self.link_log,
+            'sent_log': self.sent_log,
+            'received_log': self.received_log,
+            'lost': dict((l.index, l.lost_packets) for l in self.links
+                         if part in [owner[e.index] for e in l.ends]),
+            'sent': dict((f.index, f.sent_packets) for f in self.local_flows),
+            'received': dict((f.index, f.received_packets) for f in self.flows
+                             if owner[f.destination.index] == part),
+            'pops': self.scheduler.pops,
+        }
+
+
+def worker(conn, infile, tcp_alg, backend, part, owner, inbox, outbox,
+           engine, duplex):
+    '''
+    Runs one partition, taking commands from the coordinator over conn.
+    inbox and outbox are the channels from and to other partitions, by
+    partition. engine and duplex are the link settings to run with.
+    '''
+    try:
+        metrics.HEADLESS = True
+        link.Link.ENGINE = engine
+        link.Link.DUPLEX = duplex
+        sim = parse(infile, PartitionSimulation(tcp_alg, backend, part, owner))
+        sim.setup(outbox)
+        sim.start()
+        conn.send(('ready', sim.scheduler.peek_time()))
+
+        while True:
+            cmd = conn.recv()
+            if cmd[0] == 'run':
+                until, window, counts = cmd[1:]
+                sim.activate()
+                for src, count in counts.items():
+                    for message in inbox[src].receive(window - 1, count):
+                        sim.deliver(message)
+                for channel in outbox.values():
+                    channel.start(window)
+                sim.tracer.clear()
+
+                sim.run_window(until)
+                sent = dict((dst, c.count) for dst, c in outbox.items()
+                            if c.count)
+                first = min([c.first for c in outbox.values()] +
+                            [float('inf')])
+                next_time = sim.scheduler.peek_time() \
+                    if not sim.scheduler.empty() else float('inf')
+                conn.send(('done', sent, first, sim.done_time, next_time))
+            elif cmd[0] == 'finish':
+                conn.send(('results', sim.finish(cmd[1])))
+                return
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+
+
+def channel_capacity(links, lookahead):
+    '''
+    Most packets the given links can accept from one end in one window:
+    what they can start transmitting in it plus what fits in their buffers
+    '''
+    size = packet.Ack.ACK_SIZE
+    return sum(int(lookahead * l.rate / size) + int(l.buffer_size / size) + 3
+               for l in links)
+
+def run(infile, tcp_alg='reno', parts=2, backend='heap'):
+    '''
+    Simulates the network in infile with parts worker processes. Returns a
+    Simulation holding the combined results (metric store, counters and
+    completion time), ready for summary() or saving.
+
+    Runs use the analytic full duplex link engine; the class-wide link
+    settings are put back afterwards, so later simulations in the same
+    process are unaffected.
+    '''
+    saved = (link.Link.ENGINE, link.Link.DUPLEX)
+    link.Link.ENGINE = 'analytic'
+    link.Link.DUPLEX = 'full'
+    try:
+        return run_partitioned(infile, tcp_alg, parts, backend)
+    finally:
+        link.Link.ENGINE, link.Link.DUPLEX = saved
+
+def run_partitioned(infile, tcp_alg, parts, backend):
+    ''' Does the work of run() once the link settings are in place '''
+    sim = parse(infile, Simulation(tcp_alg, backend, 'static'))
+    owner = partition(sim, parts)
+    cut = cut_links(sim, owner)
+    if not cut:
+        sim.run()
+        return sim
+    lookahead = min(l.prop_delay for l in cut)
+    if lookahead <= 0:
+        raise ValueError("Cut link with no propagation delay: no lookahead")
+    parts = max(owner) + 1
+
+    # A pair of buffers for each ordered pair of neighbouring partitions
+    channels = {}
+    for src in xrange(parts):
+        for dst in xrange(parts):
+            links = [l for l in cut if set([owner[e.index] for e in l.ends])
+                     == set([src, dst])]
+            if links:
+                channels[(src, dst)] = Channel(
+                    channel_capacity(links, lookahead))
+
+    conns = []
+    procs = []
+    for p in xrange(parts):
+        parent, child = Pipe()
+        inbox = dict((s, c) for (s, d), c in channels.items() if d == p)
+        outbox = dict((d, c) for (s, d), c in channels.items() if s == p)
+        proc = Process(target=worker, args=(child, infile, tcp_alg, backend,
+                                             p, owner, inbox, outbox,
+                                             link.Link.ENGINE,
+                                             link.Link.DUPLEX))
+        proc.daemon = True
+        proc.start()
+        conns.append(parent)
+        procs.append(proc)
+
+    def receive(conn):
+        reply = conn.recv()
+        if reply[0] == 'error':
+            for proc in procs:
+                proc.terminate()
+            raise RuntimeError("Partition worker failed:\n" + reply[1])
+        return reply[1:]
+
+    try:
+        first = min(receive(c)[0] for c in conns)
+        senders = set(owner[f.source.index] for f in sim.flows)
+        done = [None] * parts
+        counts = [{} for p in xrange(parts)]
+        window = 0
+        while first < float('inf'):
+            for p, conn in enumerate(conns):
+                conn.send(('run', first + lookahead, window, counts[p]))
+            counts = [{} for p in xrange(parts)]
+            first = float('inf')
+            for p, conn in enumerate(conns):
+                sent, sent_first, done[p], next_time = receive(conn)
+                for dst, count in sent.items():
+                    counts[dst][p] = count
+                first = min(first, sent_first, next_time)
+            window += 1
+            if all(done[p] is not None for p in senders):
+                break
+
+        end = max([done[p] for p in senders] + [0.0])
+        for conn in conns:
+            conn.send(('finish', end))
+        results = [receive(c)[0] for c in conns]
+    finally:
+        for proc in procs:
+            proc.join()
+
+    merge(sim, owner, results, end)
+    metrics.cprint("%d windows of %g s" % (window, lookahead))
+    return sim
+
+def merge(sim, owner, results, end):
+    ''' Combines the workers' results into sim '''
+    store = sim.store
+    sim.scheduler.time = end
+    sim.scheduler.pops = sum(r['pops'] for r in results)
+
+    def copy(kind, idx, part):
+        src = results[part]['store']
+        for name in metrics.MetricStore.column_names(kind):
+            store.columns[name][idx] = src.columns[name][idx]
+
+    # Cut links: sum the two halves at every sample time, and sample the
+    # link if either half changed since the last one
+    for lnk in sim.links:
+        parts = sorted(set(owner[e.index] for e in lnk.ends))
+        if len(parts) == 1:
+            copy('link', lnk.index, parts[0])
+        else:
+            halves = [results[p]['link_log'][lnk.index] for p in parts]
+            for a, b in zip(*halves):
+                if a[1] or b[1]:
+                    lnk.buffer_pkts = a[2] + b[2]
+                    lnk.lost_packets = a[3] + b[3]
+                    lnk.aggr_flow_rate = a[4] + b[4]
+                    lnk.update_metrics(a[0])
+        lnk.lost_packets = sum(results[p]['lost'][lnk.index] for p in parts)
+
+    # Split flows: the sender's state with the receiver's count
+    for f in sim.flows:
+        src = owner[f.source.index]
+        dst = owner[f.destination.index]
+        if src == dst:
+            copy('flow', f.index, src)
+        else:
+            received = dict(results[dst]['received_log'][f.index])
+            for time, sent, rtt, window, done in \
+                    results[src]['sent_log'][f.index]:
+                f.sent_packets = sent
+                f.curr_RTT = rtt
+                f.window_size = window
+                f.done_sending = done
+                f.received_packets = received[time]
+                f.update_metrics(time)
+        f.sent_packets = results[src]['sent'][f.index]
+        f.received_packets = results[dst]['received'][f.index]
+        f.done_sending = True
@@ -43,6 +43,7 @@ import link as link_class
 import host as host_class
 import router as router_class
 import flow as flow_class
+from simulation import Simulation
 
 
 def next_line(f, cast='s'):
@@ -81,12 +82,9 @@ def parse_hosts(f, l_map):
         # Add the host as an 'end' to the link
         host_link.add_end(h)
 
-    # Set the map for the host class
-    host_class.Host.h_map = h_map
-
     return (hosts, h_map)
 
-def parse_routers(f, l_map):
+def parse_routers(f, l_map, sim):
     routers = []
     r_map = {}
     r_links = []
@@ -106,7 +104,7 @@ def parse_routers(f, l_map):
         router_id = next_line(f)
 
         # Construct router and update router map and list
-        r = router_class.Router(router_id, r_links)
+        r = router_class.Router(router_id, [l_map[l_id] for l_id in r_links], sim)
         r_map[router_id] = r
         routers.append(r)
 
@@ -118,12 +116,9 @@ def parse_routers(f, l_map):
         # Reset r_links after each iteration
         r_links = []
 
-    # Set the map for the router class
-    router_class.Router.r_map = r_map
-
     return (routers, r_map)
 
-def parse_links(f):
+def parse_links(f, sim):
     links = []
     l_map = {}
 
@@ -147,16 +142,14 @@ def parse_links(f):
         # print link_buffer_size
 
         # Construct link and add to link map and list of links
-        l = link_class.Link(link_id, link_rate, link_delay, link_buffer_size)
+        l = link_class.Link(link_id, link_rate, link_delay, link_buffer_size,
+                            sim)
         l_map[link_id] = l
         links.append(l)
 
-    # Set the map for the link class
-    link_class.Link.l_map = l_map
-
     return (links, l_map)
 
-def parse_flows(f, h_map):
+def parse_flows(f, h_map, sim):
     flows = []
     f_map = {}
 
@@ -178,7 +171,7 @@ def parse_flows(f, h_map):
         dest_host = h_map[flow_dest]
 
         # Amount of data to be sent by the flow
-        data_amount = next_line(f, 'i')
+        data_amount = next_line(f, 'f')
 
         # Flow start time
         flow_start_time = next_line(f, 'f')
@@ -186,23 +179,43 @@ def parse_flows(f, h_map):
         # Construct the flow, insert it into the map and append
         # it to the list of flows
         flow = flow_class.Flow(flow_id, src_host, dest_host, 
-                            data_amount, flow_start_time)
+                            data_amount, flow_start_time, sim)
         f_map[flow_id] = flow
         flows.append(flow)
 
-    # Set the Flow class map
-    flow_class.Flow.f_map = f_map
-
     return (flows, f_map)
 
-def parse(file_name):
+def parse(file_name, sim=None):
+    '''
+    Builds the network described in file_name into sim (a new Simulation
+    with default settings if none is given) and returns the simulation.
+    '''
+    if sim is None:
+        sim = Simulation()
+
     f = open(file_name, 'r')
 
-    links, l_map = parse_links(f)
-    hosts, h_map = parse_hosts(f, l_map)
-    routers, r_map = parse_routers(f, l_map)
-    flows, f_map = parse_flows(f, h_map)
+    sim.links, sim.l_map = parse_links(f, sim)
+    sim.hosts, sim.h_map = parse_hosts(f, sim.l_map)
+    sim.routers, sim.r_map = parse_routers(f, sim.l_map, sim)
+    sim.flows, sim.f_map = parse_flows(f, sim.h_map, sim)
 
     f.close()
 
-    return (hosts, links, routers, flows)
+    # Intern every entity as a dense integer index. Routing tables,
+    # distance vectors, reassembly state and metric columns are indexed by
+    # these; the entity lists double as the index -> id name tables.
+    sim.nodes = sim.hosts + sim.routers
+    for i, node in enumerate(sim.nodes):
+        node.index = i
+        sim.node_index[node.id] = i
+    for i, lnk in enumerate(sim.links):
+        lnk.index = i
+        sim.store.entity('link', lnk.id)
+    for i, flw in enumerate(sim.flows):
+        flw.index = i
+        sim.store.entity('flow', flw.id)
+    for h in sim.hosts:
+        h.reassembly = [None] * len(sim.flows)
+
+    return sim
@@ -0,0 +1,52 @@
+import sys
+import metrics
+
+'''
+Plots metrics saved by a simulation run (main.py --save=FILE or
+--headless). Long series are min/max decimated to at most --points points
+per series, so plotting time doesn't grow with the length of the run.
+
+Links L1, L2 and L3 and all flows are plotted unless --links/--flows
+say otherwise.
+
+usage: python plot.py [--links=L1,L2,...|all] [--flows=F1,F2,...|all]
+                      [--points=N] [--out=FILE.png] METRICS_FILE
+'''
+
+if __name__ == "__main__":
+    links = metrics.plot_links
+    flows = metrics.plot_flows
+    points = metrics.MAX_PLOT_POINTS
+    outfile = None
+
+    for i in list(sys.argv):
+        if i.startswith("--links="):
+            sys.argv.remove(i)
+            links = i[len("--links="):]
+            links = None if links == "all" else links.split(",")
+        elif i.startswith("--flows="):
+            sys.argv.remove(i)
+            flows = i[len("--flows="):]
+            flows = None if flows == "all" else flows.split(",")
+        elif i.startswith("--points="):
+            sys.argv.remove(i)
+            points = int(i[len("--points="):])
+        elif i.startswith("--out="):
+            sys.argv.remove(i)
+            outfile = i[len("--out="):]
+
+    if len(sys.argv) != 2:
+        print "usage: python plot.py [--links=L1,L2,...|all] " \
+              "[--flows=F1,F2,...|all] " \
+              "[--points=N] [--out=FILE.png] METRICS_FILE"
+        sys.exit(-1)
+
+    store = metrics.MetricStore.load(sys.argv[1])
+    plt = metrics.get_plt()
+    metrics.draw_metrics(store, metrics.plot_ids(store, 'link', links),
+                         metrics.plot_ids(store, 'flow', flows), points)
+
+    if outfile is not None:
+        plt.savefig(outfile)
+    else:
+        plt.show()
@@ -1,35 +1,271 @@
-import Queue
+import heapq
+import bisect
 
-''' 
-Wrapper around the built-in priority queue for the global event queue
+'''
+Event scheduler for the global event queue
+
+The simulator is single-threaded, so the scheduler is a plain heap (or
+calendar queue) rather than the lock-based Queue.PriorityQueue. Entries are
+(start_time, priority, seq, event) tuples; seq increases monotonically so
+ties on (start_time, priority) are broken in FIFO order and events are never
+compared with each other. (Queue.PriorityQueue fell back to comparing the
+events, i.e. their addresses, so tied events came out in an arbitrary order
+that could differ from run to run.)
+
+Timers are cancelled lazily: a cancelled event stays in the queue, flagged,
+and is discarded when it reaches the front. Once cancelled entries outnumber
+live ones the queue is compacted, so cancelling is O(1) amortized and dead
+timers do not pile up in the queue.
+
+Classes:
+    - BinaryHeapQueue: heapq-backed queue of entries
+    - CalendarQueue:   bucketed calendar queue (Brown, 1988) of entries
+    - Scheduler:       event scheduler and simulation clock
+
+Each Simulation owns a Scheduler. The module-level functions below act on
+the scheduler of the active simulation, so that events, flows, hosts and
+routers can schedule events without holding a reference to it.
 
 Global variables:
-    - event_queue: The global event queue
+    - scheduler: The scheduler of the active simulation
 
 Functions:
-    - empty():  Checks if the event queue is empty
+    - activate(Scheduler s):  Makes s the scheduler the functions below use
+    - qempty():  Checks if the event queue is empty
     - enqueue(Event e):  Enqueues event e
-    - dequeue():  Removes the event with the smallest end_time from 
-                  event_queue. Assumes that event_queue is not-empty,
+    - enqueue_many(events):  Enqueues a list of events
+    - dequeue():  Removes the event with the smallest start_time from
+                  the event queue. Assumes that it is not-empty,
                   raises an AssertionError if not.
+    - cancel(Event e):  Cancels the pending event e
 '''
 
-event_queue = Queue.PriorityQueue()
-global_time = 0.0
+class BinaryHeapQueue(object):
+    ''' Binary heap of scheduler entries '''
+    def __init__(self):
+        self.heap = []
+
+    def push(self, entry):
+        heapq.heappush(self.heap, entry)
+
+    def push_many(self, entries):
+        # Re-heapifying is cheaper than pushing one at a time once the batch
+        # is comparable in size to the heap itself.
+        if len(entries) > len(self.heap):
+            self.heap.extend(entries)
+            heapq.heapify(self.heap)
+        else:
+            for entry in entries:
+                heapq.heappush(self.heap, entry)
+
+    def pop(self):
+        return heapq.heappop(self.heap)
+
+    def peek(self):
+        return self.heap[0]
+
+    def compact(self):
+        ''' Removes the entries of cancelled events '''
+        self.heap = [e for e in self.heap if not e[3].cancelled]
+        heapq.heapify(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+
+class CalendarQueue(object):
+    '''
+    Calendar queue of scheduler entries. Entries are hashed by start time
+    into buckets ("days") of a fixed width; each bucket is kept sorted. The
+    number of buckets doubles/halves with the queue size and the bucket
+    width is re-estimated from the spacing of the earliest entries.
+    '''
+    SAMPLE_SIZE = 25
+
+    def __init__(self, nbuckets=2, width=1.0):
+        self.size = 0
+        self._setup(nbuckets, width, 0.0)
+
+    def _setup(self, nbuckets, width, start_time):
+        self.nbuckets = nbuckets
+        self.width = width
+        self.buckets = [[] for i in xrange(nbuckets)]
+        self.day = int(start_time / width)
+        self.last_time = start_time
+        self.grow_at = 2 * nbuckets
+        self.shrink_at = nbuckets / 2 - 2
+
+    def push(self, entry):
+        t = entry[0]
+        bisect.insort(self.buckets[int(t / self.width) % self.nbuckets], entry)
+        self.size += 1
+
+        # Scheduling before the last dequeued entry rewinds the calendar
+        if t < self.last_time:
+            self.last_time = t
+            self.day = int(t / self.width)
+
+        if self.size > self.grow_at:
+            self._resize(2 * self.nbuckets)
+
+    def push_many(self, entries):
+        for entry in entries:
+            self.push(entry)
+
+    def _find(self):
+        ''' Returns the index of the bucket holding the smallest entry '''
+        assert(self.size > 0)
+        width = self.width
+        day = self.day
+        for i in xrange(self.nbuckets):
+            bucket = self.buckets[day % self.nbuckets]
+            if bucket and int(bucket[0][0] / width) <= day:
+                self.day = day
+                return day % self.nbuckets
+            day += 1
+
+        # Nothing within a full year of the last entry: search directly
+        head, i = min((b[0], j) for j, b in enumerate(self.buckets) if b)
+        self.day = int(head[0] / width)
+        return i
+
+    def pop(self):
+        entry = self.buckets[self._find()].pop(0)
+        self.size -= 1
+        self.last_time = entry[0]
+
+        if self.size < self.shrink_at:
+            self._resize(self.nbuckets / 2)
+        return entry
+
+    def peek(self):
+        return self.buckets[self._find()][0]
+
+    def compact(self):
+        ''' Removes the entries of cancelled events '''
+        for i in xrange(self.nbuckets):
+            self.buckets[i] = [e for e in self.buckets[i] if not e[3].cancelled]
+        self.size = sum(len(b) for b in self.buckets)
+
+    def _resize(self, nbuckets):
+        entries = []
+        for bucket in self.buckets:
+            entries.extend(bucket)
+
+        # Bucket width is a few times the average separation of the
+        # earliest distinct start times
+        width = self.width
+        times = sorted(set(e[0] for e in heapq.nsmallest(
+            CalendarQueue.SAMPLE_SIZE, entries)))
+        if len(times) > 1:
+            width = 3.0 * (times[-1] - times[0]) / (len(times) - 1)
+
+        self._setup(nbuckets, width, self.last_time)
+        for entry in entries:
+            self.buckets[int(entry[0] / width) % nbuckets].append(entry)
+        for bucket in self.buckets:
+            bucket.sort()
+
+    def __len__(self):
+        return self.size
+
+
+class Scheduler(object):
+    ''' Event scheduler and simulation clock '''
+    BACKENDS = {'heap': BinaryHeapQueue, 'calendar': CalendarQueue}
+
+    # Don't bother compacting queues smaller than this
+    COMPACT_MIN = 1024
+
+    def __init__(self, backend='heap'):
+        self.backend = backend
+        self.queue = Scheduler.BACKENDS[backend]()
+        self.seq = 0
+        self.time = 0.0
+
+        # Number of cancelled entries still in the queue
+        self.dead = 0
+
+        # Counters for reporting
+        self.pops = 0
+        self.cancels = 0
+
+    def schedule(self, evt):
+        evt.cancelled = False
+        self.seq += 1
+        self.queue.push((evt.start_time, evt.priority, self.seq, evt))
+
+    def schedule_many(self, evts):
+        entries = []
+        for evt in evts:
+            evt.cancelled = False
+            self.seq += 1
+            entries.append((evt.start_time, evt.priority, self.seq, evt))
+        self.queue.push_many(entries)
+
+    def cancel(self, evt):
+        if evt.cancelled:
+            return
+        evt.cancelled = True
+        self.dead += 1
+        self.cancels += 1
+
+        if self.dead > len(self.queue) / 2 and \
+           len(self.queue) > Scheduler.COMPACT_MIN:
+            self.queue.compact()
+            self.dead = 0
+
+    def next_event(self):
+        assert(len(self.queue) > self.dead)
+        evt = self.queue.pop()[3]
+        self.pops += 1
+        while evt.cancelled:
+            self.dead -= 1
+            evt = self.queue.pop()[3]
+            self.pops += 1
+        return evt
+
+    def peek_time(self):
+        ''' Returns the start time of the next live event '''
+        assert(len(self.queue) > self.dead)
+        entry = self.queue.peek()
+        while entry[3].cancelled:
+            self.queue.pop()
+            self.dead -= 1
+            self.pops += 1
+            entry = self.queue.peek()
+        return entry[0]
+
+    def empty(self):
+        return len(self.queue) == self.dead
+
+    def __len__(self):
+        return len(self.queue) - self.dead
+
+
+scheduler = Scheduler()
+
+def activate(sched):
+    global scheduler
+    scheduler = sched
 
 def enqueue(evt):
-    event_queue.put((evt.start_time, evt.priority, evt))
+    scheduler.schedule(evt)
+
+def enqueue_many(evts):
+    scheduler.schedule_many(evts)
 
 def dequeue():
-    assert(not event_queue.empty())
-    return event_queue.get()[2]
+    return scheduler.next_event()
+
+def cancel(evt):
+    scheduler.cancel(evt)
 
 def qempty():
-    return event_queue.empty()
+    return scheduler.empty()
 
 def set_global_time(t):
-    global global_time
-    global_time = t
+    scheduler.time = t
 
 def get_global_time():
-    return global_time
\ No newline at end of file
+    return scheduler.time
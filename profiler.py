@@ -0,0 +1,148 @@
+import json
+import timeit
+import metrics
+
+'''
+Opt-in event loop profiler.
+
+LoopProfiler.run is a copy of Simulation.run's loop with instrumentation:
+it counts and times process() for every event class, tracks the size of
+the event queue, and times metric plotting separately from sampling.
+Simulation.run only calls it when given a profiler, so the normal loop
+carries no instrumentation at all.
+
+Events that carry a packet are broken down by packet class too, e.g.
+ReceivePacket[RoutingPkt] is the Bellman-Ford handling of routing packets
+and ReceivePacket[DataPkt] the forwarding/receipt of data.
+
+Python 2 has no time.perf_counter; timeit.default_timer is the best wall
+clock timer for the platform.
+'''
+
+clock = timeit.default_timer
+
+class LoopProfiler(object):
+    # Record the event queue size every this many events
+    QUEUE_SAMPLE_EVERY = 1000
+
+    def __init__(self):
+        self.counts = {}
+        self.times = {}
+        self.queue_samples = []     # (simulation time, entries, live events)
+        self.plot_time = 0.0
+        self.plot_calls = 0
+        self.loop_time = 0.0
+        self.events = 0
+
+    def run(self, sim, until=None):
+        '''
+        Runs sim's event loop like Simulation.run, with instrumentation.
+        Returns the number of events processed.
+        '''
+        counts = self.counts
+        times = self.times
+        sched = sim.scheduler
+        sample_every = LoopProfiler.QUEUE_SAMPLE_EVERY
+
+        # Time plotting separately; it runs inside SampleMetrics
+        plot_metrics = metrics.plot_metrics
+        def timed_plot_metrics(*args):
+            start = clock()
+            plot_metrics(*args)
+            self.plot_time += clock() - start
+            self.plot_calls += 1
+        metrics.plot_metrics = timed_plot_metrics
+
+        processed = 0
+        loop_start = clock()
+        try:
+            while (sched.empty() == False and sim.flows_done() is False):
+                if until is not None and sched.peek_time() > until:
+                    break
+                evt = sched.next_event()
+                sched.time = evt.start_time
+
+                # Name the event before processing, pooled events are
+                # reused once released
+                name = evt.__class__.__name__
+                pkt = getattr(evt, 'packet', None)
+                if pkt is not None:
+                    name = "%s[%s]" % (name, pkt.__class__.__name__)
+
+                start = clock()
+                evt.process()
+                elapsed = clock() - start
+
+                evt.release()
+                counts[name] = counts.get(name, 0) + 1
+                times[name] = times.get(name, 0.0) + elapsed
+
+                processed += 1
+                if processed % sample_every == 0:
+                    self.queue_samples.append((sched.time, len(sched.queue),
+                                               len(sched)))
+        finally:
+            self.loop_time += clock() - loop_start
+            metrics.plot_metrics = plot_metrics
+
+        self.events += processed
+        return processed
+
+    def as_dict(self):
+        ''' Returns the profile as a JSON-serializable dict '''
+        entries = [s[1] for s in self.queue_samples]
+        return {
+            'events': self.events,
+            'loop_time': self.loop_time,
+            'process_time': sum(self.times.values()),
+            'plot_time': self.plot_time,
+            'plot_calls': self.plot_calls,
+            'event_types': dict((name, {'count': self.counts[name],
+                                        'time': self.times[name]})
+                                for name in self.counts),
+            'queue': {
+                'sample_every': LoopProfiler.QUEUE_SAMPLE_EVERY,
+                'max_entries': max(entries) if entries else 0,
+                'mean_entries': float(sum(entries)) / len(entries) \
+                    if entries else 0.0,
+                'samples': self.queue_samples,
+            },
+        }
+
+    def report(self):
+        ''' Returns a printable report '''
+        process_time = sum(self.times.values())
+        loop_time = self.loop_time or 1e-12
+        lines = ["%-34s %10s %10s %10s %7s" % ("event", "count", "total (s)",
+                                               "mean (us)", "% loop")]
+        for name in sorted(self.times, key=self.times.get, reverse=True):
+            t = self.times[name]
+            if name.startswith('SampleMetrics'):
+                t -= self.plot_time
+            n = self.counts[name]
+            lines.append("%-34s %10d %10.3f %10.2f %6.1f%%" % (name, n, t,
+                t / n * 1e6, 100.0 * t / loop_time))
+        if self.plot_calls:
+            lines.append("%-34s %10d %10.3f %10.2f %6.1f%%" % ("(plotting)",
+                self.plot_calls, self.plot_time,
+                self.plot_time / self.plot_calls * 1e6,
+                100.0 * self.plot_time / loop_time))
+
+        overhead = self.loop_time - process_time
+        lines.append("%-34s %10s %10.3f %10s %6.1f%%" % (
+            "(scheduler, loop and profiler)", "", overhead, "",
+            100.0 * overhead / loop_time))
+        lines.append("%d events in %.3fs (%.0f events/s)" % (self.events,
+            self.loop_time, self.events / loop_time))
+
+        entries = [s[1] for s in self.queue_samples]
+        if entries:
+            lines.append("event queue: max %d entries, mean %.0f (sampled "
+                         "every %d events)" % (max(entries),
+                float(sum(entries)) / len(entries),
+                LoopProfiler.QUEUE_SAMPLE_EVERY))
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2, sort_keys=True)
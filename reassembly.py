@@ -0,0 +1,87 @@
+'''
+Receiver-side reassembly state for a single flow.
+
+Packets at or above the cumulative pointer (the next packet number the
+receiver expects) are recorded; out-of-order packets are kept as a set of
+numbers plus the contiguous runs ("blocks") they form, indexed by both
+ends so that inserting a packet merges it with its neighbouring runs in
+O(1). When the expected packet arrives, the run that follows it is
+consumed in one step, so in-order advance is O(1) amortized per packet no
+matter how large the reorder window gets.
+
+The runs are the SACK blocks the receiver could report (sack_blocks()).
+'''
+
+class ReorderBuffer(object):
+    def __init__(self):
+        # Next packet number expected in order
+        self.expected = 0
+
+        # Out-of-order packet numbers above expected
+        self.pending = set()
+
+        # Contiguous runs of pending packets as half-open [start, end)
+        # ranges, indexed by start and by end
+        self.run_end = {}
+        self.run_start = {}
+
+        # Start of the most recently extended run
+        self.last_run = None
+
+    def add(self, number):
+        '''
+        Records an arriving packet number. Returns False if the packet is
+        below the cumulative pointer (an old duplicate), True otherwise.
+        '''
+        if number == self.expected:
+            self.expected += 1
+            if not self.run_end:
+                return True
+
+            # Consume the run that starts right after the new packet
+            end = self.run_end.pop(self.expected, None)
+            if end is not None:
+                del self.run_start[end]
+                for n in xrange(self.expected, end):
+                    self.pending.discard(n)
+                if self.last_run == self.expected:
+                    self.last_run = None
+                self.expected = end
+
+        elif number < self.expected:
+            return False
+
+        elif number not in self.pending:
+            self.pending.add(number)
+
+            # Merge with the run ending at number and the run starting at
+            # number + 1, if any
+            start = self.run_start.pop(number, number)
+            end = self.run_end.pop(number + 1, number + 1)
+            if start != number:
+                del self.run_end[start]
+            if end != number + 1:
+                del self.run_start[end]
+            self.run_end[start] = end
+            self.run_start[end] = start
+            self.last_run = start
+
+        return True
+
+    def __contains__(self, number):
+        return number < self.expected or number in self.pending
+
+    def sack_blocks(self, max_blocks=3):
+        '''
+        Returns up to max_blocks (start, end) runs of out-of-order packets,
+        the most recently extended run first and the rest in order.
+        '''
+        blocks = []
+        if self.last_run is not None:
+            blocks.append((self.last_run, self.run_end[self.last_run]))
+        for start in sorted(self.run_end):
+            if len(blocks) >= max_blocks:
+                break
+            if start != self.last_run:
+                blocks.append((start, self.run_end[start]))
+        return blocks
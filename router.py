@@ -1,87 +1,113 @@
-from pqueue import event_queue, enqueue, dequeue, qempty
+import os
+import hashlib
+import tempfile
+import cPickle
+from pqueue import enqueue, cancel
 import event
 import link
 import packet
+import spf
 from metrics import cprint
 
-INF = 2147483647          # Infinity. For unreachable nodes in BF routing
+# Directory for cached initial routes (see initial_bf); None (the default)
+# disables the cache
+ROUTE_CACHE_DIR = None
+
+# Cache directory used by main.py --route-cache without a directory
+DEFAULT_ROUTE_CACHE_DIR = '.route_cache'
 
 class Router:
     PKT_SENT = 0
     PKT_ACKED = 1
     RTPKT_TIMEOUT = 5     # Timeout interval for routing packets
 
-    ids = []
-    
-    r_map = {}
-
-    def __init__(self, router_id, links):
+    def __init__(self, router_id, links, sim):
         self.id = router_id
-        Router.ids.append(self.id)
+        self.sim = sim
 
-        # The routing table will be represented by a dictionary and calculated
-        # using a class method.
-        self.routing_table = {}
+        # The routing table holds the index of the outgoing link for each
+        # destination, by node index (None where there is no route)
+        self.routing_table = []
 
-        # Take the passed list of link IDs, store a list of links
-        self.links = [link.Link.l_map[i] for i in links]
+        # List of connected links
+        self.links = links
 
-        # Neighbouring routers (map of router ID -> connecting link
+        # Compiled routing table: outgoing Link object for each destination,
+        # by node index (see compile_forwarding)
+        self.forwarding = []
+
+        # Neighbouring routers (map of router index -> connecting link
         self.rneighbours = {}
 
-        # Variables used for Bellman-Ford routing
+        # Variables used for Bellman-Ford routing. Distance vectors hold a
+        # (distance, next hop index, link index) tuple for each destination,
+        # by node index (None for nodes not heard of yet).
         self.bf_round = 0            # which rerouting round
-        self.bf_distvec = {}         # the current distance vector
+        self.bf_distvec = []         # the current distance vector
         self.bf_updated = {}         # which neighbours we've received from
         self.bf_changed = False      # whether or not the distvec has changed
         self.sent_rtpkts = {}        # routing packets that have been sent
+        self.rt_timers = {}          # pending timeouts of sent routing packets
 
     def set_rneighbours(self):
         for i in self.links:
             nbr = i.get_receiver(self)
             if isinstance(nbr, Router):
-                self.rneighbours[nbr.id] = i
+                self.rneighbours[nbr.index] = i
 
     def receive(self, pkt, time):
+        kind = pkt.kind
+
+        # Forward data and ACKs on according to the forwarding table
+        if kind <= packet.ACK:
+            enqueue(event.SendPacket(time, pkt, \
+                self.forwarding[pkt.recipient.index], self))
+
         # Record ACKed routing packet
-        if (isinstance(pkt, packet.RtAck)):
-            self.sent_rtpkts[pkt.rtpkt] = Router.PKT_ACKED
+        elif kind == packet.RT_ACK:
+            # If the timeout is still pending it is no longer needed;
+            # otherwise leave the ACK for handle_timeout to clean up
+            timer = self.rt_timers.pop(pkt.rtpkt, None)
+            if timer is not None:
+                cancel(timer)
+                self.sent_rtpkts.pop(pkt.rtpkt, None)
+            else:
+                self.sent_rtpkts[pkt.rtpkt] = Router.PKT_ACKED
         
         # Handle received routing packet (update BF)
-        elif (isinstance(pkt, packet.RoutingPkt)):
-            if self.bf_updated.get(pkt.sender.id, False) == False:
-                ack_link = self.rneighbours[pkt.sender.id]
+        else:
+            src = pkt.sender.index
+            if self.bf_updated.get(src, False) == False:
+                ack_link = self.rneighbours[src]
                 rt_ack = packet.RtAck(pkt)
                 enqueue(event.SendPacket(time, rt_ack, ack_link, self))
                 if pkt.bf_round == self.bf_round:
-                    self.update_bf(pkt.sender.id, pkt.distvec, ack_link, time)
-        
-        # Forward packet on according to routing table
-        else:
-            next_link = link.Link.l_map[self.routing_table[pkt.recipient.id]]
-            enqueue(event.SendPacket(time, pkt, next_link, self))    
-                
+                    self.update_bf(src, pkt.distvec, ack_link, time)
+
 
-    def update_bf(self, src_id, dvec, src_ln, time, broadcast=True):
+    def update_bf(self, src, dvec, src_ln, time, broadcast=True):
         '''
-        src_id: the ID of the router this dvec is coming from
-        dvec: the distance vector sent by router src_id
-        src_ln: link between self and src_id
+        src: the index of the router this dvec is coming from
+        dvec: the distance vector sent by router src
+        src_ln: link between self and src
         time: the current system time
         broadcast: whether or not to send routing packets to neighbouring
                    routers. Set to False for initial routing only.
         '''
-        for rtr in dvec:                       # go through each router
-            dist, pred, ln = dvec[rtr]         # distance and predecessor from src_id
-            cur_dist, cur_pred, cur_ln = self.bf_distvec.get(rtr, (INF, None, None))
-            
+        distvec = self.bf_distvec
+        cost = src_ln.bf_lcost
+        for dst, route in enumerate(dvec):     # go through each destination
+            if route is None:
+                continue
+            cur = distvec[dst]
+
             # Update distance vector if a lower cost is found
-            if dist + src_ln.bf_lcost < cur_dist: 
-                self.bf_distvec[rtr] = (dist + src_ln.bf_lcost, src_id, src_ln.id)
+            if cur is None or route[0] + cost < cur[0]:
+                distvec[dst] = (route[0] + cost, src, src_ln.index)
                 self.bf_changed = True
-    
+
         # Mark that we received information from this neighbour
-        self.bf_updated[src_id] = True
+        self.bf_updated[src] = True
 
         # If we have received routing packets from all neighbours, iteration is complete
         if len(self.bf_updated) == len(self.rneighbours):
@@ -106,24 +132,54 @@ class Router:
                 self.bf_round)
             enqueue(event.SendPacket(time, rtPkt, link, self))
             self.sent_rtpkts[rtPkt] = Router.PKT_SENT
-            enqueue(event.RtPktTimeout(time + Router.RTPKT_TIMEOUT, self, rtPkt))
+            self.rt_timers[rtPkt] = event.RtPktTimeout(time + \
+                Router.RTPKT_TIMEOUT, self, rtPkt)
+            enqueue(self.rt_timers[rtPkt])
 
 
     def update_routing_table(self):
         # Go through distvec and set the routing table destination
         # according to the Bellman-Ford results
-        for dst in self.bf_distvec:
-            self.routing_table[dst] = self.bf_distvec[dst][2]
+        # Destinations missing from the distance vector (mid-round) keep
+        # their current route
+        table = self.routing_table
+        if len(table) != len(self.bf_distvec):
+            table = self.routing_table = [None] * len(self.bf_distvec)
+
+        changed = False
+        for dst, route in enumerate(self.bf_distvec):
+            if route is not None and table[dst] != route[2]:
+                table[dst] = route[2]
+                changed = True
+
+        if changed:
+            self.compile_forwarding()
+
+    def compile_forwarding(self):
+        '''
+        Rebuilds the forwarding table from the routing table. Must be called
+        whenever the routing table changes.
+        '''
+        links = self.sim.links
+        self.forwarding = [None if l_idx is None else links[l_idx]
+                           for l_idx in self.routing_table]
+
+    def named_routes(self):
+        ''' Returns the routing table as a map of node id -> link id '''
+        return dict((self.sim.nodes[dst].id, self.sim.links[l_idx].id)
+                    for dst, l_idx in enumerate(self.routing_table)
+                    if l_idx is not None)
 
     def handle_timeout(self, curr_time, rtpkt):
         '''
         Handle timeout for a routing packet
         '''
+        self.rt_timers.pop(rtpkt, None)
         status = self.sent_rtpkts.get(rtpkt, None)
 
         # If it's been sent but not acknowledged, resend.
         if status == Router.PKT_SENT:
-            send_link = self.rneighbours[rtpkt.recipient.id]
+            send_link = self.rneighbours[rtpkt.recipient.index]
             enqueue(event.SendPacket(curr_time, rtpkt, send_link, self))
 
         # If it's been acknowledged, remove it from the sent list.
@@ -137,33 +193,91 @@ class Router:
         '''
         Set distance vector to include only itself and immediate neighbours
         '''
-        self.bf_distvec = {}
+        self.bf_distvec = [None] * len(self.sim.nodes)
         for lnk in self.links:
-            recv_id = lnk.get_receiver(self).id
-            self.bf_distvec[recv_id] = (lnk.bf_lcost, recv_id, lnk.id)
-        self.bf_distvec[self.id] = (0, self.id, None)
+            recv = lnk.get_receiver(self).index
+            self.bf_distvec[recv] = (lnk.bf_lcost, recv, lnk.index)
+        self.bf_distvec[self.index] = (0, self.index, None)
 
     def __str__(self):
         return "<Router ID: " + str(self.id) + ", Routing table: " + \
-        str(self.routing_table) +  ", Links: " + str(self.links) + ">"
+        str(self.named_routes()) +  ", Links: " + str(self.links) + ">"
 
     __repr__ = __str__
 
-def reset_bf(time, round_no):
+def reset_bf(routers, time, round_no):
     '''
     Reset Bellman-Ford variables for all routers (used before beginning a
     new round of rerouting.
     '''
-    for rtr_id in Router.ids:
-        Router.r_map[rtr_id].bf_round = round_no
-        Router.r_map[rtr_id].reset_distvec()
-        Router.r_map[rtr_id].broadcast_distvec(time)
-        Router.r_map[rtr_id].bf_updated = {}
-        Router.r_map[rtr_id].bf_changed = False
-
-def set_rneighbours():
+    for rtr in routers:
+        rtr.bf_round = round_no
+        rtr.reset_distvec()
+        rtr.broadcast_distvec(time)
+        rtr.bf_updated = {}
+        rtr.bf_changed = False
+
+def set_rneighbours(routers):
     '''
     Set router neighbours for all routers
     '''
-    for rtr_id in Router.ids:
-        Router.r_map[rtr_id].set_rneighbours();
\ No newline at end of file
+    for rtr in routers:
+        rtr.set_rneighbours();
+
+def topology_key(routers, links):
+    '''
+    Returns a hash of the routers, links and link costs that initial routes
+    depend on, and of the order of the node indices the cached distance
+    vectors are laid out by
+    '''
+    h = hashlib.sha1("routes-v3\n")
+    h.update("%s\n" % " ".join(n.id for n in routers[0].sim.nodes))
+    for lnk in links:
+        h.update("%s %s %r\n" % (lnk.id, " ".join(e.id for e in lnk.ends),
+                                 lnk.bf_lcost))
+    for rtr in routers:
+        h.update("%s %s\n" % (rtr.id, " ".join(l.id for l in rtr.links)))
+    return h.hexdigest()
+
+def initial_bf(routers, links):
+    '''
+    Computes the routes Bellman-Ford converges to before the simulation
+    starts, without sending any routing packets. The distance vectors come
+    from one Dijkstra run per router (spf.all_pairs). If ROUTE_CACHE_DIR is
+    set they are cached there, keyed by topology_key, so repeated runs of
+    the same network skip the computation.
+    '''
+    if not routers:
+        return
+
+    distvecs = None
+    path = None
+    if ROUTE_CACHE_DIR is not None:
+        path = os.path.join(ROUTE_CACHE_DIR,
+                            topology_key(routers, links) + ".pkl")
+        try:
+            with open(path, 'rb') as f:
+                distvecs = cPickle.load(f)
+        except (IOError, EOFError, cPickle.UnpicklingError):
+            distvecs = None
+
+    if distvecs is None:
+        distvecs = spf.all_pairs(routers, links, len(routers[0].sim.nodes))
+        if path is not None:
+            # Write to a temporary file and rename, so concurrent runs
+            # never read a partly written cache entry
+            try:
+                if not os.path.isdir(ROUTE_CACHE_DIR):
+                    os.makedirs(ROUTE_CACHE_DIR)
+                fd, tmp = tempfile.mkstemp(dir=ROUTE_CACHE_DIR)
+                with os.fdopen(fd, 'wb') as f:
+                    cPickle.dump(distvecs, f, cPickle.HIGHEST_PROTOCOL)
+                os.rename(tmp, path)
+            except (IOError, OSError):
+                cprint ("Could not cache initial routes in %s" % ROUTE_CACHE_DIR)
+
+    for rtr, distvec in zip(routers, distvecs):
+        rtr.bf_distvec = distvec
+        rtr.update_routing_table()
+        rtr.bf_updated = {}
+        rtr.bf_changed = False
@@ -0,0 +1,166 @@
+'''
+Sender-side scoreboard of sent but unacknowledged packets for a flow.
+
+Packet numbers are dense, so send times are kept in a list indexed by
+packet number relative to the oldest outstanding packet (base) instead of
+a dict. Acknowledged slots are cleared to None and the front of the list
+is skipped lazily, which makes cumulative-ACK advance O(1) amortized per
+packet, lookups O(1), and the oldest outstanding packet is always base.
+
+The dict-style interface (sb[n] = t, n in sb, sb.get(n), sb.pop(n),
+len(sb)) matches the way Flow used its unacknowledged dict.
+'''
+
+from collections import deque
+
+class Scoreboard(object):
+    # Compact the list once this many cleared slots sit at its front
+    COMPACT_AT = 64
+
+    def __init__(self):
+        self.times = []      # send time of packet base + (i - head), or None
+        self.head = 0        # index in times of packet base
+        self.base = 0        # oldest outstanding packet number
+        self.count = 0       # number of outstanding packets
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, number):
+        return self.get(number) is not None
+
+    def get(self, number, default=None):
+        i = number - self.base + self.head
+        if number < self.base or i >= len(self.times) or self.times[i] is None:
+            return default
+        return self.times[i]
+
+    def __setitem__(self, number, send_time):
+        ''' Records (or updates) the send time of a packet '''
+        if self.count == 0:
+            self.times = [send_time]
+            self.head = 0
+            self.base = number
+            self.count = 1
+            return
+
+        if number < self.base:
+            # Packet below the oldest outstanding one: grow at the front,
+            # reusing cleared slots if there are enough
+            gap = self.base - number
+            if self.head >= gap:
+                self.head -= gap
+                self.times[self.head] = send_time
+            else:
+                self.times[self.head:self.head] = [send_time] + [None] * (gap - 1)
+            self.base = number
+            self.count += 1
+            return
+
+        i = number - self.base + self.head
+        if i >= len(self.times):
+            self.times.extend([None] * (i - len(self.times)))
+            self.times.append(send_time)
+            self.count += 1
+        else:
+            if self.times[i] is None:
+                self.count += 1
+            self.times[i] = send_time
+
+    def pop(self, number):
+        ''' Removes a packet and returns its send time '''
+        send_time = self.get(number)
+        if send_time is None:
+            raise KeyError(number)
+        self.times[number - self.base + self.head] = None
+        self.count -= 1
+        self._trim()
+        return send_time
+
+    def advance_to(self, number):
+        '''
+        Removes every packet numbered below number (a cumulative ACK).
+        Returns the list of packet numbers removed.
+        '''
+        removed = []
+        while self.count > 0 and self.base < number:
+            if self.times[self.head] is not None:
+                removed.append(self.base)
+                self.times[self.head] = None
+                self.count -= 1
+            self.head += 1
+            self.base += 1
+        self._trim()
+        return removed
+
+    def oldest(self):
+        ''' Returns the oldest outstanding packet number, or None '''
+        return self.base if self.count > 0 else None
+
+    def items(self):
+        ''' Yields (packet number, send time) of outstanding packets '''
+        for i in xrange(self.head, len(self.times)):
+            if self.times[i] is not None:
+                yield (self.base + i - self.head, self.times[i])
+
+    def _trim(self):
+        if self.count == 0:
+            self.times = []
+            self.head = 0
+            return
+
+        # Move base up to the oldest outstanding packet
+        while self.times[self.head] is None:
+            self.head += 1
+            self.base += 1
+
+        # Drop the trailing cleared slots and compact the front
+        while self.times[-1] is None:
+            self.times.pop()
+        if self.head >= Scoreboard.COMPACT_AT and 2 * self.head > len(self.times):
+            del self.times[:self.head]
+            self.head = 0
+
+class TimedScoreboard(Scoreboard):
+    '''
+    Scoreboard that also keeps its packets in the order they were sent, for
+    the single flow timer (Flow.TIMER_MODE 'flow'). Send times only grow,
+    so the oldest send time and the expired packets are found from the
+    front of a log of (send time, packet number) instead of by scanning the
+    window. Log entries of packets that have since been ACKed or resent are
+    skipped lazily.
+    '''
+
+    def __init__(self):
+        Scoreboard.__init__(self)
+        self.sends = deque()
+
+    def __setitem__(self, number, send_time):
+        Scoreboard.__setitem__(self, number, send_time)
+        self.sends.append((send_time, number))
+        self._skip_stale()
+
+    def oldest_send_time(self):
+        ''' Returns the earliest send time of an outstanding packet, or None '''
+        self._skip_stale()
+        return self.sends[0][0] if self.sends else None
+
+    def expired(self, curr_time, timeout):
+        '''
+        Returns the numbers of the outstanding packets sent at or before
+        curr_time - timeout, in packet number order, and drops them from
+        the log (the caller resends them, which logs them again).
+        '''
+        expired = set()
+        sends = self.sends
+        while sends and sends[0][0] + timeout <= curr_time:
+            send_time, number = sends.popleft()
+            if self.get(number) == send_time:
+                expired.add(number)
+        self._skip_stale()
+        return sorted(expired)
+
+    def _skip_stale(self):
+        sends = self.sends
+        while sends and self.get(sends[0][1]) != sends[0][0]:
+            sends.popleft()
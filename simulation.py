@@ -0,0 +1,193 @@
+import pqueue
+import event
+import router
+import metrics
+import packet
+from flow import Flow
+from spf import OracleRouting
+from fast import FastController
+
+class Simulation(object):
+    '''
+    A single simulation run. Owns the event scheduler (and with it the
+    simulation clock), the links, hosts, routers and flows of the network
+    with their id maps, and the metric store. parser.parse builds one from
+    a network description.
+
+    Events are scheduled through pqueue's module-level functions, which act
+    on the scheduler of the active simulation. start() and run() activate
+    the simulation they are called on, so any number of simulations can be
+    built and run one after another in the same process.
+    '''
+    def __init__(self, tcp_alg='reno', backend='heap', routing='bf'):
+        self.tcp_alg = tcp_alg
+        self.scheduler = pqueue.Scheduler(backend)
+
+        # 'bf' routes with in-band distributed Bellman-Ford, 'oracle' with
+        # centrally computed shortest paths (see spf.py), 'static' keeps the
+        # initial Bellman-Ford routes for the whole run
+        self.routing = routing
+        self.oracle = None
+
+        # Fluid model of the flows simulated as fluid (see fluid.py), if any
+        self.fluid = None
+
+        # Batched TCP FAST window updates (see fast.py), if selected
+        self.fast = None
+
+        self.links = []
+        self.l_map = {}
+        self.hosts = []
+        self.h_map = {}
+        self.routers = []
+        self.r_map = {}
+        self.flows = []
+        self.f_map = {}
+
+        # Hosts and routers by dense index, and the index of each node id
+        self.nodes = []
+        self.node_index = {}
+
+        self.store = metrics.MetricStore()
+
+        # Packet-level event trace (a tracing.TraceWriter), off by default
+        self.tracer = None
+
+        # Links and flows whose state changed since the last metric sample
+        self.dirty_links = set()
+        self.dirty_flows = set()
+
+        self.last_report_time = -1
+        self.started = False
+
+    @property
+    def time(self):
+        return self.scheduler.time
+
+    def link_ids(self):
+        return sorted(self.l_map.keys())
+
+    def router_ids(self):
+        return sorted(self.r_map.keys())
+
+    def flow_ids(self):
+        return sorted(self.f_map.keys())
+
+    def activate(self):
+        pqueue.activate(self.scheduler)
+
+    def start(self):
+        '''
+        Computes the initial routing tables and schedules rerouting, metric
+        sampling and the start of every flow.
+        '''
+        self.activate()
+        self.started = True
+
+        # Initial routing
+        router.set_rneighbours(self.routers)
+        if self.routing == 'oracle':
+            self.oracle = OracleRouting(self.routers, self.links)
+            self.oracle.update()
+        else:
+            router.initial_bf(self.routers, self.links)
+
+        # Set rerouting to happen periodically
+        if self.routing != 'static':
+            pqueue.enqueue(event.Reroute(event.Reroute.WAIT_INTERVAL, 1, self))
+
+        # Sample link and flow metrics periodically
+        pqueue.enqueue(event.SampleMetrics(0.0, self))
+
+        if self.tcp_alg == 'fast' and Flow.WINDOW_UPDATES == 'batched' and \
+           self.flows:
+            self.fast = FastController(self.flows[0].update_period)
+
+        # Fluid flows are started by the fluid model
+        if self.fluid is not None:
+            self.fluid.start()
+            fluid_flows = set(self.fluid.flows)
+        else:
+            fluid_flows = ()
+        for f in self.own_flows():
+            if f not in fluid_flows:
+                f.startFlow()
+
+    def own_flows(self):
+        '''
+        The flows this simulation sends: all of them, unless it only
+        simulates part of the network (see parallel.py)
+        '''
+        return self.flows
+
+    def flows_done(self):
+        for f in self.flows:
+            if f.done_sending is False:
+                return False
+        return True
+
+    def run(self, until=None, profiler=None):
+        '''
+        Runs the event loop until every flow is done sending, or until the
+        next event is after time until (starting the simulation first if
+        needed). Returns the number of events processed.
+
+        If a profiler.LoopProfiler is given, its instrumented copy of the
+        loop is run instead.
+        '''
+        if not self.started:
+            self.start()
+        self.activate()
+
+        if profiler is not None:
+            return profiler.run(self, until)
+
+        sched = self.scheduler
+        processed = 0
+        while (sched.empty() == False and self.flows_done() is False):
+            if until is not None and sched.peek_time() > until:
+                break
+            evt = sched.next_event()
+            sched.time = evt.start_time
+            evt.process()
+            evt.release()
+            processed += 1
+        return processed
+
+    def sample_metrics(self, time):
+        ''' Samples the links and flows that changed since the last sample '''
+        for lnk in self.dirty_links:
+            lnk.update_metrics(time)
+        for flw in self.dirty_flows:
+            flw.update_metrics(time)
+        self.dirty_links.clear()
+        self.dirty_flows.clear()
+
+        # Draw the metrics so far every so often, unless running headless
+        if not metrics.HEADLESS and \
+           time > self.last_report_time + metrics.REPORT_INTERVAL:
+            metrics.plot_metrics(self.store, False)
+            self.last_report_time = time
+
+    def summary(self):
+        '''
+        Returns run-level results: the simulated completion time, aggregate
+        goodput in Mbps, the packets dropped by links and their ratio to the
+        data packets sent, and the mean sampled flow round trip time.
+        '''
+        delivered = sum(f.received_packets for f in self.flows)
+        sent = sum(f.sent_packets for f in self.flows)
+        lost = sum(l.lost_packets for l in self.links)
+
+        rtts = [r for col in self.store.columns['round_trip_time']
+                for r in col if r == r]  # skip NaNs from before the first ACK
+
+        duration = self.time
+        return {
+            'completion_time': duration,
+            'goodput_mbps': delivered * packet.DataPkt.PACKET_SIZE * 8 / 1e6 /
+                            duration if duration > 0 else 0.0,
+            'lost_packets': lost,
+            'loss_rate': float(lost) / sent if sent else 0.0,
+            'mean_rtt': sum(rtts) / len(rtts) if rtts else float('nan'),
+        }
@@ -0,0 +1,237 @@
+import heapq
+
+'''
+Centralized ("oracle") shortest-path routing.
+
+Instead of the in-band distributed Bellman-Ford, OracleRouting reads the
+link costs (Link.bf_lcost) and the network graph (Link.ends) directly and
+keeps a shortest-path tree rooted at every router. Routing tables are
+filled straight from the trees, so no routing packets are sent.
+
+Trees are updated incrementally when only some link costs changed since
+the last update: a link whose cost went down only affects the nodes it
+now offers a shorter path to, and a link whose cost went up only affects
+trees that use it, and in those only the subtree below it. Each changed
+link is applied to each tree in turn, so the work is proportional to the
+part of the trees that actually changes. When most links changed, the
+trees are recomputed from scratch instead.
+'''
+
+INF = float('inf')
+
+class ShortestPathTree(object):
+    '''
+    Shortest-path tree rooted at one node. For every reached node keeps its
+    distance, its parent (previous node, link) and the first link on the
+    path from the root, which is what the root's routing table needs.
+    '''
+    def __init__(self, root, adj, cost):
+        self.root = root
+        self.adj = adj          # node -> list of (neighbour, link)
+        self.cost = cost        # link -> cost
+        self.compute()
+
+    def compute(self):
+        ''' Runs Dijkstra from scratch '''
+        self.dist = {self.root: 0}
+        self.parent = {self.root: None}
+        self.first = {self.root: None}
+        self.children = {self.root: set()}
+        self._propagate([(0, self.root.id, self.root)])
+
+    def _set_parent(self, node, prev, lnk):
+        old = self.parent.get(node, None)
+        if old is not None:
+            self.children[old[0]].discard(node)
+        self.parent[node] = (prev, lnk)
+        self.children.setdefault(prev, set()).add(node)
+        self.children.setdefault(node, set())
+        self.first[node] = lnk if prev is self.root else self.first[prev]
+
+    def _propagate(self, heap, changed=None):
+        '''
+        Dijkstra from the seeded heap of (dist, tie-break id, node) entries.
+        Only strict improvements are taken. Nodes whose first hop changed
+        are added to changed.
+        '''
+        dist = self.dist
+        cost = self.cost
+        heapq.heapify(heap)
+        while heap:
+            d, _, node = heapq.heappop(heap)
+            if d > dist.get(node, INF):
+                continue
+            for nbr, lnk in self.adj[node]:
+                nd = d + cost[lnk]
+                if nd < dist.get(nbr, INF):
+                    old_first = self.first.get(nbr, None)
+                    dist[nbr] = nd
+                    self._set_parent(nbr, node, lnk)
+                    if changed is not None and self.first[nbr] is not old_first:
+                        changed.add(nbr)
+                    heapq.heappush(heap, (nd, nbr.id, nbr))
+
+    def decrease(self, lnk, changed):
+        ''' Applies a lowered cost of lnk '''
+        a, b = lnk.ends
+        heap = []
+        for u, v in ((a, b), (b, a)):
+            if u in self.dist and self.dist[u] + self.cost[lnk] < \
+               self.dist.get(v, INF):
+                old_first = self.first.get(v, None)
+                self.dist[v] = self.dist[u] + self.cost[lnk]
+                self._set_parent(v, u, lnk)
+                if self.first[v] is not old_first:
+                    changed.add(v)
+                heap.append((self.dist[v], v.id, v))
+        self._propagate(heap, changed)
+
+    def increase(self, lnk, changed):
+        ''' Applies a raised cost of lnk '''
+        a, b = lnk.ends
+        if self.parent.get(b, None) == (a, lnk):
+            top = b
+        elif self.parent.get(a, None) == (b, lnk):
+            top = a
+        else:
+            return              # not a tree link, no path gets shorter
+
+        # Everything below the link loses its path and is re-attached from
+        # the rest of the tree
+        subtree = [top]
+        i = 0
+        while i < len(subtree):
+            subtree.extend(self.children[subtree[i]])
+            i += 1
+        affected = set(subtree)
+        old_first = dict((node, self.first[node]) for node in subtree)
+        for node in subtree:
+            self.dist[node] = INF
+
+        heap = []
+        for node in subtree:
+            best = None
+            for nbr, l in self.adj[node]:
+                if nbr not in affected and nbr in self.dist:
+                    d = self.dist[nbr] + self.cost[l]
+                    if best is None or d < best[0]:
+                        best = (d, nbr, l)
+            if best is not None:
+                self.dist[node] = best[0]
+                self._set_parent(node, best[1], best[2])
+                heap.append((best[0], node.id, node))
+
+        # Re-attached nodes may still improve on each other
+        self._propagate(heap)
+
+        for node in subtree:
+            if self.dist[node] == INF:
+                # Cut off from the root
+                del self.dist[node]
+                prev = self.parent.pop(node)[0]
+                self.children[prev].discard(node)
+                del self.first[node]
+            if self.first.get(node, None) is not old_first[node]:
+                changed.add(node)
+
+
+class OracleRouting(object):
+    # Recompute every tree from scratch when more than this fraction of the
+    # links changed cost
+    FULL_FRACTION = 0.5
+
+    def __init__(self, routers, links):
+        self.routers = routers
+        self.links = [l for l in links if len(l.ends) == 2]
+        self.adj = {}
+        for lnk in self.links:
+            a, b = lnk.ends
+            self.adj.setdefault(a, []).append((b, lnk))
+            self.adj.setdefault(b, []).append((a, lnk))
+
+        self.cost = {}
+        self.trees = None
+
+        # Counters for reporting
+        self.full_updates = 0
+        self.incremental_updates = 0
+
+    def update(self):
+        '''
+        Brings the trees up to date with the current link costs and writes
+        the routers' routing tables
+        '''
+        changed = [l for l in self.links if self.cost.get(l, None) != l.bf_lcost]
+        if not changed and self.trees is not None:
+            return
+
+        if self.trees is None or \
+           len(changed) > OracleRouting.FULL_FRACTION * len(self.links):
+            self.full_updates += 1
+            for lnk in changed:
+                self.cost[lnk] = lnk.bf_lcost
+            self.trees = {}
+            for rtr in self.routers:
+                tree = ShortestPathTree(rtr, self.adj, self.cost)
+                self.trees[rtr] = tree
+                table = [None] * len(rtr.sim.nodes)
+                for node, lnk in tree.first.items():
+                    if lnk is not None:
+                        table[node.index] = lnk.index
+                rtr.routing_table = table
+                rtr.compile_forwarding()
+            return
+
+        # Apply one link at a time to every tree, so each update sees trees
+        # that are consistent with all the other costs
+        self.incremental_updates += 1
+        touched = dict((rtr, set()) for rtr in self.routers)
+        for lnk in changed:
+            old = self.cost[lnk]
+            self.cost[lnk] = lnk.bf_lcost
+            for rtr in self.routers:
+                if lnk.bf_lcost < old:
+                    self.trees[rtr].decrease(lnk, touched[rtr])
+                else:
+                    self.trees[rtr].increase(lnk, touched[rtr])
+
+        for rtr in self.routers:
+            tree = self.trees[rtr]
+            if not touched[rtr]:
+                continue
+            for node in touched[rtr]:
+                lnk = tree.first.get(node, None)
+                rtr.routing_table[node.index] = None if lnk is None else \
+                    lnk.index
+            rtr.compile_forwarding()
+
+
+def all_pairs(routers, links, num_nodes):
+    '''
+    Runs Dijkstra from every router over the current link costs. Returns
+    the distance vector of each router, in the order of routers and in the
+    format Router.bf_distvec uses: a (distance, next hop index, first link
+    index) tuple by destination node index, None for unreachable nodes.
+    '''
+    adj = {}
+    cost = {}
+    for lnk in links:
+        if len(lnk.ends) == 2:
+            a, b = lnk.ends
+            adj.setdefault(a, []).append((b, lnk))
+            adj.setdefault(b, []).append((a, lnk))
+            cost[lnk] = lnk.bf_lcost
+
+    distvecs = []
+    for rtr in routers:
+        tree = ShortestPathTree(rtr, adj, cost)
+        distvec = [None] * num_nodes
+        for node, d in tree.dist.items():
+            lnk = tree.first[node]
+            if lnk is None:
+                distvec[node.index] = (d, node.index, None)
+            else:
+                distvec[node.index] = (d, lnk.get_receiver(rtr).index,
+                                       lnk.index)
+        distvecs.append(distvec)
+    return distvecs
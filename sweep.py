@@ -0,0 +1,206 @@
+import os
+import sys
+import time
+import traceback
+import multiprocessing
+
+'''
+Runs a grid of simulations over a pool of worker processes and streams one
+summary row per run into a CSV result table.
+
+Each grid parameter takes a comma-separated list of values and every
+combination is run:
+    case    test case number (input/test_case_N)
+    alg     TCP algorithm, reno or fast
+    buffer  multiplier for every link buffer size in the test case
+    rate    multiplier for every link rate in the test case
+    alpha   FAST ALPHA
+    gamma   FAST GAMMA
+    link    link engine, event or analytic
+    timer   retransmission timer mode, packet or flow
+
+Workers are started once and reused for many runs; each run builds its own
+Simulation. Rows are appended and flushed as runs finish, so an interrupted
+sweep can be picked up with --resume, which skips the runs already in the
+table. Runs that raise are reported on stderr and left out of the table (and
+so are retried on resume).
+
+usage: python sweep.py [--jobs=N] [--out=FILE.csv] [--resume]
+                       PARAM=V1,V2,... ...
+e.g.   python sweep.py case=1,2 alg=reno,fast buffer=0.5,1,2 --jobs=4
+'''
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Grid parameters and their values when not swept
+PARAMS = ['case', 'alg', 'buffer', 'rate', 'alpha', 'gamma', 'link', 'timer']
+DEFAULTS = {'case': '0', 'alg': 'reno', 'buffer': '1', 'rate': '1',
+            'alpha': '15', 'gamma': '0.5', 'link': 'event', 'timer': 'packet'}
+
+RESULTS = ['completion_time', 'goodput_mbps', 'lost_packets', 'loss_rate',
+           'mean_rtt', 'events', 'wall_time']
+
+def grid(values):
+    '''
+    Returns every combination of the given parameter values as a list of
+    tuples ordered like PARAMS
+    '''
+    runs = [()]
+    for name in PARAMS:
+        runs = [r + (v,) for r in runs for v in values.get(name, [DEFAULTS[name]])]
+    return runs
+
+def init_worker():
+    ''' Sets up a pool worker; the simulator modules are imported once here '''
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    import metrics
+    metrics.HEADLESS = True
+
+def run_one(run):
+    '''
+    Runs the simulation described by a tuple of PARAMS values. Returns
+    (run, results, error) where results is a list ordered like RESULTS, or
+    None if the run raised (error then holds the traceback).
+    '''
+    import link
+    import flow
+    from parser import parse
+    from simulation import Simulation
+
+    p = dict(zip(PARAMS, run))
+    try:
+        # Engine and timer mode are class-wide; workers are reused, so set
+        # them for every run
+        link.Link.ENGINE = p['link']
+        flow.Flow.TIMER_MODE = p['timer']
+
+        sim = parse('./input/test_case_' + p['case'], Simulation(p['alg']))
+        for lnk in sim.links:
+            lnk.buffer_size *= float(p['buffer'])
+            lnk.rate *= float(p['rate'])
+        for f in sim.flows:
+            f.ALPHA = float(p['alpha'])
+            f.GAMMA = float(p['gamma'])
+
+        start = time.time()
+        events = sim.run()
+        wall = time.time() - start
+    except Exception:
+        return (run, None, traceback.format_exc())
+
+    summary = sim.summary()
+    summary['events'] = events
+    summary['wall_time'] = wall
+    return (run, [summary[name] for name in RESULTS], None)
+
+def complete_row(line):
+    '''
+    Returns the fields of a result table line, or None if the line was only
+    partly written: it has no newline, the wrong number of fields, or a
+    result that is not a number
+    '''
+    if not line.endswith('\n'):
+        return None
+    fields = line[:-1].split(',')
+    if len(fields) != len(PARAMS) + len(RESULTS):
+        return None
+    try:
+        for value in fields[len(PARAMS):]:
+            float(value)
+    except ValueError:
+        return None
+    return fields
+
+def read_done(path):
+    ''' Returns the set of runs already recorded in a result table '''
+    done = set()
+    with open(path, 'r') as f:
+        header = f.readline().rstrip('\n').split(',')
+        if header != PARAMS + RESULTS:
+            raise ValueError("%s is not a sweep result table" % path)
+        for line in f:
+            fields = complete_row(line)
+            if fields is not None:
+                done.add(tuple(fields[:len(PARAMS)]))
+    return done
+
+def drop_partial_line(path):
+    '''
+    Truncates a result table after its last newline, so that rows appended
+    on resume do not run into a line an interrupted sweep left unfinished
+    '''
+    with open(path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind('\n') + 1
+        if end < len(data):
+            f.truncate(end)
+
+def sweep(values, out, jobs, resume=False):
+    '''
+    Runs the grid over values, writing rows to out as runs finish. Returns
+    the number of runs completed.
+    '''
+    all_runs = grid(values)
+    if resume and os.path.exists(out):
+        drop_partial_line(out)
+        done = read_done(out)
+        runs = [r for r in all_runs if r not in done]
+        f = open(out, 'a')
+    else:
+        runs = all_runs
+        f = open(out, 'w')
+        f.write(",".join(PARAMS + RESULTS) + "\n")
+        f.flush()
+
+    print "%d runs, %d already done, %d workers" % \
+        (len(all_runs), len(all_runs) - len(runs), jobs)
+
+    completed = 0
+    pool = multiprocessing.Pool(jobs, init_worker)
+    try:
+        # chunksize 1 so results stream back as each run finishes
+        for run, results, error in pool.imap_unordered(run_one, runs, 1):
+            if results is None:
+                sys.stderr.write("run %s failed:\n%s" % (",".join(run), error))
+                continue
+            f.write(",".join(list(run) + [repr(r) for r in results]) + "\n")
+            f.flush()
+            completed += 1
+            print "[%d/%d] %s" % (completed, len(runs), " ".join(
+                "%s=%s" % (name, v) for name, v in zip(PARAMS, run)
+                if name in values))
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        f.close()
+    return completed
+
+if __name__ == "__main__":
+    jobs = multiprocessing.cpu_count()
+    out = 'sweep.csv'
+    resume = False
+    values = {}
+
+    for i in sys.argv[1:]:
+        if i.startswith("--jobs="):
+            jobs = int(i[len("--jobs="):])
+        elif i.startswith("--out="):
+            out = i[len("--out="):]
+        elif i == "--resume":
+            resume = True
+        elif "=" in i and i.split("=", 1)[0] in PARAMS:
+            name, vals = i.split("=", 1)
+            values[name] = vals.split(",")
+        else:
+            print "usage: python sweep.py [--jobs=N] [--out=FILE.csv] " \
+                  "[--resume] PARAM=V1,V2,... ...\n" \
+                  "PARAM is one of " + ", ".join(PARAMS)
+            sys.exit(-1)
+
+    start = time.time()
+    completed = sweep(values, out, jobs, resume)
+    print "%d runs in %.1fs, results in %s" % (completed, time.time() - start, out)
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+import main
+import link
+import flow
+import host
+import router
+import metrics
+
+metrics.HEADLESS = True
+
+# Module and class-level mode switches that tests change; each test starts
+# from the defaults
+SWITCHES = [
+    (link.Link, 'ENGINE'), (link.Link, 'DUPLEX'),
+    (flow.Flow, 'SEND_TRAINS'), (flow.Flow, 'TIMER_MODE'),
+    (flow.Flow, 'WINDOW_UPDATES'),
+    (host.Host, 'ACK_EVERY'), (host.Host, 'ACK_DELAY'),
+    (router, 'ROUTE_CACHE_DIR'), (metrics, 'SAMPLE_INTERVAL'),
+]
+
+@pytest.fixture(autouse=True)
+def default_switches():
+    saved = [(obj, name, getattr(obj, name)) for obj, name in SWITCHES]
+    yield
+    for obj, name, value in saved:
+        setattr(obj, name, value)
+
+def case_file(number):
+    ''' Returns the path of input/test_case_<number> '''
+    return os.path.join(ROOT, 'input', 'test_case_%s' % number)
+
+@pytest.fixture
+def simulate():
+    '''
+    Returns a function that sets up a test case (or network file) with
+    main.setup, runs it to time until (to the end if None) and returns the
+    simulation
+    '''
+    def simulate(case, tcp_alg='reno', until=None, **kwargs):
+        infile = case if os.path.exists(str(case)) else case_file(case)
+        sim = main.setup(infile, tcp_alg, **kwargs)
+        sim.run(until)
+        return sim
+    return simulate
+
+@pytest.fixture
+def saved_metrics(tmpdir):
+    ''' Returns a function that gives a simulation's metrics as CSV text '''
+    def saved_metrics(sim):
+        path = str(tmpdir.join('metrics_%d.csv' % len(tmpdir.listdir())))
+        sim.store.save(path)
+        with open(path) as f:
+            return f.read()
+    return saved_metrics
@@ -0,0 +1,31 @@
+import pytest
+
+import checkpoint
+import flow
+import link
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'backend': 'calendar', 'routing': 'oracle', 'engine': 'analytic',
+     'timer_mode': 'flow'},
+])
+def test_restore_continues_like_straight_run(simulate, saved_metrics, tmpdir,
+                                             options):
+    options = dict(options)
+    link.Link.ENGINE = options.pop('engine', 'event')
+    flow.Flow.TIMER_MODE = options.pop('timer_mode', 'packet')
+    straight = simulate(1, until=6.0, **options)
+
+    path = str(tmpdir.join('run.ckpt'))
+    sim = simulate(1, until=3.0, **options)
+    checkpoint.save(sim, path)
+    sim.run(until=6.0)
+    assert saved_metrics(sim) == saved_metrics(straight)
+
+    # Loading twice forks two independent runs
+    for i in range(2):
+        restored = checkpoint.load(path)
+        assert restored.time <= 3.0
+        restored.run(until=6.0)
+        assert restored.scheduler.pops == straight.scheduler.pops
+        assert saved_metrics(restored) == saved_metrics(straight)
@@ -0,0 +1,34 @@
+import host
+import packet
+
+def count_acks(simulate, monkeypatch, ack_every):
+    ''' Runs test case 1 to 5 s; returns the ACKs sent and packets received '''
+    acks = []
+    make_ack = packet.makeAck
+    def counting_make_ack(flow, num, segments=1):
+        acks.append(segments)
+        return make_ack(flow, num, segments)
+    monkeypatch.setattr(packet, 'makeAck', counting_make_ack)
+
+    host.Host.ACK_EVERY = ack_every
+    sim = simulate(1, until=5.0)
+    monkeypatch.undo()
+    return acks, sim.flows[0].received_packets
+
+def test_ack_every_n_coalesces_acks(simulate, monkeypatch):
+    acks_1, received_1 = count_acks(simulate, monkeypatch, 1)
+    acks_4, received_4 = count_acks(simulate, monkeypatch, 4)
+
+    assert len(acks_1) >= received_1 > 0
+    assert max(acks_4) == 4
+    assert len(acks_4) < len(acks_1) * 2 / 3
+    assert received_4 > received_1 / 2
+
+def test_coalesced_dupacks_give_no_rtt_sample(simulate):
+    # Coalesced dupACKs used to ACK the packet halve_window puts back in
+    # unacknowledged, giving a sub-millisecond RTT that pinned min_RTT
+    host.Host.ACK_EVERY = 2
+    sim = simulate(2, 'fast', until=6.0)
+    f = sim.flows[0]
+    assert f.min_RTT > 0.1
+    assert f.received_packets > 4000
@@ -0,0 +1,40 @@
+import fast
+import flow
+
+def set_state(sim):
+    ''' Gives sim's flows assorted FAST state, one without an RTT yet '''
+    for i, f in enumerate(sim.flows):
+        f.window_size = 10.0 + 7 * i
+        f.min_RTT = 0.05
+        f.curr_RTT = None if i == 0 else 0.05 + 0.01 * i
+
+def batched_windows(sim, numpy_min_flows):
+    ''' Window sizes after one tick over sim's flows '''
+    controller = fast.FastController(0.02)
+    for f in sim.flows:
+        controller.add(f, 0.0)
+    set_state(sim)
+    fast.FastController.NUMPY_MIN_FLOWS = numpy_min_flows
+    controller.update(0.0)
+    return [f.window_size for f in sim.flows]
+
+def test_tick_matches_fast_window(simulate, monkeypatch):
+    monkeypatch.setattr(fast.FastController, 'NUMPY_MIN_FLOWS',
+                        fast.FastController.NUMPY_MIN_FLOWS)
+    sim = simulate(2, 'fast', until=0.0)
+    set_state(sim)
+    expected = [f.fast_window() for f in sim.flows]
+
+    assert batched_windows(sim, float('inf')) == expected
+    assert batched_windows(sim, 0) == expected
+
+def test_batched_updates_one_tick_per_period(simulate):
+    flow.Flow.WINDOW_UPDATES = 'batched'
+    sim = simulate(2, 'fast', until=5.0)
+
+    # F1 starts at 0.5 s and is first updated one period later; F2 and F3
+    # haven't started yet
+    assert sim.fast.ticks == int(round((5.0 - 0.5) / 0.02))
+    assert sim.fast.flows == sim.flows[:1]
+    assert sim.fast.updates == sim.fast.ticks
+    assert [f for t, f in sim.fast.waiting] == sim.flows[1:]
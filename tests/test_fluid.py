@@ -0,0 +1,13 @@
+def test_fluid_counters_are_whole_packets(simulate):
+    sim = simulate(2, until=8.0, fluid={'packet_flows': ['F1']})
+    counters = [f.sent_packets for f in sim.flows] + \
+               [f.received_packets for f in sim.flows] + \
+               [l.lost_packets for l in sim.links]
+    assert all(isinstance(n, (int, long)) for n in counters)
+    assert sum(l.lost_packets for l in sim.links) > 0
+
+def test_fluid_flows_finish(simulate):
+    sim = simulate(0, fluid={})
+    for f in sim.flows:
+        assert f.done_sending
+        assert f.sent_packets == f.curr_pkt == f.num_packets
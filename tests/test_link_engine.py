@@ -0,0 +1,21 @@
+import pytest
+
+import link
+
+def delivered(sim):
+    ''' Returns per-flow delivered packets and per-link drops '''
+    return ([f.received_packets for f in sim.flows],
+            [l.lost_packets for l in sim.links])
+
+@pytest.mark.parametrize('case,tcp_alg', [(0, 'reno'), (1, 'fast')])
+def test_analytic_links_time_packets_like_events(simulate, case, tcp_alg):
+    link.Link.ENGINE = 'event'
+    events = simulate(case, tcp_alg)
+    link.Link.ENGINE = 'analytic'
+    analytic = simulate(case, tcp_alg)
+
+    # Departure times are summed in a different order, so they agree only
+    # to rounding
+    assert analytic.time == pytest.approx(events.time, abs=1e-6)
+    assert delivered(analytic) == delivered(events)
+    assert analytic.scheduler.pops < events.scheduler.pops / 2
@@ -0,0 +1,54 @@
+import pytest
+
+from metrics import MetricStore
+
+def sampled_store():
+    ''' A store with link and flow samples, some rates sampled less often '''
+    store = MetricStore()
+    for _id in ['L1', 'L2', 'L10']:
+        store.entity('link', _id)
+    for _id in ['F1', 'F2']:
+        store.entity('flow', _id)
+    store.entity('link', 'L3')          # never sampled
+
+    for i in xrange(20):
+        t = i * 0.01
+        for idx in xrange(3):
+            store.update_link(idx, i * (idx + 1), 0.5 * idx, 1.25 * i, t,
+                              i % 4 == 0)
+        for idx in xrange(2):
+            store.update_flow(idx, 10.0 + i, 2.0 * i, None if i < 3 else
+                              0.05 + i / 1000.0, 1 + i * (idx + 1), t,
+                              i % 5 == 1)
+    return store
+
+def columns(store):
+    ''' Every column of every sampled link and flow, by name and id '''
+    cols = {}
+    for kind in ('link', 'flow'):
+        for _id in store.ids[kind]:
+            if store.has(kind, _id):
+                for name in MetricStore.column_names(kind):
+                    # Compare bytes so NaN RTTs compare equal
+                    cols[(name, _id)] = store.column(name, _id).tostring()
+    return cols
+
+@pytest.mark.parametrize('suffix', ['.csv', '.npz'])
+def test_save_load_round_trip(tmpdir, suffix):
+    store = sampled_store()
+    assert len(store.column('lr_times', 'L2')) == 5
+    assert len(store.column('fr_times', 'F1')) == 4
+
+    path = str(tmpdir.join('metrics' + suffix))
+    store.save(path)
+    loaded = MetricStore.load(path)
+    assert sorted(loaded.ids['link']) == ['L1', 'L10', 'L2']
+    assert sorted(loaded.ids['flow']) == ['F1', 'F2']
+    assert columns(loaded) == columns(store)
+
+@pytest.mark.parametrize('suffix', ['.csv', '.npz'])
+def test_simulation_metrics_round_trip(simulate, tmpdir, suffix):
+    sim = simulate(1, until=2.0)
+    path = str(tmpdir.join('metrics' + suffix))
+    sim.store.save(path)
+    assert columns(MetricStore.load(path)) == columns(sim.store)
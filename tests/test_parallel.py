@@ -0,0 +1,19 @@
+import pytest
+
+import link
+import parallel
+from conftest import case_file
+
+@pytest.mark.parametrize('parts', [2, 3])
+def test_parallel_matches_sequential(simulate, saved_metrics, parts):
+    settings = (link.Link.ENGINE, link.Link.DUPLEX)
+    split = parallel.run(case_file(1), 'reno', parts)
+    # The analytic full duplex engine is only used for the parallel run
+    assert (link.Link.ENGINE, link.Link.DUPLEX) == settings
+
+    link.Link.ENGINE = 'analytic'
+    link.Link.DUPLEX = 'full'
+    sequential = simulate(1, routing='static')
+    assert len(parallel.cut_links(split, parallel.partition(split, parts))) > 0
+    assert split.time == sequential.time
+    assert saved_metrics(split) == saved_metrics(sequential)
@@ -0,0 +1,55 @@
+from reassembly import ReorderBuffer
+
+def test_in_order_packets_advance_expected():
+    buf = ReorderBuffer()
+    for n in xrange(5):
+        assert buf.add(n)
+        assert buf.expected == n + 1
+    assert buf.pending == set()
+    assert buf.sack_blocks() == []
+
+def test_filling_a_gap_consumes_the_buffered_run():
+    buf = ReorderBuffer()
+    buf.add(0)
+    for n in [3, 2, 5, 4, 8]:
+        assert buf.add(n)
+    assert buf.expected == 1
+    assert buf.sack_blocks() == [(8, 9), (2, 6)]
+    assert 4 in buf and 1 not in buf and 6 not in buf
+
+    assert buf.add(1)
+    assert buf.expected == 6
+    assert buf.pending == set([8])
+    assert buf.sack_blocks() == [(8, 9)]
+
+    assert buf.add(7)
+    assert buf.sack_blocks() == [(7, 9)]
+    assert buf.add(6)
+    assert buf.expected == 9
+    assert buf.pending == set()
+    assert buf.run_end == {} and buf.run_start == {}
+    assert buf.sack_blocks() == []
+
+def test_duplicates_below_expected_are_old():
+    buf = ReorderBuffer()
+    for n in [0, 1, 2]:
+        buf.add(n)
+    assert not buf.add(1)
+    assert not buf.add(0)
+    assert buf.expected == 3
+
+def test_duplicate_out_of_order_packets_change_nothing():
+    buf = ReorderBuffer()
+    for n in [2, 3, 6]:
+        buf.add(n)
+    before = (set(buf.pending), dict(buf.run_end), dict(buf.run_start))
+
+    assert buf.add(3)
+    assert buf.add(6)
+    assert (buf.pending, buf.run_end, buf.run_start) == before
+    assert buf.expected == 0
+
+    assert buf.add(0)
+    assert buf.add(1)
+    assert buf.expected == 4
+    assert buf.sack_blocks() == [(6, 7)]
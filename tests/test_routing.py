@@ -0,0 +1,38 @@
+import os
+
+import main
+import router
+
+from conftest import case_file
+
+def reorder_hosts(path, out):
+    ''' Writes the network in path to out with its first two hosts swapped '''
+    with open(path) as f:
+        lines = [l.strip() for l in f if l.strip()]
+    hosts_at = 1 + int(lines[0]) * 4 + 1
+    h1 = lines[hosts_at:hosts_at + 3]
+    h2 = lines[hosts_at + 3:hosts_at + 6]
+    lines[hosts_at:hosts_at + 6] = h2 + h1
+    with open(out, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def routes(sim):
+    return dict((r.id, r.named_routes()) for r in sim.routers)
+
+def test_route_cache_keyed_by_node_order(tmpdir):
+    reordered = str(tmpdir.join('reordered'))
+    reorder_hosts(case_file(1), reordered)
+    cold = routes(main.setup(reordered))
+
+    router.ROUTE_CACHE_DIR = str(tmpdir.join('cache'))
+    main.setup(case_file(1))
+    assert routes(main.setup(reordered)) == cold
+    assert len(os.listdir(router.ROUTE_CACHE_DIR)) == 2
+
+def test_route_cache_hit_matches_cold_run(tmpdir):
+    cold = routes(main.setup(case_file(2)))
+
+    router.ROUTE_CACHE_DIR = str(tmpdir.join('cache'))
+    assert routes(main.setup(case_file(2))) == cold
+    assert routes(main.setup(case_file(2))) == cold
+    assert len(os.listdir(router.ROUTE_CACHE_DIR)) == 1
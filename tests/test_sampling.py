@@ -0,0 +1,45 @@
+import event
+import flow
+import packet
+
+def sampled_window(sim, f):
+    ''' Samples sim's metrics and returns f's last sampled window size '''
+    sim.sample_metrics(sim.time + 0.01)
+    return sim.store.column('window_sizes', f.id)[-1]
+
+def test_packet_timeout_is_sampled(simulate):
+    sim = simulate(1, until=3.0)
+    f = sim.flows[0]
+    sim.sample_metrics(sim.time)
+    assert f.window_size > 1
+
+    number = f.unacknowledged.oldest()
+    f.handleTimeout(packet.DataPkt(f.source, f.destination, number, f),
+                    sim.time)
+    assert sampled_window(sim, f) == 1
+
+def test_flow_timeout_is_sampled(simulate):
+    flow.Flow.TIMER_MODE = 'flow'
+    sim = simulate(1, until=3.0)
+    f = sim.flows[0]
+    sim.sample_metrics(sim.time)
+    assert f.window_size > 1
+
+    f.handleFlowTimeout(f.unacknowledged.oldest_send_time() + f.timeout)
+    assert sampled_window(sim, f) == 1
+
+def test_fast_updates_are_sampled(simulate):
+    sim = simulate(2, 'fast', until=3.0)
+    f = sim.flows[0]
+    sim.sample_metrics(sim.time)
+    event.UpdateWindow(sim.time, f).process()
+    assert f in sim.dirty_flows
+    assert sampled_window(sim, f) == f.window_size
+
+    flow.Flow.WINDOW_UPDATES = 'batched'
+    sim = simulate(2, 'fast', until=3.0)
+    f = sim.flows[0]
+    sim.sample_metrics(sim.time)
+    sim.fast.update(sim.time)
+    assert f in sim.dirty_flows
+    assert sampled_window(sim, f) == f.window_size
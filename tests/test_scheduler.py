@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+import event
+import pqueue
+
+def hold_model(backend, steps=20000, seed=1):
+    '''
+    Dequeues events from a scheduler while scheduling new ones at random
+    (often equal) later times, cancelling some along the way. Returns the
+    events, numbered in the order they were made, in the order they were
+    dequeued.
+    '''
+    rnd = random.Random(seed)
+    sched = pqueue.Scheduler(backend)
+    pending = []
+    for i in xrange(500):
+        evt = event.Event(rnd.randint(0, 50) * 0.01, rnd.randint(1, 6))
+        sched.schedule(evt)
+        pending.append(evt)
+
+    order = []
+    for i in xrange(steps):
+        if sched.empty():
+            break
+        evt = sched.next_event()
+        order.append(evt)
+        assert evt.start_time >= sched.time
+        sched.time = evt.start_time
+
+        new = [event.Event(sched.time + rnd.choice([0.0, 0.01, 0.5, 3.0]),
+                           rnd.randint(1, 6))
+               for j in xrange(rnd.choice([1, 1, 2]))]
+        if len(new) == 2:
+            sched.schedule_many(new)
+        else:
+            for evt in new:
+                sched.schedule(evt)
+        pending.extend(new)
+        if rnd.random() < 0.2:
+            sched.cancel(pending[rnd.randrange(len(pending))])
+    number = dict((id(evt), i) for i, evt in enumerate(pending))
+    return [number[id(evt)] for evt in order]
+
+def test_calendar_dequeues_in_heap_order():
+    heap = hold_model('heap')
+    assert len(heap) == 20000
+    assert hold_model('calendar') == heap
+
+@pytest.mark.parametrize('case,tcp_alg,until', [(1, 'reno', 4.0),
+                                               (2, 'fast', 2.0)])
+def test_calendar_runs_like_heap(simulate, saved_metrics, case, tcp_alg,
+                                 until):
+    heap = simulate(case, tcp_alg, until=until, backend='heap')
+    calendar = simulate(case, tcp_alg, until=until, backend='calendar')
+    assert calendar.scheduler.pops == heap.scheduler.pops
+    assert saved_metrics(calendar) == saved_metrics(heap)
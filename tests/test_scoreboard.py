@@ -0,0 +1,57 @@
+from scoreboard import Scoreboard, TimedScoreboard
+
+def test_scoreboard_tracks_outstanding_packets():
+    sb = Scoreboard()
+    for n in xrange(5, 10):
+        sb[n] = n / 10.0
+    assert len(sb) == 5 and sb.oldest() == 5
+
+    assert sb.pop(7) == 0.7
+    assert 7 not in sb and sb.get(7) is None
+    assert sb.advance_to(7) == [5, 6]
+    assert sb.oldest() == 8
+    assert list(sb.items()) == [(8, 0.8), (9, 0.9)]
+
+    # Resent below the oldest outstanding packet
+    sb[6] = 1.5
+    assert sb.oldest() == 6 and len(sb) == 3
+    assert sb.advance_to(10) == [6, 8, 9]
+    assert len(sb) == 0 and sb.oldest() is None
+
+def test_restamped_packet_expires_at_its_new_time():
+    sb = TimedScoreboard()
+    for n in xrange(4):
+        sb[n] = 1.0 + n * 0.1
+    sb[0] = 2.0                 # retransmitted
+    assert sb.oldest_send_time() == 1.1
+    assert sb.expired(2.15, 1.0) == [1]
+    sb[1] = 2.15
+    assert sb.oldest_send_time() == 1.2
+
+    # Packets ACKed since are skipped
+    sb.pop(2)
+    sb.pop(3)
+    assert sb.oldest_send_time() == 2.0
+    assert sb.expired(2.9, 1.0) == []
+    assert sb.expired(3.0, 1.0) == [0]
+    sb[0] = 3.0
+    assert sb.oldest_send_time() == 2.15
+
+    sb.advance_to(2)
+    assert len(sb) == 0
+    assert sb.oldest_send_time() is None
+    assert sb.expired(10.0, 1.0) == []
+
+def test_expired_packets_come_in_number_order():
+    sb = TimedScoreboard()
+    for n in xrange(3):
+        sb[n] = 1.0
+    sb[5] = 1.1
+    sb[1] = 1.2
+    sb[2] = 1.2
+    assert sb.expired(2.5, 1.0) == [0, 1, 2, 5]
+
+    for n in [0, 1, 2, 5]:
+        sb[n] = 2.5
+    assert sb.oldest_send_time() == 2.5
+    assert sb.expired(3.0, 1.0) == []
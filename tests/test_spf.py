@@ -0,0 +1,54 @@
+import random
+
+import spf
+
+class Node(object):
+    def __init__(self, i):
+        self.id = i
+
+class Link(object):
+    def __init__(self, a, b):
+        self.ends = [a, b]
+
+def random_graph(rnd, num_nodes=15, num_links=30):
+    nodes = [Node(i) for i in xrange(num_nodes)]
+    links = [Link(nodes[i], nodes[rnd.randrange(i)])
+             for i in xrange(1, num_nodes)]
+    while len(links) < num_links:
+        a, b = rnd.sample(nodes, 2)
+        links.append(Link(a, b))
+    adj = dict((node, []) for node in nodes)
+    for lnk in links:
+        a, b = lnk.ends
+        adj[a].append((b, lnk))
+        adj[b].append((a, lnk))
+    return nodes, links, adj
+
+def test_incremental_trees_match_full_dijkstra():
+    rnd = random.Random(1)
+    for graph in xrange(50):
+        nodes, links, adj = random_graph(rnd)
+        cost = dict((lnk, rnd.randint(1, 10)) for lnk in links)
+        trees = [spf.ShortestPathTree(node, adj, cost) for node in nodes[:4]]
+        for rounds in xrange(10):
+            for lnk in rnd.sample(links, 3):
+                old = cost[lnk]
+                cost[lnk] = rnd.randint(1, 10)
+                for tree in trees:
+                    changed = set()
+                    if cost[lnk] < old:
+                        tree.decrease(lnk, changed)
+                    else:
+                        tree.increase(lnk, changed)
+
+            for tree in trees:
+                full = spf.ShortestPathTree(tree.root, adj, cost)
+                assert tree.dist == full.dist
+                # Equal-cost paths may be broken differently, but the first
+                # hop must start a shortest path
+                for node, lnk in tree.first.items():
+                    if lnk is None:
+                        continue
+                    nbr = [n for n in lnk.ends if n is not tree.root][0]
+                    nbr_tree = spf.ShortestPathTree(nbr, adj, cost)
+                    assert cost[lnk] + nbr_tree.dist[node] == full.dist[node]
@@ -0,0 +1,34 @@
+import sweep
+
+def row(run, results):
+    return ",".join(list(run) + results)
+
+def test_resume_replaces_partly_written_row(tmpdir):
+    values = {'link': ['analytic'], 'timer': ['packet', 'flow']}
+    done, cut = sweep.grid(values)
+    path = str(tmpdir.join('sweep.csv'))
+    with open(path, 'w') as f:
+        f.write(",".join(sweep.PARAMS + sweep.RESULTS) + "\n")
+        f.write(row(done, ['22.5', '7.0', '0', '0.0', '0.1', '1000', '1.0'])
+                + "\n")
+        # Interrupted while writing: the right number of fields, but the
+        # last number is cut off and there is no newline
+        f.write(row(cut, ['22.5', '7.0', '0', '0.0', '0.1', '1000', '1.']))
+
+    assert sweep.read_done(path) == set([done])
+    assert sweep.sweep(values, path, 1, resume=True) == 1
+
+    with open(path) as f:
+        lines = f.readlines()
+    assert len(lines) == 3
+    assert all(sweep.complete_row(line) is not None for line in lines[1:])
+    assert sweep.read_done(path) == set([done, cut])
+
+def test_read_done_skips_rows_with_bad_results(tmpdir):
+    run = sweep.grid({})[0]
+    path = str(tmpdir.join('sweep.csv'))
+    with open(path, 'w') as f:
+        f.write(",".join(sweep.PARAMS + sweep.RESULTS) + "\n")
+        f.write(row(run, ['22.5', '7.0', '0', '0.0', 'nan', '10', '1.0x'])
+                + "\n")
+    assert sweep.read_done(path) == set()
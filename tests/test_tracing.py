@@ -0,0 +1,27 @@
+import tracing
+
+def test_trace_round_trip(simulate, tmpdir):
+    path = str(tmpdir.join('trace.gz'))
+    sim = simulate(1, until=0.0)
+    sim.tracer = tracing.TraceWriter(path, sim)
+    sim.run(until=1.5)
+    sim.tracer.close()
+
+    reader = tracing.TraceReader(path)
+    records = reader.read()
+    assert len(records) == sim.tracer.records > 0
+    assert reader.nodes == [n.id for n in sim.nodes]
+    assert set(records['event']) <= set(range(len(tracing.EVENTS)))
+    assert records['flow'].max() == 0
+
+def test_trace_indices_past_int16(simulate, tmpdir):
+    path = str(tmpdir.join('trace'))
+    sim = simulate(1, until=1.2)
+    pkt = sim.flows[0].makePacket(0, sim.time)
+    writer = tracing.TraceWriter(path, sim)
+    writer.record(tracing.ARRIVE, 1.25, pkt, 40000, 70000, 3.5)
+    writer.close()
+
+    rec = tracing.TraceReader(path).read()[0]
+    assert (rec['link'], rec['node'], rec['seq']) == (40000, 70000, 0)
+    assert (rec['time'], rec['value']) == (1.25, 3.5)
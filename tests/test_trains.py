@@ -0,0 +1,20 @@
+import pytest
+
+import flow
+import link
+
+@pytest.mark.parametrize('engine', ['event', 'analytic'])
+@pytest.mark.parametrize('timer_mode', ['packet', 'flow'])
+def test_trains_match_single_packets(simulate, saved_metrics, engine,
+                                     timer_mode):
+    link.Link.ENGINE = engine
+    flow.Flow.TIMER_MODE = timer_mode
+
+    flow.Flow.SEND_TRAINS = False
+    packets = simulate(1, until=5.0)
+    flow.Flow.SEND_TRAINS = True
+    trains = simulate(1, until=5.0)
+
+    assert trains.scheduler.seq < packets.scheduler.seq
+    assert trains.time == packets.time
+    assert saved_metrics(trains) == saved_metrics(packets)
@@ -0,0 +1,224 @@
+import sys
+import random
+
+'''
+Generates synthetic networks in the input format read by parser.py.
+
+Topologies:
+    dumbbell    hosts split between two routers joined by one bottleneck
+                link; flows cross the bottleneck from left to right
+    parkinglot  a chain of routers with hosts spread along it; flow F1
+                runs end to end and the others cross one hop each
+    fattree     k-ary fat tree (k pods of k/2 edge and k/2 aggregation
+                routers, (k/2)^2 core routers), k the smallest even number
+                with room for the hosts; flows between random hosts
+    random      connected random graph of routers with the given mean
+                degree, hosts attached to random routers; flows between
+                random hosts
+
+Every link gets the same rate, delay and buffer size, and every flow sends
+the same amount of data, starting --stagger seconds after the previous one.
+
+usage: python topogen.py [--hosts=N] [--routers=M] [--flows=K]
+                         [--rate=MBPS] [--delay=MS] [--buffer=KB]
+                         [--data=MB] [--start=S] [--stagger=S]
+                         [--degree=D] [--seed=N] [--out=FILE] TOPOLOGY
+'''
+
+class Topology(object):
+    ''' Links, hosts, routers and flows of a generated network '''
+    def __init__(self, rate=10.0, delay=10.0, buffer_size=64.0):
+        self.rate = rate
+        self.delay = delay
+        self.buffer_size = buffer_size
+
+        self.links = []       # link ids
+        self.hosts = []       # (host id, link id)
+        self.routers = []     # router ids
+        self.r_links = {}     # router id -> list of link ids
+        self.flows = []       # (flow id, source, destination, MB, start)
+
+    def add_router(self):
+        r_id = "R%d" % (len(self.routers) + 1)
+        self.routers.append(r_id)
+        self.r_links[r_id] = []
+        return r_id
+
+    def connect(self, r1, r2):
+        ''' Adds a link between routers r1 and r2 '''
+        l_id = "L%d" % (len(self.links) + 1)
+        self.links.append(l_id)
+        self.r_links[r1].append(l_id)
+        self.r_links[r2].append(l_id)
+        return l_id
+
+    def add_host(self, r_id):
+        ''' Adds a host with a link to router r_id '''
+        h_id = "H%d" % (len(self.hosts) + 1)
+        l_id = "L%d" % (len(self.links) + 1)
+        self.links.append(l_id)
+        self.r_links[r_id].append(l_id)
+        self.hosts.append((h_id, l_id))
+        return h_id
+
+    def add_flow(self, src, dst, data, start):
+        f_id = "F%d" % (len(self.flows) + 1)
+        self.flows.append((f_id, src, dst, data, start))
+        return f_id
+
+    def write(self, f):
+        ''' Writes the network in parser.py's format to file f '''
+        lines = [len(self.links)]
+        for l_id in self.links:
+            lines += [l_id, self.rate, self.delay, self.buffer_size]
+
+        lines.append(len(self.hosts))
+        for h_id, l_id in self.hosts:
+            lines += ["addr_" + h_id.lower(), l_id, h_id]
+
+        lines.append(len(self.routers))
+        for r_id in self.routers:
+            lines += ["addr_" + r_id.lower(), len(self.r_links[r_id])]
+            lines += self.r_links[r_id]
+            lines.append(r_id)
+
+        lines.append(len(self.flows))
+        for flow in self.flows:
+            lines += list(flow)
+
+        f.write("\n".join(str(l) for l in lines) + "\n")
+
+
+def dumbbell(topo, hosts, routers, flows, data, start, stagger, rnd):
+    left, right = topo.add_router(), topo.add_router()
+    topo.connect(left, right)
+
+    l_hosts = [topo.add_host(left) for i in xrange((hosts + 1) / 2)]
+    r_hosts = [topo.add_host(right) for i in xrange(hosts / 2)]
+    for i in xrange(flows):
+        topo.add_flow(l_hosts[i % len(l_hosts)], r_hosts[i % len(r_hosts)],
+                      data, start + i * stagger)
+
+def parkinglot(topo, hosts, routers, flows, data, start, stagger, rnd):
+    chain = [topo.add_router() for i in xrange(routers)]
+    for i in xrange(routers - 1):
+        topo.connect(chain[i], chain[i + 1])
+
+    # Host i hangs off router i (mod the chain length)
+    at = [[] for r in chain]
+    for i in xrange(hosts):
+        at[i % routers].append(topo.add_host(chain[i % routers]))
+
+    topo.add_flow(at[0][0], at[-1][-1], data, start)
+    for i in xrange(1, flows):
+        hop = (i - 1) % (routers - 1)
+        src = at[hop][(i - 1) / (routers - 1) % len(at[hop])]
+        dst = at[hop + 1][(i - 1) / (routers - 1) % len(at[hop + 1])]
+        topo.add_flow(src, dst, data, start + i * stagger)
+
+def fattree(topo, hosts, routers, flows, data, start, stagger, rnd):
+    k = 2
+    while k * k * k / 4 < hosts:
+        k += 2
+    half = k / 2
+
+    core = [topo.add_router() for i in xrange(half * half)]
+    edges = []
+    for pod in xrange(k):
+        aggs = [topo.add_router() for i in xrange(half)]
+        pod_edges = [topo.add_router() for i in xrange(half)]
+        for a, agg in enumerate(aggs):
+            for e in pod_edges:
+                topo.connect(agg, e)
+            # Aggregation router a connects to core routers a*half..
+            for c in xrange(half):
+                topo.connect(agg, core[a * half + c])
+        edges += pod_edges
+
+    # Fill edge routers in order, k/2 hosts each
+    h_ids = [topo.add_host(edges[i / half]) for i in xrange(hosts)]
+    random_flows(topo, h_ids, flows, data, start, stagger, rnd)
+
+def random_graph(topo, hosts, routers, flows, data, start, stagger, rnd,
+                 degree=3.0):
+    r_ids = [topo.add_router() for i in xrange(routers)]
+
+    # A random spanning tree keeps the graph connected, then extra links
+    # between random pairs bring it up to the mean degree
+    edges = set()
+    for i in xrange(1, routers):
+        j = rnd.randrange(i)
+        edges.add((j, i))
+    target = min(int(degree * routers / 2), routers * (routers - 1) / 2)
+    while len(edges) < target:
+        i, j = sorted(rnd.sample(xrange(routers), 2))
+        edges.add((i, j))
+    for i, j in sorted(edges):
+        topo.connect(r_ids[i], r_ids[j])
+
+    h_ids = [topo.add_host(rnd.choice(r_ids)) for i in xrange(hosts)]
+    random_flows(topo, h_ids, flows, data, start, stagger, rnd)
+
+def random_flows(topo, h_ids, flows, data, start, stagger, rnd):
+    for i in xrange(flows):
+        src, dst = rnd.sample(h_ids, 2)
+        topo.add_flow(src, dst, data, start + i * stagger)
+
+TOPOLOGIES = {'dumbbell': dumbbell, 'parkinglot': parkinglot,
+              'fattree': fattree, 'random': random_graph}
+
+def generate(kind, hosts=4, routers=4, flows=2, rate=10.0, delay=10.0,
+             buffer_size=64.0, data=1.0, start=0.5, stagger=0.1, degree=3.0,
+             seed=143):
+    '''
+    Returns a Topology of the given kind. rate is in Mbps, delay in ms,
+    buffer_size in KB and data in MB, as in the input files.
+    '''
+    assert(hosts >= 2 and flows >= 1)
+    topo = Topology(rate, delay, buffer_size)
+    rnd = random.Random(seed)
+    if kind == 'random':
+        random_graph(topo, hosts, routers, flows, data, start, stagger, rnd,
+                     degree)
+    else:
+        assert(kind != 'parkinglot' or hosts >= routers >= 2)
+        TOPOLOGIES[kind](topo, hosts, routers, flows, data, start, stagger,
+                         rnd)
+    return topo
+
+if __name__ == "__main__":
+    opts = {}
+    out = None
+    for i in list(sys.argv[1:]):
+        if i.startswith("--out="):
+            sys.argv.remove(i)
+            out = i[len("--out="):]
+        elif i.startswith("--") and "=" in i:
+            sys.argv.remove(i)
+            name, val = i[2:].split("=", 1)
+            opts[name] = val
+
+    casts = {'hosts': int, 'routers': int, 'flows': int, 'rate': float,
+             'delay': float, 'buffer': float, 'data': float, 'start': float,
+             'stagger': float, 'degree': float, 'seed': int}
+    if len(sys.argv) != 2 or sys.argv[1] not in TOPOLOGIES or \
+       any(name not in casts for name in opts):
+        print "usage: python topogen.py [--hosts=N] [--routers=M] " \
+              "[--flows=K] [--rate=MBPS] [--delay=MS] [--buffer=KB] " \
+              "[--data=MB] [--start=S] [--stagger=S] [--degree=D] " \
+              "[--seed=N] [--out=FILE] dumbbell|parkinglot|fattree|random"
+        sys.exit(-1)
+
+    kwargs = dict((name, casts[name](val)) for name, val in opts.items())
+    if 'buffer' in kwargs:
+        kwargs['buffer_size'] = kwargs.pop('buffer')
+    topo = generate(sys.argv[1], **kwargs)
+
+    if out is None:
+        topo.write(sys.stdout)
+    else:
+        with open(out, 'w') as f:
+            topo.write(f)
+        print "%s: %d hosts, %d routers, %d links, %d flows" % (out,
+            len(topo.hosts), len(topo.routers), len(topo.links),
+            len(topo.flows))
@@ -0,0 +1,163 @@
+import os
+import gzip
+import json
+import struct
+
+'''
+Binary packet-level event trace.
+
+When a Simulation has a tracer (Simulation.tracer, None by default), links,
+flows and packet arrivals record what happens to every packet as a fixed
+width 32 byte record:
+
+    time    f8  simulated time of the event
+    event   u1  one of the event codes below
+    kind    u1  packet kind (packet.DATA, ACK, RT_ACK or ROUTING)
+            x2  padding, so the fields after it are aligned
+    link    i4  link index, -1 if the event isn't on a link
+    node    i4  index of the sending node (link events), the receiving
+                node (ARRIVE) or the flow source (ACK, TIMEOUT)
+    flow    i4  flow index, -1 for routing packets
+    seq     i4  packet number
+    value   f4  buffer load in bytes after ENQUEUE/DROP, window size
+                after ACK/TIMEOUT, 0 otherwise
+
+Records are packed into a preallocated block and written a block at a time
+to a plain file, or a gzip file when the name ends in .gz. The file starts
+with a "CS143TRACE <version>" line and a JSON line naming the events and
+the links, nodes and flows by index.
+
+Records are in the order they were made. With the analytic link engine a
+TRANSMIT is recorded when the packet is accepted, with the (possibly
+later) time it starts transmitting, so times are not sorted there.
+
+TraceReader reads a trace back as NumPy record arrays, memory-mapping
+plain files and decompressing gzip files a chunk at a time.
+'''
+
+MAGIC = "CS143TRACE"
+VERSION = 2
+
+# Event codes
+ENQUEUE = 0     # packet accepted into a link buffer
+DROP = 1        # packet dropped by a full link buffer
+TRANSMIT = 2    # packet starts transmitting on a link
+ARRIVE = 3      # packet arrives at the far end of a link
+ACK = 4         # flow processes an ACK
+TIMEOUT = 5     # flow retransmits a packet after a timeout
+EVENTS = ['ENQUEUE', 'DROP', 'TRANSMIT', 'ARRIVE', 'ACK', 'TIMEOUT']
+
+RECORD = struct.Struct('<dBBxxiiiif')
+FIELDS = {
+    'names': ['time', 'event', 'kind', 'link', 'node', 'flow', 'seq', 'value'],
+    'formats': ['<f8', 'u1', 'u1', '<i4', '<i4', '<i4', '<i4', '<f4'],
+    'offsets': [0, 8, 9, 12, 16, 20, 24, 28],
+    'itemsize': RECORD.size,
+}
+
+# Records buffered in memory between writes
+BLOCK_RECORDS = 16384
+
+class TraceWriter(object):
+    def __init__(self, path, sim, compresslevel=1):
+        self.path = path
+        if path.endswith('.gz'):
+            self.f = gzip.open(path, 'wb', compresslevel)
+        else:
+            self.f = open(path, 'wb')
+        self.f.write("%s %d\n" % (MAGIC, VERSION))
+        self.f.write(json.dumps({
+            'events': EVENTS,
+            'links': [l.id for l in sim.links],
+            'nodes': [n.id for n in sim.nodes],
+            'flows': [f.id for f in sim.flows],
+        }) + "\n")
+
+        self.block = bytearray(BLOCK_RECORDS * RECORD.size)
+        self.offset = 0
+        self.records = 0
+
+    def record(self, evt, time, pkt, link, node, value=0.0):
+        ''' Records event evt of packet pkt '''
+        flw = pkt.flow
+        RECORD.pack_into(self.block, self.offset, time, evt, pkt.kind, link,
+                         node, -1 if flw is None else flw.index, pkt.number,
+                         value)
+        self.offset += RECORD.size
+        if self.offset == len(self.block):
+            self.flush()
+
+    def flush(self):
+        self.f.write(memoryview(self.block)[:self.offset])
+        self.records += self.offset / RECORD.size
+        self.offset = 0
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+
+class TraceReader(object):
+    '''
+    Reads a trace written by TraceWriter. events, links, nodes and flows
+    map the codes and indices in the records back to names and ids.
+    '''
+    def __init__(self, path):
+        import numpy as np
+        self.path = path
+        self.dtype = np.dtype(FIELDS)
+        assert(self.dtype.itemsize == RECORD.size)
+
+        self.compressed = path.endswith('.gz')
+        with self.open() as f:
+            header = f.readline().split()
+            if len(header) != 2 or header[0] != MAGIC:
+                raise ValueError("%s is not a trace" % path)
+            if int(header[1]) != VERSION:
+                raise ValueError("%s is a version %s trace, expected %d" % \
+                    (path, header[1], VERSION))
+            meta = json.loads(f.readline())
+            self.offset = f.tell()
+        self.events = meta['events']
+        self.links = meta['links']
+        self.nodes = meta['nodes']
+        self.flows = meta['flows']
+
+    def open(self):
+        if self.compressed:
+            return gzip.open(self.path, 'rb')
+        return open(self.path, 'rb')
+
+    def chunks(self, size=1 << 20):
+        ''' Yields the records as arrays of at most size records '''
+        import numpy as np
+        if not self.compressed:
+            records = self.read()
+            for start in xrange(0, len(records), size):
+                yield records[start:start + size]
+            return
+
+        with self.open() as f:
+            f.seek(self.offset)
+            while True:
+                data = f.read(size * RECORD.size)
+                if len(data) < RECORD.size:
+                    break
+                yield np.frombuffer(data, self.dtype,
+                                    len(data) / RECORD.size)
+
+    def read(self):
+        '''
+        Returns all the records as one array, memory-mapped for plain
+        files and read into memory for gzip files
+        '''
+        import numpy as np
+        if self.compressed:
+            parts = list(self.chunks())
+            return np.concatenate(parts) if parts else \
+                np.zeros(0, self.dtype)
+
+        count = (os.path.getsize(self.path) - self.offset) / RECORD.size
+        if count == 0:
+            return np.zeros(0, self.dtype)
+        return np.memmap(self.path, self.dtype, 'r', self.offset, (count,))